@@ -0,0 +1,53 @@
+"""CPU-time micro-benchmark for HTML extraction (scrape.extract_content).
+
+Runs the extractor over corpus pages without any network and reports process
+CPU seconds per page, so parser/extraction changes can be compared directly.
+
+    cd benchmarks
+    python bench_extract.py
+    python bench_extract.py --kinds normal huge --repeat 50
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.abspath(os.path.join(HERE, "..", "src")))
+
+import corpus  # noqa: E402
+import scrape  # noqa: E402
+
+
+def bench(kinds, repeat: int, seed: int = 7):
+    results = {}
+    for kind in kinds:
+        _, body = corpus.page(kind, seed)
+        html = body.decode("utf-8", "replace")
+        runs = 1 if kind == "huge" else repeat
+        start = time.process_time()
+        for _ in range(runs):
+            text = scrape.extract_content(html, f"http://bench.local/{kind}/{seed}")
+        results[kind] = {
+            "bytes": len(body),
+            "cpu_s_per_page": (time.process_time() - start) / runs,
+            "chars_out": len(text or ""),
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kinds", nargs="+", default=["normal", "malformed", "huge"], choices=corpus.KINDS)
+    parser.add_argument("--repeat", type=int, default=20, help="runs per page (huge pages run once)")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    for kind, r in bench(args.kinds, args.repeat).items():
+        print(f"{kind:>10}  {r['bytes']:>10} bytes  {r['cpu_s_per_page'] * 1000:>10.1f} ms CPU/page  {r['chars_out']:>8} chars")
+
+
+if __name__ == "__main__":
+    main()
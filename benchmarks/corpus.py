@@ -0,0 +1,80 @@
+"""Synthetic article pages served by the benchmark's article stand-in.
+
+Every page is generated deterministically from its kind and a seed, so runs are
+comparable. Kinds cover what HN actually links to on a bad day:
+
+    normal     ~20 KB article with headings, paragraphs, lists and images
+    huge       multi-megabyte article (worst case for HTML parsing)
+    slow       normal article trickled out over several seconds
+    malformed  unclosed tags, stray markup, missing <head>/<body>
+    paywall    short teaser with paywall markers
+    pdf        application/pdf body
+    binary     large application/octet-stream download
+"""
+import random
+
+KINDS = ("normal", "huge", "slow", "malformed", "paywall", "pdf", "binary")
+
+# Default mix for the HN stand-in: mostly ordinary articles, one of each nasty case.
+DEFAULT_MIX = ("normal", "normal", "huge", "normal", "slow", "normal", "malformed", "normal", "paywall", "pdf")
+
+_WORDS = (
+    "latency throughput kernel compiler cache allocator scheduler database index "
+    "query network packet protocol encryption model inference token benchmark "
+    "runtime garbage collector thread process memory page fault branch predictor "
+    "vector register pipeline storage replication consensus"
+).split()
+
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _paragraph(rng: random.Random, sentences: int = 5) -> str:
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def article_html(seed: int, sections: int = 8, paragraphs: int = 4) -> str:
+    rng = random.Random(seed)
+    body = [f"<h1>{_sentence(rng, 6)}</h1>"]
+    for s in range(sections):
+        body.append(f"<h2>{_sentence(rng, 5)}</h2>")
+        for _ in range(paragraphs):
+            body.append(f"<p>{_paragraph(rng)}</p>")
+        if s % 3 == 0:
+            body.append("<ul>" + "".join(f"<li>{_sentence(rng, 8)}</li>" for _ in range(4)) + "</ul>")
+        if s % 2 == 0:
+            body.append(
+                f'<figure><img src="/img/{seed}-{s}.png" alt="{_sentence(rng, 4)}">'
+                f"<figcaption>{_sentence(rng, 6)}</figcaption></figure>"
+            )
+    nav = "<nav>" + "".join(f'<a href="/p/{i}">link {i}</a>' for i in range(30)) + "</nav>"
+    ads = '<div class="advertisement">Buy things</div><div class="social-share">Share</div>'
+    return (
+        "<!doctype html><html><head><meta charset='utf-8'>"
+        f"<title>Article {seed}</title><script>var x = 1;</script><style>p {{ margin: 0 }}</style></head>"
+        f"<body>{nav}<header>Site header</header><article>{''.join(body)}</article>{ads}"
+        "<footer>Site footer</footer></body></html>"
+    )
+
+
+def page(kind: str, seed: int):
+    """Return (content_type, body_bytes) for an article of `kind`."""
+    if kind in ("normal", "slow"):
+        return "text/html; charset=utf-8", article_html(seed).encode()
+    if kind == "huge":
+        return "text/html; charset=utf-8", article_html(seed, sections=1200, paragraphs=6).encode()
+    if kind == "malformed":
+        html = article_html(seed).replace("</p>", "").replace("</h2>", "<h2>").replace("<body>", "")
+        return "text/html", (html[: len(html) * 3 // 4] + "<div><span><table><tr><td>").encode()
+    if kind == "paywall":
+        return "text/html; charset=utf-8", (
+            "<html><head><title>Premium</title></head><body><div class='paywall'>"
+            "Subscribe to read this premium content.</div></body></html>"
+        ).encode()
+    if kind == "pdf":
+        return "application/pdf", b"%PDF-1.4\n" + bytes(random.Random(seed).getrandbits(8) for _ in range(64 * 1024))
+    if kind == "binary":
+        return "application/octet-stream", b"\0" * (32 * 1024 * 1024)
+    raise ValueError(f"Unknown page kind: {kind}")
@@ -0,0 +1,141 @@
+"""Offline end-to-end benchmark of the digest pipeline.
+
+Starts the local stand-ins from standins.py, points the worker at them and
+times ``mail_digest.main`` at several story counts. Stage timings come from the
+run report (see src/metrics.py). Nothing leaves the machine, and archives,
+caches and reports go to a temp directory.
+
+    cd benchmarks
+    python run_bench.py --counts 2 5 10 --concurrent
+    python run_bench.py --counts 10 --llm-latency 2 --rate-limit 0.05 --json results.json
+
+Note: a 429 moves a request to the next model of the fallback chain (the
+stand-in serves every model) or, at the end of the chain, costs a real
+``retry-after`` wait, so keep ``--rate-limit`` at 0 unless that is what you
+are measuring. Set LLM_BACKEND=openai to go through the OpenAI-compatible
+backend instead of the Groq SDK.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.abspath(os.path.join(HERE, "..", "src"))
+sys.path.insert(0, HERE)
+sys.path.insert(0, SRC)
+
+import standins  # noqa: E402
+
+
+def _configure_env(hn, llm, mailgun, workdir: str, warm_cache: bool):
+    # Must happen before the worker modules are imported: they read these at import time.
+    os.environ.update({
+        "HN_API_BASE": hn.base_url,
+        "GROQ_BASE_URL": llm.base_url,
+        "LLM_BASE_URL": llm.base_url + "/v1",  # for LLM_BACKEND=openai
+        "GROQ_API": "bench",
+        "MAILGUN_API_BASE": mailgun.base_url,
+        "MAILGUN_API_KEY": "bench",
+        "MAILGUN_LIST_NAME": "digest",
+        "DOMAIN_NAME": "bench.local",
+        "HN_CACHE_DIR": os.path.join(workdir, "cache"),
+        "HN_CACHE": "1" if warm_cache else "0",
+        "SUMMARY_CACHE": "1" if warm_cache else "0",
+        "PAGE_CACHE": "1" if warm_cache else "0",
+    })
+
+
+def run(counts, concurrent: bool, repeat: int, warm_cache: bool, hn_latency: float, llm_latency: float,
+        llm_jitter: float, rate_limit: float, max_request_chars: int, slow_seconds: float, quiet: bool,
+        comments: int = 120, llm_tail: float = 0.0):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="hn-bench-") as workdir, \
+            standins.ArticleServer(slow_seconds=slow_seconds) as articles, \
+            standins.HNServer(articles.origin, stories=max(counts), comments_per_story=comments,
+                              latency=hn_latency) as hn, \
+            standins.LLMServer(latency=llm_latency, jitter=llm_jitter, rate_limit_ratio=rate_limit,
+                               max_request_chars=max_request_chars, tail_ratio=llm_tail) as llm, \
+            standins.MailgunServer() as mailgun:
+        _configure_env(hn, llm, mailgun, workdir, warm_cache)
+
+        import logging
+        import mail_digest
+        import metrics
+
+        if quiet:
+            logging.getLogger().setLevel(logging.WARNING)
+        mail_digest.ARCHIVES_DIR = os.path.join(workdir, "archives")
+        metrics.REPORTS_DIR = os.path.join(workdir, "reports")
+
+        for count in counts:
+            for attempt in range(1, repeat + 1):
+                sent_before = len(mailgun.messages)
+                llm_before = llm.completions
+                start = time.monotonic()
+                mail_digest.main(story_count=count, concurrent=concurrent)
+                wall = time.monotonic() - start
+                summary = metrics.current_report().summary()
+                results.append({
+                    "count": count,
+                    "attempt": attempt,
+                    "concurrent": concurrent,
+                    "wall_s": wall,
+                    "sent": len(mailgun.messages) - sent_before,
+                    "llm_completions": llm.completions - llm_before,
+                    "stages": {name: agg["total_s"] for name, agg in summary["stages"].items()},
+                    "bytes": summary["bytes"],
+                    "tokens": summary["tokens"],
+                    "retries": summary["retries"],
+                    "counters": summary["counters"],
+                })
+        results_meta = {"llm_rejected": dict(llm.rejected), "hn_requests": hn.requests,
+                        "article_requests": articles.requests,
+                        "article_not_modified": articles.not_modified}
+    return results, results_meta
+
+
+def _print_table(results):
+    stages = sorted({name for r in results for name in r["stages"]})
+    header = ["stories", "run", "wall_s"] + stages
+    print("  ".join(f"{h:>13}" for h in header))
+    for r in results:
+        row = [str(r["count"]), str(r["attempt"]), f"{r['wall_s']:.2f}"]
+        row += [f"{r['stages'].get(name, 0.0):.2f}" for name in stages]
+        print("  ".join(f"{c:>13}" for c in row))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--counts", type=int, nargs="+", default=[2, 5, 10], help="story counts to time")
+    parser.add_argument("--concurrent", action="store_true", help="use generate_digest(concurrent=True)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per story count")
+    parser.add_argument("--warm-cache", action="store_true", help="keep item/summary caches between runs")
+    parser.add_argument("--hn-latency", type=float, default=0.02, help="seconds per HN API request")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="mean seconds per completion")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="+/- seconds around --llm-latency")
+    parser.add_argument("--llm-tail", type=float, default=0.0, help="fraction of completions taking 10x as long")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="fraction of LLM calls answered with 429")
+    parser.add_argument("--max-request-chars", type=int, default=200_000, help="LLM 413 threshold in characters")
+    parser.add_argument("--comments", type=int, default=120, help="comments per story")
+    parser.add_argument("--slow-seconds", type=float, default=5.0, help="seconds to trickle a 'slow' article")
+    parser.add_argument("--json", help="also write results to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the worker's INFO logging")
+    args = parser.parse_args(argv)
+
+    results, meta = run(
+        args.counts, args.concurrent, args.repeat, args.warm_cache, args.hn_latency, args.llm_latency,
+        args.llm_jitter, args.rate_limit, args.max_request_chars, args.slow_seconds, quiet=not args.verbose,
+        comments=args.comments, llm_tail=args.llm_tail,
+    )
+    _print_table(results)
+    print(f"stand-in traffic: {meta}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results, "meta": meta}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""Local stand-ins for every external service the digest talks to.
+
+    HNServer        Firebase HN API: /v0/topstories.json and /v0/item/<id>.json
+    ArticleServer   article pages from corpus.py at /articles/<kind>/<seed>,
+                    with ETags (answers If-None-Match with 304)
+    LLMServer       OpenAI/Groq-compatible /openai/v1/chat/completions with
+                    configurable latency, 429 rate and 413 size limit
+    MailgunServer   /v3/<domain>/messages and the list endpoints
+
+Each server binds 127.0.0.1 on a free port and runs on a daemon thread; use
+them as context managers. ``base_url`` is what the matching env var
+(HN_API_BASE, GROQ_BASE_URL, MAILGUN_API_BASE) should be set to.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import corpus
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json", headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data, headers: dict = None):
+        self._send(status, json.dumps(data).encode(), headers=headers)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def do_GET(self):
+        self.server.standin.count_request()
+        self.server.standin.handle_get(self)
+
+    def do_POST(self):
+        self.server.standin.count_request()
+        self.server.standin.handle_post(self, self._read_body())
+
+
+class _QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        pass  # clients dropping connections mid-body (caps, deadlines) is expected
+
+
+class StandInServer:
+    def __init__(self):
+        self._httpd = _QuietServer(("127.0.0.1", 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.standin = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def origin(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def handle_get(self, handler: _Handler):
+        handler._send_json(404, {"error": "not found"})
+
+    def handle_post(self, handler: _Handler, body: bytes):
+        handler._send_json(404, {"error": "not found"})
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class HNServer(StandInServer):
+    """Synthetic front page of `stories` stories with seeded comment trees."""
+
+    def __init__(self, article_origin: str, stories: int = 30, mix=corpus.DEFAULT_MIX,
+                 comments_per_story: int = 120, max_depth: int = 4, latency: float = 0.0, seed: int = 1):
+        super().__init__()
+        self.latency = latency
+        self.items = {}
+        self.top = []
+        rng = random.Random(seed)
+        next_id = 1_000_000
+        for rank in range(stories):
+            story_id = next_id
+            next_id += 1
+            kind = mix[rank % len(mix)]
+            kids, next_id = self._comment_tree(rng, story_id, comments_per_story, max_depth, next_id)
+            self.items[story_id] = {
+                "id": story_id, "type": "story", "by": f"user{rank}", "score": 500 - rank,
+                "title": f"Story {rank + 1} ({kind})", "url": f"{article_origin}/articles/{kind}/{story_id}",
+                "kids": kids, "descendants": comments_per_story, "time": 1_700_000_000,
+            }
+            self.top.append(story_id)
+
+    def _comment_tree(self, rng: random.Random, parent: int, budget: int, max_depth: int, next_id: int):
+        # Spread `budget` comments over a tree: ~40% top level, the rest nested.
+        top_level = []
+        frontier = []
+        for _ in range(budget):
+            depth_parent = rng.choice(frontier) if frontier and rng.random() < 0.6 else (parent, 0)
+            pid, depth = depth_parent
+            cid = next_id
+            next_id += 1
+            item = {
+                "id": cid, "type": "comment", "by": f"c{cid % 97}", "parent": pid, "time": 1_700_000_000,
+                "text": "<p>" + corpus._paragraph(rng, rng.randint(1, 4)) + "</p>", "kids": [],
+            }
+            if rng.random() < 0.03:
+                item = {"id": cid, "type": "comment", "deleted": True, "parent": pid, "kids": []}
+            self.items[cid] = item
+            if pid == parent:
+                top_level.append(cid)
+            else:
+                self.items[pid]["kids"].append(cid)
+            if depth + 1 < max_depth:
+                frontier.append((cid, depth + 1))
+        return top_level, next_id
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.origin}/v0"
+
+    def handle_get(self, handler: _Handler):
+        if self.latency:
+            time.sleep(self.latency)
+        path = urlsplit(handler.path).path
+        if path == "/v0/topstories.json":
+            return handler._send_json(200, self.top)
+        if path.startswith("/v0/item/") and path.endswith(".json"):
+            item_id = int(path[len("/v0/item/"):-len(".json")])
+            return handler._send_json(200, self.items.get(item_id))
+        handler._send_json(404, None)
+
+
+class ArticleServer(StandInServer):
+    """Serves corpus pages; `slow` pages trickle out over `slow_seconds`."""
+
+    def __init__(self, slow_seconds: float = 5.0):
+        super().__init__()
+        self.slow_seconds = slow_seconds
+        self.not_modified = 0
+
+    def handle_get(self, handler: _Handler):
+        parts = urlsplit(handler.path).path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "articles" or parts[1] not in corpus.KINDS:
+            return handler._send(404, b"not found", "text/plain")
+        kind, seed = parts[1], int(parts[2])
+        etag = f'"{kind}-{seed}"'
+        if handler.headers.get("If-None-Match") == etag:
+            with self._lock:
+                self.not_modified += 1
+            handler.send_response(304)
+            handler.send_header("ETag", etag)
+            handler.end_headers()
+            return
+        content_type, body = corpus.page(kind, seed)
+        if kind != "slow":
+            return handler._send(200, body, content_type, headers={"ETag": etag})
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.send_header("ETag", etag)
+        handler.end_headers()
+        chunks = 50
+        size = len(body) // chunks + 1
+        try:
+            for i in range(chunks):
+                handler.wfile.write(body[i * size:(i + 1) * size])
+                handler.wfile.flush()
+                time.sleep(self.slow_seconds / chunks)
+        except ConnectionError:
+            pass  # client gave up (e.g. its deadline passed)
+
+
+class LLMServer(StandInServer):
+    """OpenAI/Groq-compatible chat completions endpoint.
+
+    Args:
+        latency: Mean seconds per completion.
+        jitter: Uniform +/- seconds added to `latency`.
+        rate_limit_ratio: Fraction of requests answered with 429.
+        max_request_chars: Requests with more message characters get 413.
+        tail_ratio: Fraction of completions that take `tail_factor` times as long.
+    """
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2, rate_limit_ratio: float = 0.0,
+                 max_request_chars: int = 200_000, retry_after: float = 1.0, seed: int = 1,
+                 tail_ratio: float = 0.0, tail_factor: float = 10.0):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.max_request_chars = max_request_chars
+        self.retry_after = retry_after
+        self.tail_ratio = tail_ratio
+        self.tail_factor = tail_factor
+        self._rng = random.Random(seed)
+        self.completions = 0
+        self.rejected = {429: 0, 413: 0}
+
+    @property
+    def base_url(self) -> str:
+        return self.origin
+
+    def _rate_limit_headers(self) -> dict:
+        return {
+            "x-ratelimit-limit-requests": "1000",
+            "x-ratelimit-remaining-requests": "999",
+            "x-ratelimit-reset-requests": "1m0s",
+            "x-ratelimit-limit-tokens": "200000",
+            "x-ratelimit-remaining-tokens": "199000",
+            "x-ratelimit-reset-tokens": "1.5s",
+        }
+
+    def handle_post(self, handler: _Handler, body: bytes):
+        path = urlsplit(handler.path).path
+        if not path.endswith("/chat/completions"):
+            return handler._send_json(404, {"error": {"message": "not found"}})
+        request = json.loads(body or b"{}")
+        chars = sum(len(m.get("content") or "") for m in request.get("messages", []))
+
+        with self._lock:
+            roll = self._rng.random()
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            if self._rng.random() < self.tail_ratio:
+                delay *= self.tail_factor
+
+        if chars > self.max_request_chars:
+            with self._lock:
+                self.rejected[413] += 1
+            return handler._send_json(413, {"error": {"message": "Request too large", "type": "invalid_request_error"}})
+        if roll < self.rate_limit_ratio:
+            with self._lock:
+                self.rejected[429] += 1
+            headers = dict(self._rate_limit_headers(), **{"retry-after": str(self.retry_after)})
+            headers["x-ratelimit-remaining-requests"] = "0"
+            return handler._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit"}}, headers)
+
+        time.sleep(delay)
+        with self._lock:
+            self.completions += 1
+        prompt_tokens = chars // 4
+        completion = "Stand-in summary. " + " ".join(corpus._WORDS[:20])
+        if (request.get("response_format") or {}).get("type") == "json_object":
+            # Batched summaries: answer every item of the {"items": [...]} payload
+            items = json.loads(request["messages"][-1]["content"]).get("items", [])
+            completion = json.dumps({"summaries": {item["id"]: completion for item in items}})
+        handler._send_json(200, {
+            "id": f"chatcmpl-{self.completions}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "standin"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": completion}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 40,
+                      "total_tokens": prompt_tokens + 40},
+        }, self._rate_limit_headers())
+
+
+class MailgunServer(StandInServer):
+    """Accepts message sends and answers list lookups."""
+
+    def __init__(self, latency: float = 0.2):
+        super().__init__()
+        self.latency = latency
+        self.messages = []
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.origin}/v3"
+
+    def handle_get(self, handler: _Handler):
+        handler._send_json(200, {"list": {"members_count": 0}})
+
+    def handle_post(self, handler: _Handler, body: bytes):
+        time.sleep(self.latency)
+        if urlsplit(handler.path).path.endswith("/messages"):
+            with self._lock:
+                self.messages.append(len(body))
+            return handler._send_json(200, {"id": f"<{len(self.messages)}@standin>", "message": "Queued. Thank you."})
+        handler._send_json(200, {"message": "ok"})
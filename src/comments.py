@@ -0,0 +1,138 @@
+"""Comment preprocessing before summarization.
+
+HN comment ``text`` is HTML: entities, ``<p>`` between paragraphs, ``<a>``
+links, ``<i>`` and ``<pre><code>`` blocks. The comment walk used to
+concatenate it as is, markup and all, so a good part of every comment
+request was tags and entities, and a busy thread sent far more than the model
+could take. ``prepare`` turns the walked comments into the LLM input instead:
+
+1. strip HTML to plain text (paragraphs and code blocks kept),
+2. drop deleted, dead and empty comments and repeats of the same text,
+3. rank what's left by position in the thread and reply count: early
+   comments with lively sub-threads say most about the discussion,
+4. pack the best-ranked comments into the token budget, each cut to at most
+   MAX_COMMENT_CHARS so a single essay can't crowd the others out, and
+   return them in thread order.
+"""
+import html
+import math
+import re
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from logger import setup_logger
+import metrics
+import token_budget
+
+logger = setup_logger(__name__)
+
+# A longer comment is cut to this many characters.
+MAX_COMMENT_CHARS = 1500
+
+# Comments shorter than this after cleanup ("+1", "This.") carry no opinion worth the tokens.
+MIN_COMMENT_CHARS = 15
+
+_PRE_RE = re.compile(r"<pre>(.*?)</pre>", re.S | re.I)
+_PARAGRAPH_RE = re.compile(r"<p\s*/?>|<br\s*/?>", re.I)
+_TAG_RE = re.compile(r"<[^>]+>")
+_NON_WORD_RE = re.compile(r"\W+")
+
+
+class Comment(NamedTuple):
+    id: int
+    depth: int          # 1 = top level
+    position: int       # among its walked siblings, 0 = first in HN's order
+    replies: int
+    order: int          # in the walk
+    text: str
+
+    @property
+    def score(self) -> float:
+        return (1 + math.log2(1 + self.replies)) / (self.depth * math.sqrt(1 + self.position))
+
+
+def comment_text(markup: str) -> str:
+    """Plain text of an HN comment's HTML."""
+    blocks = []
+    last = 0
+    for match in _PRE_RE.finditer(markup):
+        blocks.append(_inline_text(markup[last:match.start()]))
+        code = html.unescape(_TAG_RE.sub("", match.group(1))).strip("\n")
+        blocks.append(code)
+        last = match.end()
+    blocks.append(_inline_text(markup[last:]))
+    return "\n\n".join(block for block in blocks if block)
+
+
+def _inline_text(markup: str) -> str:
+    text = html.unescape(_TAG_RE.sub("", _PARAGRAPH_RE.sub("\n\n", markup)))
+    paragraphs = (" ".join(paragraph.split()) for paragraph in text.split("\n\n"))
+    return "\n\n".join(paragraph for paragraph in paragraphs if paragraph)
+
+
+def _shorten(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    head = text[:max_chars]
+    cut = head.rfind(" ")
+    return (head[:cut] if cut > max_chars // 2 else head).rstrip() + " " + token_budget.GAP_MARKER
+
+
+def clean(walked: Iterable[Tuple[int, dict]]) -> List[Comment]:
+    """Cleaned, de-duplicated comments from (depth, item) pairs in walk order."""
+    comments: List[Comment] = []
+    seen = set()
+    siblings: Dict[int, int] = {}
+    dropped = 0
+    for depth, item in walked:
+        if item.get("deleted") or item.get("dead"):
+            dropped += 1
+            continue
+        text = comment_text(item.get("text") or "")
+        key = _NON_WORD_RE.sub(" ", text.lower()).strip()
+        if len(key) < MIN_COMMENT_CHARS or key in seen:
+            dropped += 1
+            continue
+        seen.add(key)
+        parent = item.get("parent", 0)
+        position = siblings.get(parent, 0)
+        siblings[parent] = position + 1
+        comments.append(Comment(item["id"], depth, position, len(item.get("kids") or []),
+                                len(comments), _shorten(text, MAX_COMMENT_CHARS)))
+    if dropped:
+        metrics.incr("comments_dropped", dropped)
+    return comments
+
+
+def select(comments: List[Comment], max_tokens: int) -> List[Comment]:
+    """The best-ranked comments that fit in `max_tokens` together, in thread order."""
+    budget = max_tokens * token_budget.CHARS_PER_TOKEN
+    used = 0
+    chosen = []
+    for comment in sorted(comments, key=lambda c: (-c.score, c.order)):
+        cost = len(comment.text) + 2
+        if used + cost <= budget:
+            chosen.append(comment)
+            used += cost
+    return sorted(chosen, key=lambda c: c.order)
+
+
+def prepare(walked: Iterable[Tuple[int, dict]], max_tokens: int) -> str:
+    """
+    Turn walked (depth, item) comment pairs into LLM input of at most ~`max_tokens`.
+
+    Returns:
+        str: The selected comments' text, one paragraph block per comment
+        (empty if none are left)
+    """
+    walked = list(walked)
+    raw_chars = sum(len(item.get("text") or "") for _, item in walked)
+    comments = clean(walked)
+    chosen = select(comments, max_tokens)
+    text = "\n\n".join(comment.text for comment in chosen)
+
+    metrics.incr("comments_kept", len(chosen))
+    if len(chosen) < len(comments):
+        metrics.incr("comments_left_out", len(comments) - len(chosen))
+    logger.info(f"Comments prepared: {len(chosen)} of {len(walked)} kept, "
+                f"{raw_chars} characters of HTML down to {len(text)}")
+    return text
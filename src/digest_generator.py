@@ -1,42 +1,230 @@
-import requests 
-from typing import List
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager, nullcontext
+from typing import List, Dict, Optional, Iterator, Tuple
+from urllib.parse import urlsplit
+import comments
+import http_client
+import llm_client
 import scrape
 import summarize
+import item_cache
+import metrics
+import summary_store
+from journal import RunJournal
 from logger import setup_logger, log_section, log_progress
 
 logger = setup_logger(__name__)
 
+# Worker counts per pipeline stage used by generate_digest(concurrent=True).
+# HN API calls are cheap and scraping is bandwidth bound. The LLM client's rate
+# limiter keeps parallel stories within Groq's limits; letting as many stories
+# into the LLM stage as it sends requests at once gives short summaries a
+# chance to be batched together (see summary_batcher).
+DEFAULT_WORKERS = {
+    "hn": 8,
+    "scrape": 4,
+    "llm": 4,
+}
+
+
+class StoryAbandoned(Exception):
+    """Raised inside a story worker once its results are no longer wanted."""
+
+
+class StageLimits:
+    """Caps how many story workers may be inside each pipeline stage at once.
+
+    After cancel(), workers raise StoryAbandoned at their next stage boundary
+    instead of starting more work, and LLM calls made under `cancelled` (see
+    llm_client.cancel_on) are abandoned.
+    """
+
+    def __init__(self, workers: Optional[Dict[str, int]] = None):
+        limits = dict(DEFAULT_WORKERS)
+        if workers:
+            unknown = set(workers) - set(DEFAULT_WORKERS)
+            if unknown:
+                raise ValueError(f"Unknown pipeline stage(s): {', '.join(sorted(unknown))}")
+            limits.update(workers)
+        self.workers = limits
+        self._semaphores = {
+            stage: threading.BoundedSemaphore(max(1, int(count)))
+            for stage, count in limits.items()
+        }
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    @contextmanager
+    def __call__(self, stage: str):
+        if self.cancelled.is_set():
+            raise StoryAbandoned(f"cancelled before {stage} stage")
+        with self._semaphores[stage]:
+            if self.cancelled.is_set():
+                raise StoryAbandoned(f"cancelled before {stage} stage")
+            yield
+
+
+def _stage(stages: Optional[StageLimits], name: str):
+    return stages(name) if stages is not None else nullcontext()
+
+
+HN_API_BASE = os.getenv("HN_API_BASE", "https://hacker-news.firebaseio.com/v0")
+
+# Seconds for (connect, read) on every HN API call.
+HN_TIMEOUT = (5, 10)
+
+# Max concurrent item requests for a single fetch_items() call; also the
+# per-host cap for the HN API in the shared HTTP client.
+HN_FETCH_WORKERS = 16
+
+http_client.set_host_limit(urlsplit(HN_API_BASE).netloc, HN_FETCH_WORKERS)
+
+
+def _get_json(path: str, deadline: Optional[http_client.Deadline] = None):
+    with metrics.stage("hn_fetch"):
+        res = http_client.get(f"{HN_API_BASE}/{path}", timeout=HN_TIMEOUT, deadline=deadline)
+        res.raise_for_status()
+        metrics.add_bytes(len(res.content))
+        return res.json()
+
 
 def top_stories(count = 10) -> List[int]:
-    res = requests.get('https://hacker-news.firebaseio.com/v0/topstories.json')
-    top_stories: List[int] = res.json()[:count]
+    top_stories: List[int] = _get_json("topstories.json")[:count]
     return top_stories
 
 
-def get_story_data(item_id: int) -> dict:
-    res = requests.get(f'https://hacker-news.firebaseio.com/v0/item/{item_id}.json')
-    return res.json()
+def get_story_data(item_id: int, deadline: Optional[http_client.Deadline] = None) -> dict:
+    cache = item_cache.get_item_cache()
+    if cache is not None:
+        cached = cache.get(item_id)
+        if cached is not None:
+            metrics.incr("hn_cache_hit")
+            return cached
+        metrics.incr("hn_cache_miss")
+    item = _get_json(f"item/{item_id}.json", deadline)
+    if cache is not None and item:
+        cache.put(item)
+    return item
 
 
-def get_post_summary(story_data: dict) -> str:
+def _get_item_or_none(item_id: int, deadline: Optional[http_client.Deadline] = None) -> Optional[dict]:
+    try:
+        return get_story_data(item_id, deadline)
+    except (http_client.RequestException, ValueError) as e:
+        logger.warning(f"Failed to fetch item {item_id}: {e}")
+        return None
+
+
+def fetch_items(item_ids: List[int], max_workers: int = HN_FETCH_WORKERS,
+                deadline: Optional[http_client.Deadline] = None) -> List[Optional[dict]]:
+    """Fetch many HN items concurrently over the shared session.
+
+    Returns one entry per id in the same order as `item_ids`; items that could
+    not be fetched (after retries, or before `deadline`) or don't exist are None.
+    """
+    if not item_ids:
+        return []
+    workers = max(1, min(max_workers, len(item_ids)))
+    if workers == 1:
+        return [_get_item_or_none(item_id, deadline) for item_id in item_ids]
+    fetch = metrics.propagate(_get_item_or_none)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hn-item") as pool:
+        return list(pool.map(lambda item_id: fetch(item_id, deadline), item_ids))
+
+
+@dataclass
+class CommentBudget:
+    """Limits for how much of a comment tree is fetched for the LLM.
+
+    The walk stops as soon as any limit is hit, so comments that would only be
+    cut from the LLM input are never downloaded.
+    """
+    max_items: int = 150            # comments yielded in total
+    max_depth: int = 3              # 1 = top-level comments only
+    max_chars: int = 24000          # raw comment HTML collected (comments.prepare packs the LLM input)
+    deadline_s: float = 30.0        # wall-clock seconds for the whole walk
+    max_top_level: int = 40         # top-level comments followed, in HN rank order
+    max_replies: int = 5            # replies followed per comment, in HN rank order
+
+
+def walk_comment_tree(root_ids: List[int], budget: Optional[CommentBudget] = None) -> Iterator[Tuple[int, dict]]:
+    """Breadth-first walk of a story's comment tree within `budget`.
+
+    Yields (depth, comment) pairs as each batch of items arrives, top-level
+    comments (depth 1) first. Deleted and dead comments are not yielded, but
+    their replies are still followed.
+    """
+    budget = budget or CommentBudget()
+    # Bounds every item request too, retries included, not just the gaps between batches
+    deadline = http_client.Deadline(budget.deadline_s)
+
+    frontier = deque((1, item_id) for item_id in root_ids[:budget.max_top_level])
+    yielded = 0
+    chars = 0
+
+    while frontier and yielded < budget.max_items:
+        if deadline.expired:
+            logger.info(f"Comment walk hit its {budget.deadline_s}s deadline after {yielded} comments")
+            return
+
+        batch_size = min(HN_FETCH_WORKERS, budget.max_items - yielded, len(frontier))
+        batch = [frontier.popleft() for _ in range(batch_size)]
+        items = fetch_items([item_id for _, item_id in batch], deadline=deadline)
+
+        for (depth, _), item in zip(batch, items):
+            if not item:
+                continue
+            if depth < budget.max_depth:
+                frontier.extend((depth + 1, kid) for kid in item.get('kids', [])[:budget.max_replies])
+            if item.get('deleted') or item.get('dead') or not item.get('text'):
+                continue
+
+            yield depth, item
+            yielded += 1
+            chars += len(item['text'])
+            if yielded >= budget.max_items or chars >= budget.max_chars:
+                return
+
+
+def get_post_summary(story_data: dict, stages: Optional[StageLimits] = None) -> str:
     url = story_data.get('url', '')
     if not url:
         return None
-    scraped_contents = scrape.scrape_site(url)
-    if scraped_contents is not None:
-        return summarize.summarize(scraped_contents, prompt_mode="post")
-    return None
+    with _stage(stages, "scrape"):
+        scraped_contents = scrape.scrape_site(url)
+    if scraped_contents is None:
+        return None
+
+    store = summary_store.get_summary_store()
+    if store is not None:
+        cached = store.get_post_summary(url, scraped_contents)
+        if cached is not None:
+            logger.info(f"Article unchanged since a previous digest, reusing its summary: {url}")
+            metrics.incr("post_summary_reused")
+            return cached
+
+    with _stage(stages, "llm"):
+        summary = summarize.summarize(scraped_contents, prompt_mode="post")
+    if store is not None and summary:
+        store.put_post_summary(url, scraped_contents, summary)
+    return summary
 
 
-def get_comment_summaries(comment_ids: List[int]) -> str:
-    all_comments_text = ""
-    for comment_id in comment_ids:
-        res = requests.get(f'https://hacker-news.firebaseio.com/v0/item/{comment_id}.json')
-        comment_data = res.json()
-        if comment_data and 'text' in comment_data:
-            all_comments_text += comment_data['text'] + "\n"
+def get_comment_summaries(comment_ids: List[int], stages: Optional[StageLimits] = None,
+                          budget: Optional[CommentBudget] = None) -> str:
+    with _stage(stages, "hn"):
+        walked = list(walk_comment_tree(comment_ids, budget))
+    all_comments_text = comments.prepare(walked, summarize.input_budget("comments"))
     if all_comments_text:
-        return summarize.summarize(all_comments_text, prompt_mode="comments")
+        with _stage(stages, "llm"):
+            return summarize.summarize(all_comments_text, prompt_mode="comments")
     return None
 
 
@@ -44,42 +232,229 @@ def get_comments_url(item_id: int) -> str:
     return f"https://news.ycombinator.com/item?id={item_id}"
 
 
-def generate_digest(count = 10) -> dict:
+def _story_entry(story_id: int, story_data: dict, post_summary: Optional[str],
+                 comment_summary: Optional[str]) -> dict:
+    return {
+        "title": story_data.get('title', 'No Title'),
+        "url": story_data.get('url', ''),
+        "comments_url": get_comments_url(story_id),
+        "points": story_data.get('score', 0),
+        "author": story_data.get('by', 'unknown'),
+        "comments_count": len(story_data.get('kids', [])),
+        "post_summary": post_summary,
+        "comment_summary": comment_summary,
+    }
+
+
+def build_story_entry(story_id: int, idx: int, total: int, stages: Optional[StageLimits] = None,
+                      comment_budget: Optional[CommentBudget] = None,
+                      story_data: Optional[dict] = None) -> dict:
+    """Fetch, scrape and summarize a single story into its digest entry.
+
+    `story_data` skips the HN fetch when the item was already loaded.
+    """
+    if story_data is None:
+        with _stage(stages, "hn"):
+            story_data = get_story_data(story_id)
+    if not story_data:
+        raise ValueError(f"HN returned no data for story {story_id}")
+    title = story_data.get('title', 'No Title')
+    metrics.set_story_info(title=title)
+
+    log_progress(idx, total, f"Processing: {title[:50]}{'...' if len(title) > 50 else ''}", logger)
+
+    log_section(f"Scraping [{idx}/{total}]", logger)
+    summary = get_post_summary(story_data, stages)
+
+    comment_ids = story_data.get('kids', [])
+    log_section(f"Summarizing Comments [{idx}/{total}]", logger)
+    comment_summary = None
+    comment_count = story_data.get('descendants', len(comment_ids))
+    store = summary_store.get_summary_store()
+    if store is not None:
+        comment_summary = store.get_comment_summary(story_id, comment_count)
+        if comment_summary is not None:
+            logger.info(f"Discussion hasn't grown much ({comment_count} comments), reusing previous comment summary")
+            metrics.incr("comment_summary_reused")
+    if comment_summary is None:
+        logger.info(f"Processing {len(comment_ids)} comments")
+        comment_summary = get_comment_summaries(comment_ids, stages, comment_budget)
+        if store is not None and comment_summary:
+            store.put_comment_summary(story_id, comment_count, comment_summary)
+
+    logger.info(f"Completed story {idx}/{total}\n")
+
+    return _story_entry(story_id, story_data, summary, comment_summary)
+
+
+def _try_build_story_entry(story_id: int, idx: int, total: int, stages: Optional[StageLimits],
+                           comment_budget: Optional[CommentBudget],
+                           journal: Optional[RunJournal],
+                           story_data: Optional[dict] = None) -> Optional[dict]:
+    cancellable = llm_client.cancel_on(stages.cancelled) if stages is not None else nullcontext()
+    with metrics.story(story_id, idx), cancellable:
+        try:
+            entry = build_story_entry(story_id, idx, total, stages, comment_budget, story_data)
+        except (StoryAbandoned, llm_client.LLMCancelled) as e:
+            logger.info(f"Story {story_id} [{idx}/{total}] abandoned: {e}")
+            metrics.set_story_info(abandoned=True)
+            return None
+        except Exception as e:
+            logger.error(f"Story {story_id} [{idx}/{total}] failed, leaving it out of the digest: {e}")
+            metrics.set_story_info(error=str(e))
+            return None
+    if journal is not None:
+        try:
+            journal.record_story(story_id, entry)
+        except OSError as e:
+            logger.warning(f"Could not checkpoint story {story_id}: {e}")
+    return entry
+
+
+def _run_with_deadline(story_ids: List[int], count: int, deadline_s: float, done: Dict[int, Optional[dict]],
+                       stages: StageLimits, comment_budget: Optional[CommentBudget],
+                       journal: Optional[RunJournal]) -> Dict[int, dict]:
+    """Process candidate stories concurrently and pick `count` of them by the deadline.
+
+    Returns as soon as the `count` highest-ranked successful stories are all
+    known, or when the deadline passes. Finished stories are taken in rank
+    order; if fewer than `count` finished, the highest-ranked stragglers are
+    added as title-only entries. Unfinished workers are cancelled at their next
+    stage boundary or within llm_client.CANCEL_POLL_S of the LLM call they're
+    waiting on, so they never hold up the digest. A worker inside a scrape
+    runs on until that scrape's own deadline, and the interpreter still waits
+    for it at exit.
+    """
+    deadline = time.monotonic() + deadline_s
+    total = len(story_ids)
+
+    # Story items are cheap to fetch and needed for title-only fallbacks.
+    story_items = dict(zip(story_ids, fetch_items(story_ids)))
+
+    pending = [(idx, story_id) for idx, story_id in enumerate(story_ids, 1)
+               if story_id not in done and story_items[story_id]]
+    pool = ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="story") if pending else None
+    futures = {
+        pool.submit(_try_build_story_entry, story_id, idx, total, stages, comment_budget, journal,
+                    story_items[story_id]): story_id
+        for idx, story_id in pending
+    }
+    for story_id in story_ids:
+        if not story_items[story_id] and story_id not in done:
+            done[story_id] = None
+
+    def settled() -> bool:
+        found = 0
+        for story_id in story_ids:
+            if story_id not in done:
+                return False
+            if done[story_id] is not None:
+                found += 1
+                if found == count:
+                    return True
+        return True
+
+    not_done = set(futures)
+    while not_done and not settled():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        finished, not_done = wait(not_done, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in finished:
+            done[futures[future]] = future.result()
+
+    if not_done:
+        logger.warning(f"Deadline of {deadline_s}s reached with {len(not_done)} stories unfinished, abandoning them")
+    stages.cancel()
+    for future in not_done:
+        future.cancel()
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+    selected = [story_id for story_id in story_ids if done.get(story_id) is not None][:count]
+    stragglers = [futures[f] for f in not_done]
+    fallback = [story_id for story_id in story_ids if story_id in stragglers][:count - len(selected)]
+    for story_id in fallback:
+        logger.info(f"Story {story_id} missed the deadline, including it title-only")
+        metrics.incr("title_only_fallback")
+        done[story_id] = _story_entry(story_id, story_items[story_id], None, None)
+
+    chosen = set(selected) | set(fallback)
+    return {story_id: done[story_id] for story_id in story_ids if story_id in chosen}
+
+
+def generate_digest(count = 10, concurrent = False, workers: Optional[Dict[str, int]] = None,
+                    comment_budget: Optional[CommentBudget] = None,
+                    journal: Optional[RunJournal] = None,
+                    deadline_s: Optional[float] = None, overfetch: int = 0) -> dict:
+    """Build the digest for the top `count` stories.
+
+    Args:
+        count: Number of top stories to include.
+        concurrent: Process stories in parallel instead of one after another.
+        workers: Per-stage worker counts for concurrent mode, e.g.
+            ``{"hn": 8, "scrape": 4, "llm": 4}``. Missing stages use DEFAULT_WORKERS.
+        comment_budget: Limits for each story's comment-tree walk; defaults to CommentBudget().
+        journal: Checkpoint journal. Each finished story is recorded as soon as it
+            is ready. If the journal already holds a run (resume), its ranking and
+            finished entries are reused and only the missing stories are processed.
+        deadline_s: Wall-clock budget in seconds. Implies concurrent mode; the
+            digest is assembled from whatever finished in time (see _run_with_deadline).
+        overfetch: Extra candidates beyond `count` to process in deadline mode,
+            so a few slow or failing stories can be replaced by the next ones.
+
+    Returns:
+        dict: story id -> digest entry, in top-stories ranking order. Stories that
+        fail are logged and left out instead of aborting the whole digest.
+    """
+    candidates = count + overfetch if deadline_s is not None else count
+
     log_section("Fetching Stories", logger)
-    story_ids = top_stories(count)
-    logger.info(f"Found {len(story_ids)} top stories")
-    
-    digest_data = {}
+    if journal is not None and journal.story_ids:
+        story_ids = journal.story_ids[:candidates]
+        done = {story_id: journal.entries[story_id] for story_id in story_ids if story_id in journal.entries}
+        logger.info(f"Resuming from journal: {len(done)} of {len(story_ids)} stories already done")
+    else:
+        story_ids = top_stories(candidates)
+        done = {}
+        if journal is not None:
+            journal.start(story_ids)
+        logger.info(f"Found {len(story_ids)} top stories")
+
     total = len(story_ids)
-    
-    for idx, story_id in enumerate(story_ids, 1):
-        story_data = get_story_data(story_id)
-        title = story_data.get('title', 'No Title')
-        
-        log_progress(idx, total, f"Processing: {title[:50]}{'...' if len(title) > 50 else ''}", logger)
-        
-        log_section(f"Scraping [{idx}/{total}]", logger)
-        summary = get_post_summary(story_data)
-        
-        comment_ids = story_data.get('kids', [])
-        log_section(f"Summarizing Comments [{idx}/{total}]", logger)
-        logger.info(f"Processing {len(comment_ids)} comments")
-        comment_summary = get_comment_summaries(comment_ids)
-        
-        digest_data[story_id] = {
-            "title": title,
-            "url": story_data.get('url', ''),
-            "comments_url": get_comments_url(story_id),
-            "points": story_data.get('score', 0),
-            "author": story_data.get('by', 'unknown'),
-            "comments_count": len(comment_ids),
-            "post_summary": summary,
-            "comment_summary": comment_summary,
-        }
-        
-        logger.info(f"Completed story {idx}/{total}\n")
-    
+    pending = [(idx, story_id) for idx, story_id in enumerate(story_ids, 1) if story_id not in done]
+
+    if deadline_s is not None:
+        stages = StageLimits(workers)
+        logger.info(f"Processing {total} candidates for {count} slots within {deadline_s}s, workers: {stages.workers}")
+        digest_data = _run_with_deadline(story_ids, count, deadline_s, done, stages, comment_budget, journal)
+        failed = [story_id for story_id in story_ids if story_id in done and done[story_id] is None]
+    else:
+        if concurrent and pending:
+            stages = StageLimits(workers)
+            logger.info(f"Processing stories concurrently with workers: {stages.workers}")
+            with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="story") as pool:
+                futures = {
+                    story_id: pool.submit(_try_build_story_entry, story_id, idx, total, stages, comment_budget, journal)
+                    for idx, story_id in pending
+                }
+                done.update((story_id, future.result()) for story_id, future in futures.items())
+        else:
+            for idx, story_id in pending:
+                done[story_id] = _try_build_story_entry(story_id, idx, total, None, comment_budget, journal)
+
+        digest_data = {}
+        failed = []
+        for story_id in story_ids:
+            entry = done.get(story_id)
+            if entry is None:
+                failed.append(story_id)
+            else:
+                digest_data[story_id] = entry
+
     log_section("Digest Complete", logger)
     logger.info(f"Generated digest for {len(digest_data)} stories")
-    
-    return digest_data
\ No newline at end of file
+    if failed:
+        logger.warning(f"{len(failed)} stories failed: {', '.join(str(s) for s in failed)}")
+
+    return digest_data
@@ -0,0 +1,136 @@
+"""Process pool for the CPU-bound half of scraping.
+
+Readability, lxml and BeautifulSoup hold the GIL while they parse, so with
+concurrent stories every page's extraction still queued up on one core.
+``scrape_site`` keeps downloading on the calling thread and hands the decoded
+page to a pool of worker processes instead, so several large pages parse in
+parallel.
+
+The pool is bounded: at most EXTRACT_WORKERS pages are being parsed and
+EXTRACT_QUEUE more are waiting, and callers block (within their deadline)
+until a slot frees up, so downloaded pages can't pile up in memory. Stage
+timings recorded in the worker are merged into the caller's run report.
+
+PDF text extraction (pdf_extract.py) runs in the same pool; PDFs are passed
+by the path of their downloaded temporary file.
+
+``EXTRACT_WORKERS=0`` runs extraction on the calling thread, as before.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from logger import setup_logger
+import http_client
+import metrics
+
+logger = setup_logger(__name__)
+
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+EXTRACT_QUEUE = int(os.getenv("EXTRACT_QUEUE", EXTRACT_WORKERS))
+
+
+def _run(kind: str, payload: str, url: str) -> Optional[str]:
+    if kind == "pdf":
+        import pdf_extract
+        return pdf_extract.extract_text(payload, url)
+    import scrape
+    return scrape.extract_content(payload, url)
+
+
+def _extract_in_worker(kind: str, payload: str, url: str) -> Tuple[Optional[str], Dict[str, Dict[str, float]]]:
+    """Runs in a worker process: extract, and return the stage timings with the text."""
+    report = metrics.start_run()
+    text = _run(kind, payload, url)
+    return text, report.run["stages"]
+
+
+class ExtractPool:
+    """Bounded process pool running scrape.extract_content and pdf_extract.extract_text."""
+
+    def __init__(self, workers: int = EXTRACT_WORKERS, queue_size: int = EXTRACT_QUEUE):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max(1, workers + queue_size))
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the parent is multi-threaded and holds open
+                # sockets and SQLite handles that a forked child must not inherit.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def _reset(self, executor: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def extract(self, html_content: str, url: str, deadline: http_client.Deadline) -> Optional[str]:
+        """
+        Extract `html_content` in a worker process, waiting at most until `deadline`.
+
+        Raises:
+            DeadlineExceeded: If no slot freed up, or the worker didn't finish, in time
+        """
+        return self._submit("html", html_content, url, deadline)
+
+    def extract_pdf(self, path: str, url: str, deadline: http_client.Deadline) -> Optional[str]:
+        """Like `extract`, for the PDF file at `path`."""
+        return self._submit("pdf", path, url, deadline)
+
+    def _submit(self, kind: str, payload: str, url: str, deadline: http_client.Deadline) -> Optional[str]:
+        if self.workers <= 0:
+            deadline.check("extraction")
+            return _run(kind, payload, url)
+
+        with metrics.stage("extract_queue"):
+            if not self._slots.acquire(timeout=deadline.remaining()):
+                raise http_client.DeadlineExceeded(f"no extraction worker free within deadline: {url}")
+        executor = self._get_executor()
+        try:
+            future = executor.submit(_extract_in_worker, kind, payload, url)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the worker is done with the page, even if we stop waiting
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            text, stages = future.result(timeout=deadline.remaining())
+        except FutureTimeout:
+            future.cancel()
+            raise http_client.DeadlineExceeded(f"extraction exceeded deadline: {url}")
+        except BrokenProcessPool as e:
+            logger.warning(f"Extraction worker died ({e}), restarting pool: {url}")
+            metrics.incr("extract_pool_broken")
+            self._reset(executor)
+            return None
+        metrics.merge_stages(stages)
+        return text
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+_pool_lock = threading.Lock()
+_pool: Optional[ExtractPool] = None
+
+
+def get_extract_pool() -> ExtractPool:
+    """Shared process-wide pool (workers start on first use)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExtractPool()
+        return _pool
@@ -0,0 +1,263 @@
+"""Site-specific fast paths for scraping.
+
+A good share of HN links go to a few hosts where the generic path (download a
+heavy HTML page, run readability over it) is slow and gives poor text: GitHub
+repos, arXiv papers, YouTube videos, tweets and raw text files. For those the
+content is available much more directly, from an API, an oEmbed endpoint, the
+video's own metadata or the raw file, so ``scrape_site`` asks this registry first and only falls back to
+the generic path when no extractor matches or the matching one comes back empty.
+
+Extractors are registered with ``register_extractor``:
+
+    @register_extractor("example", hosts=("example.com",), paths=r"^/posts/\\d+")
+    def _example(url, parts, deadline):
+        ...
+        return text  # or None to fall back to the generic path
+
+A result whose body (below the title header) is shorter than the extractor's
+``min_chars`` (default MIN_CONTENT_CHARS) also falls back.
+
+Each call is timed as the ``extractor_<name>`` stage of the run report and
+counted as ``extractor_<name>_hit`` or ``_miss``.
+"""
+import html
+import json
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Pattern, Tuple
+from urllib.parse import SplitResult, parse_qs, quote, urlsplit
+
+from logger import setup_logger
+import http_client
+import metrics
+
+logger = setup_logger(__name__)
+
+# Decoded bytes read from any fast-path response.
+MAX_BYTES = 1_000_000
+
+# Same minimum as the generic path, counted on the body below the title header.
+# Extractors for inherently short content register a lower one.
+MIN_CONTENT_CHARS = 100
+
+USER_AGENT = "hn-daily-digest (+https://github.com/mebinthattil/HackerNews-Daily-Email-Digest)"
+
+ExtractFn = Callable[[str, SplitResult, http_client.Deadline], Optional[str]]
+
+
+@dataclass
+class SiteExtractor:
+    name: str
+    hosts: Tuple[str, ...]          # exact hosts, without "www."/"m."; empty matches any host
+    paths: Optional[Pattern]        # regex the URL path must match, if set
+    extract: ExtractFn
+    min_chars: int = MIN_CONTENT_CHARS
+
+    def matches(self, parts: SplitResult) -> bool:
+        host = (parts.hostname or "").lower()
+        for prefix in ("www.", "m."):
+            if host.startswith(prefix):
+                host = host[len(prefix):]
+        if self.hosts and host not in self.hosts:
+            return False
+        return self.paths is None or bool(self.paths.search(parts.path))
+
+
+_REGISTRY: List[SiteExtractor] = []
+
+
+def register_extractor(name: str, hosts: Tuple[str, ...] = (), paths: Optional[str] = None,
+                       min_chars: int = MIN_CONTENT_CHARS):
+    """Decorator adding an extractor; earlier registrations win when several match."""
+    def decorator(fn: ExtractFn) -> ExtractFn:
+        _REGISTRY.append(SiteExtractor(name, tuple(hosts), re.compile(paths) if paths else None, fn, min_chars))
+        return fn
+    return decorator
+
+
+def find_extractor(url: str) -> Optional[SiteExtractor]:
+    parts = urlsplit(url)
+    for extractor in _REGISTRY:
+        if extractor.matches(parts):
+            return extractor
+    return None
+
+
+def extract(url: str, deadline: http_client.Deadline) -> Optional[str]:
+    """
+    Run the fast-path extractor for `url`, if there is one.
+
+    Returns:
+        str: Extracted text, or None if no extractor matched or it had less
+        than its min_chars of body text (the caller then uses the generic path)
+    """
+    extractor = find_extractor(url)
+    if extractor is None:
+        return None
+    try:
+        with metrics.stage(f"extractor_{extractor.name}"):
+            text = extractor.extract(url, urlsplit(url), deadline)
+    except http_client.DeadlineExceeded:
+        raise
+    except (http_client.RequestException, ValueError, ET.ParseError) as e:
+        logger.warning(f"{extractor.name} extractor failed for {url}, using generic scraper: {e}")
+        text = None
+    if text and len(_body(text)) < extractor.min_chars:
+        logger.info(f"{extractor.name} extractor found too little text for {url}, using generic scraper")
+        text = None
+    if not text:
+        metrics.incr(f"extractor_{extractor.name}_miss")
+        return None
+    metrics.incr(f"extractor_{extractor.name}_hit")
+    logger.info(f"Extracted {len(text)} characters with the {extractor.name} extractor: {url}")
+    return text
+
+
+def _fetch_text(url: str, deadline: http_client.Deadline, **kwargs) -> str:
+    """GET `url` and return at most MAX_BYTES of its body as text."""
+    headers = dict({"User-Agent": USER_AGENT}, **kwargs.pop("headers", {}))
+    response = http_client.get(url, headers=headers, timeout=10, stream=True, deadline=deadline, **kwargs)
+    try:
+        response.raise_for_status()
+        body = bytearray()
+        with deadline.guard(response):
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                body += chunk
+                if len(body) >= MAX_BYTES:
+                    del body[MAX_BYTES:]
+                    break
+        metrics.add_bytes(len(body))
+        return body.decode(response.encoding or "utf-8", errors="replace")
+    finally:
+        response.close()
+
+
+_RULE = "=" * 80
+
+
+def _document(title: str, body: str) -> str:
+    # Same header layout as the generic extractor's output
+    return f"Title: {title}\n{_RULE}\n" + body.strip()
+
+
+def _body(text: str) -> str:
+    return text.split(f"\n{_RULE}\n", 1)[-1].strip()
+
+
+def _strip_tags(fragment: str) -> str:
+    text = re.sub(r"<br\s*/?>", "\n", fragment, flags=re.I)
+    text = re.sub(r"<[^>]+>", "", text)
+    return html.unescape(text).strip()
+
+
+# Path segments under github.com/<owner>/ that are site pages, not repositories
+_GITHUB_RESERVED = {"orgs", "topics", "features", "marketplace", "sponsors", "settings", "explore", "collections"}
+
+
+@register_extractor("github", hosts=("github.com",), paths=r"^/[^/]+/[^/]+(/(tree/[^/]+)?)?/?$")
+def _github_readme(url: str, parts: SplitResult, deadline: http_client.Deadline) -> Optional[str]:
+    owner, repo = parts.path.strip("/").split("/")[:2]
+    if owner in _GITHUB_RESERVED:
+        return None
+    readme = _fetch_text(
+        f"https://api.github.com/repos/{owner}/{repo}/readme",
+        deadline,
+        headers={"Accept": "application/vnd.github.raw"},
+    )
+    return _document(f"{owner}/{repo}", readme) if readme.strip() else None
+
+
+@register_extractor("github_blob", hosts=("github.com",), paths=r"^/[^/]+/[^/]+/blob/.+\.(md|markdown|rst|txt)$")
+def _github_blob(url: str, parts: SplitResult, deadline: http_client.Deadline) -> Optional[str]:
+    owner, repo, _, rest = parts.path.strip("/").split("/", 3)
+    text = _fetch_text(f"https://raw.githubusercontent.com/{owner}/{repo}/{rest}", deadline)
+    return _document(f"{owner}/{repo}: {rest.split('/', 1)[-1]}", text) if text.strip() else None
+
+
+_ARXIV_ID_RE = re.compile(r"^/(?:abs|pdf)/([\w.\-/]+?)(?:v\d+)?(?:\.pdf)?/?$")
+_ATOM = {"atom": "http://www.w3.org/2005/Atom"}
+
+
+@register_extractor("arxiv", hosts=("arxiv.org",), paths=_ARXIV_ID_RE.pattern)
+def _arxiv_abstract(url: str, parts: SplitResult, deadline: http_client.Deadline) -> Optional[str]:
+    paper_id = _ARXIV_ID_RE.search(parts.path).group(1)
+    feed = ET.fromstring(_fetch_text(f"https://export.arxiv.org/api/query?id_list={quote(paper_id)}", deadline))
+    entry = feed.find("atom:entry", _ATOM)
+    if entry is None:
+        return None
+
+    def field(name: str) -> str:
+        return " ".join((entry.findtext(f"atom:{name}", default="", namespaces=_ATOM)).split())
+
+    abstract = field("summary")
+    if not abstract:
+        return None
+    authors = ", ".join(
+        " ".join(a.findtext("atom:name", default="", namespaces=_ATOM).split())
+        for a in entry.findall("atom:author", _ATOM)
+    )
+    return _document(field("title"), f"Authors: {authors}\n\n## Abstract\n{abstract}\n")
+
+
+def _oembed(endpoint: str, url: str, deadline: http_client.Deadline) -> dict:
+    return json.loads(_fetch_text(endpoint, deadline, params={"url": url, "format": "json"}))
+
+
+def _youtube_id(parts: SplitResult) -> Optional[str]:
+    if (parts.hostname or "").endswith("youtu.be"):
+        return parts.path.strip("/") or None
+    return (parse_qs(parts.query).get("v") or [None])[0]
+
+
+def _og(page: str, prop: str) -> Optional[str]:
+    match = re.search(r'<meta[^>]+property="og:%s"[^>]+content="([^"]*)"' % prop, page, re.I)
+    return html.unescape(match.group(1)) if match else None
+
+
+def _json_string(page: str, name: str, start: int = 0) -> Optional[str]:
+    """The first `"name":"..."` string value in `page` after `start`, decoded."""
+    match = re.compile(r'"%s":"((?:[^"\\]|\\.)*)"' % re.escape(name)).search(page, start)
+    return json.loads(f'"{match.group(1)}"') if match else None
+
+
+@register_extractor("youtube", hosts=("youtube.com", "youtu.be"), paths=r"^/(watch|[\w-]{6,}$)")
+def _youtube(url: str, parts: SplitResult, deadline: http_client.Deadline) -> Optional[str]:
+    video_id = _youtube_id(parts)
+    if not video_id:
+        return None
+    # The watch page embeds the player response with the full description;
+    # og:description in the head is a shortened copy of it
+    page = _fetch_text(f"https://www.youtube.com/watch?v={video_id}", deadline, headers={"Accept-Language": "en"})
+    details = page.find('"videoDetails":')
+    title = author = description = None
+    if details >= 0:
+        title = _json_string(page, "title", details)
+        author = _json_string(page, "author", details)
+        description = _json_string(page, "shortDescription", details)
+    title = title or _og(page, "title")
+    description = description or _og(page, "description")
+    # Without a description there is nothing to summarize but the title
+    if not title or not description or not description.strip():
+        return None
+    return _document(title, f"YouTube video by {author or 'unknown'}.\n\n{description.strip()}\n")
+
+
+# Posts are often a single short sentence, and the generic path can't read x.com at all
+@register_extractor("twitter", hosts=("twitter.com", "x.com"), paths=r"^/[^/]+/status/\d+", min_chars=1)
+def _tweet(url: str, parts: SplitResult, deadline: http_client.Deadline) -> Optional[str]:
+    info = _oembed("https://publish.twitter.com/oembed", url, deadline)
+    match = re.search(r"<p[^>]*>(.*?)</p>", info.get("html", ""), re.S)
+    if not match:
+        return None
+    author = info.get("author_name", "unknown")
+    return _document(f"Post by {author}", _strip_tags(match.group(1)) + "\n")
+
+
+@register_extractor("plain_text", paths=r"(?i)\.(md|markdown|txt|rst)$")
+def _plain_text(url: str, parts: SplitResult, deadline: http_client.Deadline) -> Optional[str]:
+    text = _fetch_text(url, deadline)
+    # Served as an HTML page after all (e.g. a viewer); let the generic path handle it
+    if text.lstrip()[:15].lower().startswith(("<!doctype html", "<html")):
+        return None
+    return _document(parts.path.rsplit("/", 1)[-1], text) if text.strip() else None
@@ -0,0 +1,298 @@
+"""Shared HTTP client for every outbound request the project makes.
+
+All HN API calls, article downloads and Mailgun requests go through one
+``requests.Session`` so connections are kept alive and reused instead of paying
+a fresh TCP+TLS handshake per call. On top of the session this module adds:
+
+- default (connect, read) timeouts, so no call can hang forever;
+- one retry/backoff policy: connection errors are retried for every method,
+  429/5xx responses only for idempotent GET/HEAD requests;
+- per-host concurrency caps, so parallel workers can't hammer a single host
+  (a cap is held while the request is made; streamed bodies are read after it
+  is released);
+- optional wall-clock deadlines (``Deadline``) that bound a whole fetch,
+  rather than each socket operation. Requests with a deadline skip urllib3's
+  retries (each of which would get the full timeout again): redirects, retries
+  and backoff sleeps happen in ``request`` instead, each with only the time
+  still left, and the wait for a host's concurrency cap is bounded too.
+
+``get``/``post``/``request`` mirror the ``requests`` functions of the same name,
+and ``RequestException``/``Timeout`` are re-exported so callers can keep their
+existing ``except`` clauses.
+"""
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.retry import Retry
+
+try:
+    from logger import setup_logger
+    import metrics
+except ImportError:
+    from src.logger import setup_logger
+    from src import metrics
+
+logger = setup_logger(__name__)
+
+RequestException = requests.RequestException
+Timeout = requests.Timeout
+
+
+class DeadlineExceeded(requests.Timeout):
+    """A `Deadline` ran out before the work it covers finished."""
+
+
+# Seconds for (connect, read) when the caller doesn't pass a timeout.
+DEFAULT_TIMEOUT = (5, 15)
+
+# Concurrent in-flight requests allowed per host unless overridden below.
+DEFAULT_HOST_LIMIT = 4
+HOST_LIMITS: Dict[str, int] = {}
+
+# Keep-alive connections kept per host, and how many hosts keep a pool.
+POOL_MAXSIZE = 16
+POOL_CONNECTIONS = 32
+
+RETRY_POLICY = Retry(
+    total=3,
+    connect=3,
+    read=2,
+    status=3,
+    backoff_factor=0.5,
+    backoff_max=10,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"GET", "HEAD"}),
+    # A server-chosen Retry-After could stall a worker for minutes; stick to our backoff.
+    respect_retry_after_header=False,
+    raise_on_status=False,
+)
+
+# The same policy, applied by request() itself when a Deadline is given.
+RETRY_STATUSES = frozenset(RETRY_POLICY.status_forcelist)
+RETRY_METHODS = RETRY_POLICY.allowed_methods
+
+_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_deadline_session: Optional[requests.Session] = None
+_host_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+
+
+class Deadline:
+    """A wall-clock budget shared by every step of one job (connect, redirects, body, parsing).
+
+    ``timeout()`` clamps a (connect, read) timeout to what is left, so no single
+    socket operation can outlive the deadline, and ``check()`` raises
+    `DeadlineExceeded` between steps once it has passed.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, what: str = "request"):
+        if self.expired:
+            raise DeadlineExceeded(f"{what} exceeded its {self.seconds:g}s deadline")
+
+    def timeout(self, timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT) -> Tuple[float, float]:
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        left = self.remaining()
+        return min(connect, left), min(read, left)
+
+    @contextmanager
+    def guard(self, response: requests.Response):
+        """Abort reading `response`'s body when the deadline passes.
+
+        A read timeout only bounds each socket read, and a server trickling a
+        few bytes at a time never trips it. A timer shuts the connection down at
+        the deadline instead, which wakes the blocked read; the resulting error
+        (or short read) surfaces as `DeadlineExceeded`.
+        """
+        timer = threading.Timer(self.remaining(), _abort, args=(response,))
+        timer.daemon = True
+        timer.start()
+        try:
+            yield
+        except Exception as e:
+            if self.expired:
+                raise DeadlineExceeded(f"response body exceeded its {self.seconds:g}s deadline") from e
+            raise
+        finally:
+            timer.cancel()
+        self.check("response body")
+
+
+def _abort(response: requests.Response):
+    sock = getattr(getattr(getattr(response, "raw", None), "_connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def _new_session(retries: Retry) -> requests.Session:
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=retries,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """The process-wide keep-alive session."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = _new_session(RETRY_POLICY)
+        return _session
+
+
+def _get_deadline_session() -> requests.Session:
+    """Keep-alive session without urllib3 retries, for requests bounded by a Deadline."""
+    global _deadline_session
+    with _lock:
+        if _deadline_session is None:
+            _deadline_session = _new_session(Retry(0, read=False, redirect=False, raise_on_status=False))
+        return _deadline_session
+
+
+def set_host_limit(host: str, limit: int):
+    """Allow up to `limit` concurrent requests to `host` (netloc, e.g. ``example.com:8080``)."""
+    host = host.lower()
+    with _lock:
+        HOST_LIMITS[host] = limit
+        _host_semaphores[host] = threading.BoundedSemaphore(max(1, limit))
+
+
+def _host_semaphore(url: str) -> threading.BoundedSemaphore:
+    host = urlsplit(url).netloc.lower()
+    with _lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(max(1, HOST_LIMITS.get(host, DEFAULT_HOST_LIMIT)))
+            _host_semaphores[host] = semaphore
+        return semaphore
+
+
+def request(method: str, url: str, deadline: Optional[Deadline] = None, **kwargs) -> requests.Response:
+    """Send a request through the shared session, within the host's concurrency cap.
+
+    With a `deadline`, redirects and retries are handled here one attempt at a
+    time so every attempt (and every backoff sleep) gets only the time still
+    left, and `DeadlineExceeded` is raised once it has run out.
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    if deadline is None:
+        return _send(get_session(), method, url, **kwargs)
+
+    follow = kwargs.pop("allow_redirects", True)
+    timeout = kwargs.pop("timeout")
+    max_redirects = get_session().max_redirects
+    for _ in range(max_redirects + 1):
+        response = _send_with_retries(method, url, deadline, timeout, **kwargs)
+        if not (follow and response.is_redirect):
+            return response
+        response.close()
+        url = urljoin(response.url, response.headers["location"])
+        if response.status_code == 303 or (response.status_code in (301, 302) and method == "POST"):
+            method = "GET"
+            kwargs.pop("data", None)
+            kwargs.pop("json", None)
+            kwargs.pop("files", None)
+    raise requests.TooManyRedirects(f"Exceeded {max_redirects} redirects", response=response)
+
+
+def _retryable(method: str, error: requests.RequestException) -> bool:
+    """Whether RETRY_POLICY would retry `error`: connect failures always, other failures only for idempotent methods."""
+    if method.upper() in RETRY_METHODS:
+        return isinstance(error, (requests.ConnectionError, requests.Timeout))
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+def _backoff(retry: int) -> float:
+    # urllib3's schedule: no sleep before the first retry, then backoff_factor * 2**(n - 1)
+    if retry <= 1:
+        return 0.0
+    return min(RETRY_POLICY.backoff_max, RETRY_POLICY.backoff_factor * 2 ** (retry - 1))
+
+
+def _send_with_retries(method: str, url: str, deadline: Deadline,
+                       timeout: Union[float, Tuple[float, float]], **kwargs) -> requests.Response:
+    """One hop of `request`, retried like RETRY_POLICY but never past `deadline`."""
+    session = _get_deadline_session()
+    what = f"{method} {url}"
+    read_errors = 0
+    for retry in range(RETRY_POLICY.total + 1):
+        if retry:
+            metrics.add_retries()
+            pause = _backoff(retry)
+            if pause >= deadline.remaining():
+                raise DeadlineExceeded(f"{what} exceeded its {deadline.seconds:g}s deadline")
+            time.sleep(pause)
+        deadline.check(what)
+        last_attempt = retry == RETRY_POLICY.total
+        try:
+            response = _send(session, method, url, deadline=deadline, allow_redirects=False,
+                             timeout=deadline.timeout(timeout), **kwargs)
+        except DeadlineExceeded:
+            raise
+        except requests.RequestException as e:
+            if deadline.expired:
+                raise DeadlineExceeded(f"{what} exceeded its {deadline.seconds:g}s deadline") from e
+            if isinstance(e, requests.Timeout) and not isinstance(e, requests.ConnectTimeout):
+                read_errors += 1
+            if last_attempt or not _retryable(method, e) or read_errors > RETRY_POLICY.read:
+                raise
+            logger.debug(f"Retrying {what} after {type(e).__name__}: {e}")
+            continue
+        if last_attempt or response.status_code not in RETRY_STATUSES or method.upper() not in RETRY_METHODS:
+            return response
+        response.close()
+    raise AssertionError("unreachable")
+
+
+def _send(session: requests.Session, method: str, url: str, deadline: Optional[Deadline] = None,
+          **kwargs) -> requests.Response:
+    semaphore = _host_semaphore(url)
+    if deadline is None:
+        semaphore.acquire()
+    elif not semaphore.acquire(timeout=deadline.remaining()):
+        raise DeadlineExceeded(f"no connection slot for {urlsplit(url).netloc} within the "
+                               f"{deadline.seconds:g}s deadline")
+    try:
+        response = session.request(method, url, **kwargs)
+    finally:
+        semaphore.release()
+    retries = getattr(getattr(response, "raw", None), "retries", None)
+    if retries is not None and retries.history:
+        metrics.add_retries(len(retries.history))
+    return response
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
@@ -0,0 +1,149 @@
+"""Persistent on-disk cache for Hacker News API items.
+
+Stories stay on the front page for days and old comments practically never
+change, yet every digest run used to re-download all of them. Items are stored
+in a small SQLite database keyed by item id, each with a TTL that depends on the
+item type: stories are refreshed often (score, kids and comment counts move),
+comments are kept much longer. The table is size-bounded and evicts the least
+recently used rows.
+
+Set ``HN_CACHE=0`` to disable the cache, or ``HN_CACHE_DIR`` to move it.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+CACHE_DIR = os.getenv("HN_CACHE_DIR") or os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", ".cache")
+)
+
+# Seconds an item of each HN type is served from the cache before refetching.
+DEFAULT_TTLS = {
+    "story": 10 * 60,
+    "comment": 24 * 60 * 60,
+    "job": 60 * 60,
+    "poll": 10 * 60,
+    "pollopt": 60 * 60,
+}
+FALLBACK_TTL = 60 * 60
+
+MAX_ITEMS = 50_000
+
+
+class ItemCache:
+    """SQLite-backed item store, safe to share between threads."""
+
+    def __init__(self, path: str, ttls: Optional[Dict[str, int]] = None,
+                 max_items: int = MAX_ITEMS, evict_every: int = 100):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.max_items = max_items
+        self.evict_every = max(1, evict_every)
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY,
+                type TEXT,
+                data TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS items_accessed_at ON items (accessed_at)")
+        self._conn.commit()
+
+    def _ttl(self, item_type: Optional[str]) -> float:
+        return self.ttls.get(item_type, FALLBACK_TTL)
+
+    def get(self, item_id: int) -> Optional[dict]:
+        """Return the cached item, or None if missing or past its TTL."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT type, data, fetched_at FROM items WHERE id = ?", (item_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            item_type, data, fetched_at = row
+            if now - fetched_at > self._ttl(item_type):
+                return None
+            self._conn.execute("UPDATE items SET accessed_at = ? WHERE id = ?", (now, item_id))
+            self._conn.commit()
+        return json.loads(data)
+
+    def put(self, item: dict):
+        """Store an item as returned by the HN API."""
+        if not item or "id" not in item:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO items (id, type, data, fetched_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (item["id"], item.get("type"), json.dumps(item), now, now),
+            )
+            self._conn.commit()
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= self.evict_every:
+                self._evict_locked()
+
+    def evict(self):
+        """Drop least recently used items beyond `max_items`."""
+        with self._lock:
+            self._evict_locked()
+
+    def _evict_locked(self):
+        self._puts_since_evict = 0
+        cur = self._conn.execute(
+            "DELETE FROM items WHERE id IN "
+            "(SELECT id FROM items ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_items,),
+        )
+        self._conn.commit()
+        if cur.rowcount:
+            logger.info(f"Evicted {cur.rowcount} items from HN item cache")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache_lock = threading.Lock()
+_cache: Optional[ItemCache] = None
+
+
+def get_item_cache() -> Optional[ItemCache]:
+    """Shared process-wide cache, or None when disabled with ``HN_CACHE=0``."""
+    global _cache
+    if os.getenv("HN_CACHE", "1") == "0":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = ItemCache(os.path.join(CACHE_DIR, "hn_items.sqlite3"))
+            except sqlite3.Error as e:
+                logger.warning(f"HN item cache unavailable, fetching everything live: {e}")
+                return None
+        return _cache
@@ -0,0 +1,103 @@
+"""Per-run checkpoint journal so a crashed digest run can be resumed.
+
+Every run appends JSON lines to ``.cache/journal/DD-MM-YYYY.jsonl``:
+
+    {"event": "start", "story_ids": [...]}      the ranking this run works on
+    {"event": "story", "story_id": 1, "entry": {...}}  one per finished story
+    {"event": "sent"}                             the email went out
+
+A resumed run for the same date reuses the recorded ranking and every finished
+entry, so only the stories that never completed are scraped and summarized
+again. Writes are flushed and fsynced per record; a torn last line from a crash
+is ignored on load.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from item_cache import CACHE_DIR
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+JOURNAL_DIR = os.path.join(CACHE_DIR, "journal")
+
+
+class RunJournal:
+    """Append-only journal of one day's digest run, safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.story_ids: Optional[List[int]] = None
+        self.entries: Dict[int, dict] = {}
+        self.sent = False
+        self._torn_tail = False
+        self._lock = threading.Lock()
+        self._load()
+
+    @classmethod
+    def for_date(cls, date: Optional[datetime] = None) -> "RunJournal":
+        date = date or datetime.now()
+        return cls(os.path.join(JOURNAL_DIR, date.strftime("%d-%m-%Y") + ".jsonl"))
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            lines = f.read().split("\n")
+        # Text after the last newline is a record a crash cut short.
+        self._torn_tail = bool(lines[-1])
+        for line_no, line in enumerate(lines, 1):
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"Skipping unreadable journal line {line_no} in {self.path}")
+                continue
+            event = record.get("event")
+            if event == "start":
+                self.story_ids = record["story_ids"]
+                self.entries = {}
+                self.sent = False
+            elif event == "story":
+                self.entries[record["story_id"]] = record["entry"]
+            elif event == "sent":
+                self.sent = True
+
+    def _append(self, record: dict):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a") as f:
+                if self._torn_tail:
+                    f.write("\n")
+                    self._torn_tail = False
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def reset(self):
+        """Forget any previous run recorded for this date."""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.story_ids = None
+            self.entries = {}
+            self.sent = False
+            self._torn_tail = False
+
+    def start(self, story_ids: List[int]):
+        self.story_ids = list(story_ids)
+        self.entries = {}
+        self.sent = False
+        self._append({"event": "start", "story_ids": self.story_ids})
+
+    def record_story(self, story_id: int, entry: dict):
+        self.entries[story_id] = entry
+        self._append({"event": "story", "story_id": story_id, "entry": entry})
+
+    def mark_sent(self):
+        self.sent = True
+        self._append({"event": "sent"})
@@ -0,0 +1,594 @@
+"""Rate-limit-aware async client for chat completions.
+
+summarize() used to call the blocking Groq client directly and, on a 429,
+sleep a flat two minutes and recurse with no retry limit, holding up every
+other story in the meantime. Completions now go through one shared
+``LLMClient`` that runs on a background asyncio event loop:
+
+- a ``RateLimiter`` per model learns the account's limits from the
+  ``x-ratelimit-*`` response headers (remaining requests and tokens and when
+  they reset) and holds requests back until an estimated token cost fits,
+  instead of sending them into a 429;
+- up to LLM_CONCURRENCY requests are in flight at once, from any thread;
+- a 429 pauses that model's limiter for ``retry-after`` (or a jittered
+  exponential backoff if that's longer);
+- queue depth (``llm_queue_depth`` peak) and time spent waiting for a slot
+  (``llm_queue_wait``) or for rate-limit budget (``llm_rate_wait``) are
+  recorded in the run report.
+
+Requests go to a pluggable backend: Groq's SDK (``LLM_BACKEND=groq``, the
+default) or any OpenAI-compatible ``/chat/completions`` endpoint
+(``LLM_BACKEND=openai`` with ``LLM_BASE_URL`` and ``LLM_API_KEY``), e.g. a
+local server. Backends create their HTTP client on first use.
+
+Each request walks a model fallback chain: the requested model, then
+LLM_FALLBACK_MODELS in order. A model is left for the next one when it is
+rate limited, fails, or (unless it is the last) takes longer than
+LLM_LATENCY_SLO; once every model has failed, the chain is retried after a
+backoff, at most LLM_MAX_RETRIES times. Per-model latency
+(``llm_model[<model>]`` stage) and outcomes (``llm_model[<model>]_ok``,
+``_error``, ``_rate_limited``, ``_slow``, ``_skipped``) go to the run
+report for tuning the chain; ``llm_fallback`` counts requests served by a
+fallback model.
+
+With ``LLM_HEDGE=1``, a request still unanswered after the
+LLM_HEDGE_PERCENTILE latency of its model's recent requests is duplicated;
+the first answer wins and the other request is cancelled. Duplicates are
+capped at LLM_HEDGE_BUDGET times the run's requests and are only sent when
+the rate limiter has room for them right away (counters ``llm_hedge_fired``,
+``llm_hedge_won``, ``llm_hedge_over_budget``).
+
+Blocking callers use ``complete()``; coroutines can await ``acomplete()`` on
+the client's loop (see ``run``). A thread that runs under ``cancel_on(event)``
+stops waiting for its requests, including their retries and backoff, within
+CANCEL_POLL_S of the event being set, and gets ``LLMCancelled``. The SDK's own retries are turned off so
+this module is the only place that decides when to retry.
+"""
+import asyncio
+import concurrent.futures
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+import dotenv
+
+from logger import setup_logger
+import metrics
+import token_budget
+
+logger = setup_logger(__name__)
+
+dotenv.load_dotenv()
+
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 4))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 5))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+DEFAULT_MODEL = os.getenv("LLM_MODEL", "openai/gpt-oss-120b")
+# Faster, cheaper models tried in order when the requested one is slow, failing or rate limited
+FALLBACK_MODELS = [m.strip() for m in os.getenv("LLM_FALLBACK_MODELS", "openai/gpt-oss-20b,llama-3.1-8b-instant").split(",")
+                   if m.strip()]
+# Seconds a model (other than the last in the chain) gets to answer before the next one is tried
+LLM_LATENCY_SLO = float(os.getenv("LLM_LATENCY_SLO", 30))
+
+# Hedging (off by default): a request still unanswered after the
+# LLM_HEDGE_PERCENTILE latency of its model's recent requests gets a
+# duplicate, and whichever answers first wins. Duplicates are capped at
+# LLM_HEDGE_BUDGET times the run's requests.
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 95))
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", 0.1))
+# Latencies kept per model, and how many are needed before hedging starts
+LATENCY_WINDOW = 100
+HEDGE_MIN_SAMPLES = 10
+
+# Jittered exponential backoff: attempt n waits uniform(0.5, 1) * min(MAX, BASE * 2**n) seconds.
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# Completion tokens assumed per request when estimating its cost against the token budget.
+EXPECTED_COMPLETION_TOKENS = 400
+
+# Seconds between checks of a blocked caller's cancel event (see cancel_on).
+CANCEL_POLL_S = 0.1
+
+
+class RequestTooLarge(Exception):
+    """The provider rejected the request as too large (413)."""
+
+
+class LLMUnavailable(Exception):
+    """The request still failed after every retry."""
+
+
+class LLMCancelled(Exception):
+    """The calling thread's cancel event was set before the request finished."""
+
+
+_cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("llm_cancel_event", default=None)
+
+
+@contextmanager
+def cancel_on(event: threading.Event):
+    """Abandon this thread's blocking LLM calls once `event` is set (see LLMClient.run)."""
+    token = _cancel_event.set(event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
+
+class Completion(NamedTuple):
+    text: Optional[str]
+    usage: Dict[str, int]
+    model: str
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Seconds in a rate-limit header value: "2m59.56s", "7.66s", "120ms" or plain "1.5"."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+def backoff_delay(attempt: int) -> float:
+    return random.uniform(0.5, 1.0) * min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+
+
+class RateLimiter:
+    """Token bucket fed by the provider's rate-limit headers.
+
+    Until the first response arrives the limits are unknown and requests are
+    let through. Afterwards the bucket holds the reported remaining tokens and
+    refills at the per-minute token limit; a request waits until its estimated
+    cost fits, until the request quota resets if it's used up, and until any
+    pause set by a 429 has passed. Must be used from a single event loop.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = asyncio.Lock()
+        self.tokens_per_minute: Optional[float] = None
+        self._level = 0.0
+        self._level_at = clock()
+        self._requests_blocked_until = 0.0
+        self._paused_until = 0.0
+
+    def _refill(self, now: float):
+        if self.tokens_per_minute:
+            elapsed = now - self._level_at
+            self._level = min(self.tokens_per_minute, self._level + elapsed * self.tokens_per_minute / 60)
+        self._level_at = now
+
+    def wait_time(self, tokens: int) -> float:
+        """Seconds until a request costing `tokens` may be sent (0 if now)."""
+        now = self._clock()
+        self._refill(now)
+        wait = max(0.0, self._paused_until - now, self._requests_blocked_until - now)
+        if self.tokens_per_minute:
+            # A request larger than the whole bucket only has to wait for a full one
+            needed = min(tokens, self.tokens_per_minute)
+            if self._level < needed:
+                wait = max(wait, (needed - self._level) * 60 / self.tokens_per_minute)
+        return wait
+
+    def try_acquire(self, tokens: int) -> bool:
+        """Take budget for a request only if it's free right now and nobody is waiting for it."""
+        if self._lock.locked() or self.wait_time(tokens) > 0:
+            return False
+        if self.tokens_per_minute:
+            self._level -= tokens
+        return True
+
+    async def acquire(self, tokens: int):
+        async with self._lock:  # FIFO: earlier callers get budget first
+            while True:
+                wait = self.wait_time(tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.tokens_per_minute:
+                self._level -= tokens
+
+    def update(self, headers, block_on_quota: bool = True):
+        """Sync with the x-ratelimit-* headers of a response.
+
+        With `block_on_quota`, requests are held until x-ratelimit-reset-requests
+        once the remaining request quota hits zero.
+        """
+        now = self._clock()
+        self._refill(now)
+        limit_tokens = _number(headers.get("x-ratelimit-limit-tokens"))
+        remaining_tokens = _number(headers.get("x-ratelimit-remaining-tokens"))
+        remaining_requests = _number(headers.get("x-ratelimit-remaining-requests"))
+        if limit_tokens:
+            if self.tokens_per_minute is None:
+                self._level = limit_tokens
+            self.tokens_per_minute = limit_tokens
+        if remaining_tokens is not None and self.tokens_per_minute:
+            self._level = min(self._level, remaining_tokens)
+        if block_on_quota and remaining_requests is not None and remaining_requests <= 0:
+            reset = parse_duration(headers.get("x-ratelimit-reset-requests")) or 60.0
+            self._requests_blocked_until = max(self._requests_blocked_until, now + reset)
+
+    def pause(self, seconds: float):
+        """Hold every request back for `seconds` (after a 429)."""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+
+def _number(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class Reply(NamedTuple):
+    text: Optional[str]
+    usage: Dict[str, int]
+    headers: Mapping[str, str]
+
+
+class BackendError(Exception):
+    """A backend request failed; `status_code` is None for connection errors and timeouts."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, headers: Optional[Mapping[str, str]] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class GroqBackend:
+    """Groq's async SDK (needs the ``groq`` package from the ``worker`` extra)."""
+
+    name = "groq"
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, timeout: float = LLM_TIMEOUT):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self._client = None
+
+    async def create(self, model: str, messages: List[Dict[str, str]], **params) -> Reply:
+        import groq
+
+        if self._client is None:
+            self._client = groq.AsyncGroq(api_key=self.api_key or os.getenv("GROQ_API"), base_url=self.base_url,
+                                          max_retries=0, timeout=self.timeout)
+        try:
+            raw = await self._client.chat.completions.with_raw_response.create(
+                model=model, messages=messages, **params,
+            )
+        except groq.APIStatusError as e:
+            raise BackendError(str(e), e.status_code, e.response.headers) from e
+        except groq.APIConnectionError as e:  # includes APITimeoutError
+            raise BackendError(f"could not reach Groq: {e}") from e
+        response = await raw.parse()
+        usage = {}
+        if response.usage is not None:
+            usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens,
+            }
+        return Reply(response.choices[0].message.content, usage, raw.headers)
+
+
+class OpenAICompatibleBackend:
+    """Any endpoint speaking the OpenAI chat completions API, over httpx."""
+
+    name = "openai"
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None, timeout: float = LLM_TIMEOUT):
+        self.base_url = (base_url or os.getenv("LLM_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
+        self.api_key = api_key if api_key is not None else os.getenv("LLM_API_KEY", "")
+        self.timeout = timeout
+        self._client = None
+
+    async def create(self, model: str, messages: List[Dict[str, str]], **params) -> Reply:
+        import httpx
+
+        if self._client is None:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._client = httpx.AsyncClient(headers=headers, timeout=self.timeout)
+        try:
+            response = await self._client.post(
+                f"{self.base_url}/chat/completions", json=dict(params, model=model, messages=messages),
+            )
+        except httpx.HTTPError as e:
+            raise BackendError(f"could not reach {self.base_url}: {e}") from e
+        if response.status_code >= 400:
+            raise BackendError(f"{response.status_code}: {response.text[:200]}", response.status_code, response.headers)
+        try:
+            data = response.json()
+            text = data["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise BackendError(f"malformed response from {self.base_url}: {e}") from e
+        usage = {name: count for name, count in (data.get("usage") or {}).items()
+                 if name in ("prompt_tokens", "completion_tokens", "total_tokens")}
+        return Reply(text, usage, response.headers)
+
+
+BACKENDS = {backend.name: backend for backend in (GroqBackend, OpenAICompatibleBackend)}
+
+
+def make_backend(name: str = LLM_BACKEND):
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown LLM backend {name!r}, expected one of: {', '.join(BACKENDS)}") from None
+
+
+class LLMClient:
+    """Shared, rate-limited chat completion client (see module docstring)."""
+
+    def __init__(self, backend=None, max_concurrent: int = LLM_CONCURRENCY, max_retries: int = LLM_MAX_RETRIES,
+                 fallback_models: Optional[List[str]] = None, latency_slo: float = LLM_LATENCY_SLO,
+                 hedge: bool = LLM_HEDGE, hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+                 hedge_budget: float = LLM_HEDGE_BUDGET):
+        self.backend = backend if backend is not None else make_backend()
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.fallback_models = list(FALLBACK_MODELS if fallback_models is None else fallback_models)
+        self.latency_slo = latency_slo
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget
+        self._latencies: Dict[str, Deque[float]] = {}
+        # Requests sent and hedges fired in the current run (reset when a new run report starts)
+        self._run_report = None
+        self._run_requests = 0
+        self._run_hedges = 0
+        self.queued = 0
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="llm-client", daemon=True)
+        self._thread.start()
+        self._loop.call_soon_threadsafe(self._init_in_loop)
+        self._started.wait()
+
+    def _init_in_loop(self):
+        # asyncio primitives belong to the loop they're used on
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._started.set()
+
+    def limiter(self, model: str) -> RateLimiter:
+        """Rate limiter for `model` (providers limit each model separately). Loop thread only."""
+        if model not in self._limiters:
+            self._limiters[model] = RateLimiter()
+        return self._limiters[model]
+
+    def chain(self, model: str) -> List[str]:
+        """Models tried for a request for `model`, in order."""
+        return [model] + [m for m in self.fallback_models if m != model]
+
+    def run(self, coro):
+        """
+        Run `coro` on the client's loop and block until it's done; keeps the caller's metrics story.
+
+        Raises:
+            LLMCancelled: If the caller's cancel event (see cancel_on) is or becomes set;
+                `coro` is cancelled on the loop
+        """
+        cancel = _cancel_event.get()
+        if cancel is not None and cancel.is_set():
+            coro.close()
+            raise LLMCancelled("cancelled before the request was sent")
+        future = asyncio.run_coroutine_threadsafe(self._in_story(metrics.current_story(), coro), self._loop)
+        if cancel is None:
+            return future.result()
+        while True:
+            try:
+                return future.result(timeout=CANCEL_POLL_S)
+            except concurrent.futures.TimeoutError:
+                if cancel.is_set():
+                    future.cancel()
+                    raise LLMCancelled("cancelled while waiting for the LLM")
+
+    def complete(self, messages: List[Dict[str, str]], model: Optional[str] = None, **params) -> Completion:
+        """Blocking `acomplete`, callable from any thread."""
+        return self.run(self.acomplete(messages, model, **params))
+
+    @staticmethod
+    async def _in_story(story_id, coro):
+        with metrics.bound_to(story_id):
+            return await coro
+
+    async def acomplete(self, messages: List[Dict[str, str]], model: Optional[str] = None, **params) -> Completion:
+        """
+        Request a chat completion within the rate limits, falling back along the model chain.
+
+        `params` are passed on to the API as they are (e.g. ``response_format``).
+        The returned Completion names the model that answered.
+
+        Raises:
+            RequestTooLarge: On a 413 (the caller should send less)
+            LLMUnavailable: If every model still fails after `max_retries` retries,
+                or fails with an error retrying won't fix
+        """
+        chain = self.chain(model or DEFAULT_MODEL)
+        cost = sum(token_budget.estimate_tokens(m.get("content") or "") for m in messages)
+        cost += EXPECTED_COMPLETION_TOKENS
+
+        self.queued += 1
+        metrics.peak("llm_queue_depth", self.queued)
+        try:
+            with metrics.stage("llm_queue_wait"):
+                await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        try:
+            last_error = None
+            for attempt in range(self.max_retries + 1):
+                retryable = False
+                back_off = False  # rate limits are waited out in limiter.acquire instead
+                for position, name in enumerate(chain):
+                    is_last = position == len(chain) - 1
+                    limiter = self.limiter(name)
+                    # Waiting out a fallback model's rate limit would cost more than the SLO allows
+                    if not is_last and limiter.wait_time(cost) > self.latency_slo:
+                        metrics.incr(f"llm_model[{name}]_skipped")
+                        retryable = True
+                        continue
+                    with metrics.stage("llm_rate_wait"):
+                        await limiter.acquire(cost)
+
+                    started = time.monotonic()
+                    try:
+                        with metrics.stage("llm_call"):
+                            reply, latency = await asyncio.wait_for(
+                                self._call(name, messages, params, limiter, cost),
+                                None if is_last else self.latency_slo,
+                            )
+                    except asyncio.TimeoutError:
+                        outcome = "slow"
+                        last_error = f"{name} took longer than {self.latency_slo}s"
+                        retryable = back_off = True
+                    except BackendError as e:
+                        last_error = f"{name}: {e}"
+                        if e.status_code == 413:
+                            raise RequestTooLarge(str(e)) from e
+                        if e.status_code == 429:
+                            outcome = "rate_limited"
+                            retry_after = parse_duration(e.headers.get("retry-after"))
+                            # retry-after is the provider's own answer to "when"; the quota reset is a fallback
+                            limiter.update(e.headers, block_on_quota=retry_after is None)
+                            # Every request for this model waits this out in limiter.acquire
+                            limiter.pause(max(retry_after or 0, backoff_delay(attempt)))
+                            metrics.incr("llm_rate_limited")
+                            retryable = True
+                        else:
+                            outcome = "error"
+                            # 4xx other than 413/429 (bad request, unknown model, auth) won't go away by retrying
+                            if e.status_code is None or e.status_code >= 500:
+                                retryable = back_off = True
+                    else:
+                        limiter.update(reply.headers)
+                        self._record(name, "ok", time.monotonic() - started)
+                        self._latencies.setdefault(name, deque(maxlen=LATENCY_WINDOW)).append(latency)
+                        if position:
+                            metrics.incr("llm_fallback")
+                            logger.info(f"Request served by fallback model {name}")
+                        return Completion(reply.text, reply.usage, name)
+
+                    self._record(name, outcome, time.monotonic() - started)
+                    logger.warning(f"LLM request failed ({last_error}), "
+                                   f"{'retrying' if is_last else 'trying ' + chain[position + 1]} "
+                                   f"(attempt {attempt + 1} of {self.max_retries + 1})")
+
+                if not retryable or attempt == self.max_retries:
+                    break
+                metrics.add_retries()
+                if back_off:
+                    await asyncio.sleep(backoff_delay(attempt))
+            raise LLMUnavailable(f"every model failed, last error: {last_error}")
+        finally:
+            self._slots.release()
+
+    def _new_run_request(self):
+        report = metrics.current_report()
+        if report is not self._run_report:
+            self._run_report, self._run_requests, self._run_hedges = report, 0, 0
+        self._run_requests += 1
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """Seconds after which a request to `model` is hedged, or None if it isn't."""
+        samples = self._latencies.get(model)
+        if not self.hedge or not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))]
+
+    def _take_hedge(self, limiter: RateLimiter, cost: int) -> bool:
+        if self._run_hedges + 1 > self.hedge_budget * self._run_requests:
+            metrics.incr("llm_hedge_over_budget")
+            return False
+        # A duplicate that would have to wait for rate-limit budget wouldn't be faster
+        if not limiter.try_acquire(cost):
+            return False
+        self._run_hedges += 1
+        return True
+
+    async def _call(self, model: str, messages: List[Dict[str, str]], params: dict,
+                    limiter: RateLimiter, cost: int) -> Tuple[Reply, float]:
+        """
+        Send one request, hedged with a duplicate if it runs long (see LLM_HEDGE).
+
+        Returns:
+            The first successful reply and how long its request took
+
+        Raises:
+            BackendError: If every request sent failed (the first failure)
+        """
+        started: Dict[asyncio.Future, float] = {}
+
+        def send() -> asyncio.Future:
+            task = asyncio.ensure_future(self.backend.create(model, messages, **params))
+            started[task] = time.monotonic()
+            return task
+
+        self._new_run_request()
+        primary = send()
+        try:
+            delay = self.hedge_delay(model)
+            if delay is not None:
+                await asyncio.wait([primary], timeout=delay)
+                if not primary.done() and self._take_hedge(limiter, cost):
+                    logger.info(f"{model} request running past {delay:.1f}s, sending a hedge request")
+                    metrics.incr("llm_hedge_fired")
+                    send()
+
+            error = None
+            pending = set(started)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            metrics.incr("llm_hedge_won")
+                        return task.result(), time.monotonic() - started[task]
+                    error = error or task.exception()
+            raise error
+        finally:
+            # The loser, or everything if we were cancelled (e.g. by the latency SLO)
+            for task in started:
+                if not task.done():
+                    task.cancel()
+
+    @staticmethod
+    def _record(model: str, outcome: str, seconds: float):
+        metrics.current_report().record_stage(f"llm_model[{model}]", seconds)
+        metrics.incr(f"llm_model[{model}]_{outcome}")
+
+
+_client_lock = threading.Lock()
+_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    """Shared process-wide client (its event loop starts on first use)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
@@ -1,6 +1,5 @@
 import sys
 import os
-import requests
 from datetime import datetime
 
 # Add parent directory to path for `main` import. This is weird, but wanted to use the inbuilt render template to pass args, not sure how else to do it.
@@ -9,7 +8,10 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from flask import render_template
 from main import app
 import digest_generator
-from tools import _get_mailgun_config
+import http_client
+import metrics
+from journal import RunJournal
+from tools import _get_mailgun_config, MAILGUN_API_BASE
 from logger import setup_logger, log_section
 
 logger = setup_logger(__name__)
@@ -25,7 +27,7 @@ def save_to_archive(html_content: str) -> bool:
     
     try:
         os.makedirs(ARCHIVES_DIR, exist_ok=True)
-        with open(filepath, 'w') as f:
+        with metrics.stage("archive_write"), open(filepath, 'w') as f:
             f.write(html_content)
         logger.info(f"Archived digest to: {filepath}")
         return True
@@ -44,7 +46,7 @@ def send_digest_to_list(html_content: str) -> bool:
     
     from_addr = f"{list_name}@{domain_name}"
     to_addr = f"{list_name}@{domain_name}"
-    url = f"https://api.mailgun.net/v3/{domain_name}/messages"
+    url = f"{MAILGUN_API_BASE}/{domain_name}/messages"
     
     subject = f"HackerNews Digest - {datetime.now().strftime('%B %d, %Y')}"
     text = f"{subject}\n\nView this email in HTML to see the full digest."
@@ -58,21 +60,50 @@ def send_digest_to_list(html_content: str) -> bool:
     }
     
     try:
-        response = requests.post(url, auth=("api", api_key), data=data, timeout=10)
-        response.raise_for_status()
+        with metrics.stage("mailgun_send"):
+            response = http_client.post(url, auth=("api", api_key), data=data, timeout=10)
+            response.raise_for_status()
         logger.info(f"Digest sent to mailing list: {to_addr}")
         return True
-    except requests.RequestException as e:
+    except http_client.RequestException as e:
         logger.error(f"Failed to send digest: {e}")
         return False
 
 
-def main(story_count: int = 10):
-    """Generate and send digest."""
+def main(story_count: int = 10, concurrent: bool = False, workers: dict = None, resume: bool = False,
+         deadline_s: float = None, overfetch: int = 0):
+    """Generate and send digest.
+
+    `concurrent`, `workers`, `deadline_s` and `overfetch` are passed through to
+    digest_generator.generate_digest.
+    With `resume`, stories already finished by an earlier attempt today are taken
+    from the run journal instead of being scraped and summarized again.
+
+    A JSON timing report for the run is written to reports/ even if it fails.
+    """
+    metrics.start_run()
+    try:
+        _generate_and_send(story_count, concurrent, workers, resume, deadline_s, overfetch)
+    finally:
+        metrics.write_report()
+
+
+def _generate_and_send(story_count: int, concurrent: bool, workers: dict, resume: bool,
+                       deadline_s: float, overfetch: int):
     log_section("Starting Digest Generation", logger)
     logger.info(f"Generating digest for top {story_count} stories...")
-    
-    digest_data = digest_generator.generate_digest(count=story_count)
+
+    journal = RunJournal.for_date()
+    if not resume:
+        journal.reset()
+    elif journal.sent:
+        logger.warning("Today's digest was already sent according to the run journal, not sending again.")
+        return
+
+    digest_data = digest_generator.generate_digest(
+        count=story_count, concurrent=concurrent, workers=workers, journal=journal,
+        deadline_s=deadline_s, overfetch=overfetch,
+    )
     
     if not digest_data:
         logger.error("No digest data generated.")
@@ -81,7 +112,7 @@ def main(story_count: int = 10):
     log_section("Rendering Email Template", logger)
     logger.info(f"Rendering template for {len(digest_data)} stories...")
     
-    with app.app_context():
+    with metrics.stage("render"), app.app_context():
         # Arhive pages don't need unsubscribe link 
         archive_html = render_template(
             "digest.html",
@@ -106,6 +137,7 @@ def main(story_count: int = 10):
     log_section("Sending Email", logger)
     if send_digest_to_list(email_html):
         logger.info("Digest sent successfully!")
+        journal.mark_sent()
     else:
         logger.error("Failed to send digest.")
 
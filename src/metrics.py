@@ -0,0 +1,275 @@
+"""Machine-readable per-run timing report.
+
+Pipeline code records into the active report through the module helpers:
+
+    with metrics.story(story_id, rank):      # attribute everything below to a story
+        with metrics.stage("llm_call"):      # time a stage
+            ...
+        metrics.add_bytes(len(body))
+        metrics.add_tokens(usage)
+        metrics.add_retries(1)
+        metrics.incr("hn_cache_hit")
+        metrics.peak("llm_queue_depth", n)   # keep the highest value seen
+
+Anything recorded outside a story (rendering, the Mailgun send, ...) goes to the
+run-level bucket. The story context lives in a ContextVar, which thread pools
+don't inherit; wrap callables with ``metrics.propagate`` before handing them to
+an executor, or re-enter the story with ``metrics.bound_to`` (e.g. in a
+coroutine scheduled on another thread's event loop). ``write_report`` dumps
+the whole thing, plus an aggregate summary, as JSON.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+try:
+    from logger import setup_logger, log_section
+except ImportError:
+    from src.logger import setup_logger, log_section
+
+logger = setup_logger(__name__)
+
+REPORTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "reports"))
+
+_current_story: contextvars.ContextVar = contextvars.ContextVar("current_story", default=None)
+
+
+def _new_bucket() -> Dict[str, Any]:
+    return {"stages": {}, "bytes": 0, "tokens": {}, "retries": 0, "counters": {}, "peaks": {}}
+
+
+class RunReport:
+    """Thread-safe collector of stage timings and counters for one digest run."""
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+        self.run = _new_bucket()
+        self.stories: Dict[int, Dict[str, Any]] = {}
+
+    def _bucket(self) -> Dict[str, Any]:
+        story_id = _current_story.get()
+        if story_id is None:
+            return self.run
+        return self.stories.setdefault(story_id, _new_bucket())
+
+    def record_stage(self, name: str, seconds: float):
+        with self._lock:
+            stage = self._bucket()["stages"].setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            stage["count"] += 1
+            stage["total_s"] += seconds
+            stage["max_s"] = max(stage["max_s"], seconds)
+
+    def merge_stages(self, stages: Dict[str, Dict[str, float]]):
+        """Fold stage aggregates recorded elsewhere (e.g. another process) into this report."""
+        with self._lock:
+            bucket = self._bucket()["stages"]
+            for name, other in stages.items():
+                stage = bucket.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+                stage["count"] += other["count"]
+                stage["total_s"] += other["total_s"]
+                stage["max_s"] = max(stage["max_s"], other["max_s"])
+
+    def add_bytes(self, n: int):
+        with self._lock:
+            self._bucket()["bytes"] += n
+
+    def add_tokens(self, usage: Dict[str, int]):
+        with self._lock:
+            tokens = self._bucket()["tokens"]
+            for key, value in usage.items():
+                if isinstance(value, (int, float)):
+                    tokens[key] = tokens.get(key, 0) + value
+
+    def add_retries(self, n: int = 1):
+        with self._lock:
+            self._bucket()["retries"] += n
+
+    def incr(self, name: str, n: int = 1):
+        with self._lock:
+            counters = self._bucket()["counters"]
+            counters[name] = counters.get(name, 0) + n
+
+    def peak(self, name: str, value: float):
+        with self._lock:
+            peaks = self._bucket()["peaks"]
+            peaks[name] = max(peaks.get(name, value), value)
+
+    def set_story_info(self, **info):
+        with self._lock:
+            self._bucket().update(info)
+
+    def summary(self) -> Dict[str, Any]:
+        """Aggregate every story and the run-level bucket."""
+        stages: Dict[str, Dict[str, float]] = {}
+        totals = _new_bucket()
+        with self._lock:
+            buckets = [self.run] + list(self.stories.values())
+            for bucket in buckets:
+                for name, stage in bucket["stages"].items():
+                    agg = stages.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+                    agg["count"] += stage["count"]
+                    agg["total_s"] += stage["total_s"]
+                    agg["max_s"] = max(agg["max_s"], stage["max_s"])
+                totals["bytes"] += bucket["bytes"]
+                totals["retries"] += bucket["retries"]
+                for key, value in bucket["tokens"].items():
+                    totals["tokens"][key] = totals["tokens"].get(key, 0) + value
+                for key, value in bucket["counters"].items():
+                    totals["counters"][key] = totals["counters"].get(key, 0) + value
+                for key, value in bucket["peaks"].items():
+                    totals["peaks"][key] = max(totals["peaks"].get(key, value), value)
+            story_durations = {
+                story_id: bucket.get("duration_s", 0.0) for story_id, bucket in self.stories.items()
+            }
+        for agg in stages.values():
+            agg["mean_s"] = agg["total_s"] / agg["count"] if agg["count"] else 0.0
+        slowest = sorted(story_durations.items(), key=lambda kv: kv[1], reverse=True)[:3]
+        return {
+            "duration_s": time.monotonic() - self._t0,
+            "stories": len(self.stories),
+            "stages": stages,
+            "bytes": totals["bytes"],
+            "tokens": totals["tokens"],
+            "retries": totals["retries"],
+            "counters": totals["counters"],
+            "peaks": totals["peaks"],
+            "slowest_stories": [{"story_id": s, "duration_s": d} for s, d in slowest],
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        summary = self.summary()
+        with self._lock:
+            return {
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "summary": summary,
+                "run": self.run,
+                "stories": {str(story_id): bucket for story_id, bucket in self.stories.items()},
+            }
+
+
+_report_lock = threading.Lock()
+_report = RunReport()
+
+
+def start_run() -> RunReport:
+    """Start a fresh report; subsequent helper calls record into it."""
+    global _report
+    with _report_lock:
+        _report = RunReport()
+        return _report
+
+
+def current_report() -> RunReport:
+    return _report
+
+
+@contextmanager
+def stage(name: str):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        _report.record_stage(name, time.monotonic() - start)
+
+
+@contextmanager
+def story(story_id: int, rank: Optional[int] = None):
+    """Attribute everything recorded inside the block to `story_id`."""
+    token = _current_story.set(story_id)
+    start = time.monotonic()
+    if rank is not None:
+        _report.set_story_info(rank=rank)
+    try:
+        yield
+    finally:
+        _report.set_story_info(duration_s=time.monotonic() - start)
+        _current_story.reset(token)
+
+
+def current_story() -> Optional[int]:
+    return _current_story.get()
+
+
+@contextmanager
+def bound_to(story_id: Optional[int]):
+    """Record into `story_id` inside the block (without timing it, unlike `story`)."""
+    token = _current_story.set(story_id)
+    try:
+        yield
+    finally:
+        _current_story.reset(token)
+
+
+def propagate(fn):
+    """Wrap `fn` so it records into the caller's story when run on another thread."""
+    story_id = _current_story.get()
+
+    def wrapper(*args, **kwargs):
+        with bound_to(story_id):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def merge_stages(stages: Dict[str, Dict[str, float]]):
+    _report.merge_stages(stages)
+
+
+def add_bytes(n: int):
+    _report.add_bytes(n)
+
+
+def add_tokens(usage: Dict[str, int]):
+    _report.add_tokens(usage)
+
+
+def add_retries(n: int = 1):
+    _report.add_retries(n)
+
+
+def incr(name: str, n: int = 1):
+    _report.incr(name, n)
+
+
+def peak(name: str, value: float):
+    _report.peak(name, value)
+
+
+def set_story_info(**info):
+    _report.set_story_info(**info)
+
+
+def write_report(report: Optional[RunReport] = None, directory: Optional[str] = None) -> Optional[str]:
+    """Write `report` (default: the active one) as JSON and log its summary.
+
+    `directory` defaults to REPORTS_DIR. Returns the file path, or None if it
+    could not be written.
+    """
+    report = report or _report
+    directory = directory or REPORTS_DIR
+    data = report.to_dict()
+    summary = data["summary"]
+
+    log_section("Run Report", logger)
+    logger.info(f"Total: {summary['duration_s']:.1f}s, {summary['bytes']} bytes downloaded, "
+                f"tokens {summary['tokens'] or 'n/a'}, {summary['retries']} retries")
+    for name, agg in sorted(summary["stages"].items(), key=lambda kv: kv[1]["total_s"], reverse=True):
+        logger.info(f"  {name}: {agg['total_s']:.2f}s over {agg['count']} calls (max {agg['max_s']:.2f}s)")
+
+    filename = "run-" + report.started_at.strftime("%d-%m-%Y-%H%M%S") + ".json"
+    path = os.path.join(directory, filename)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+    except (IOError, TypeError) as e:
+        logger.error(f"Failed to write run report: {e}")
+        return None
+    logger.info(f"Run report written to: {path}")
+    return path
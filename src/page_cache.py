@@ -0,0 +1,164 @@
+"""On-disk HTTP cache for scraped article pages.
+
+Stories stay on the front page for days and a re-run revisits every URL, so
+downloaded pages are kept with their ``ETag``/``Last-Modified`` validators.
+The next fetch sends ``If-None-Match``/``If-Modified-Since`` and a 304 answer
+is served from here without transferring the body again. Pages are keyed by
+the final URL after redirects, with the requested URL remembered as an alias.
+Pages without validators (or marked ``no-store``) are not cached, since they
+could never be revalidated. Total stored body size is capped and the least
+recently used pages are evicted first.
+
+Lives next to the HN item cache; set ``PAGE_CACHE=0`` to disable it.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from item_cache import CACHE_DIR
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+
+# Eviction trims the cache down to this fraction of MAX_BYTES, so it isn't
+# triggered again by the very next insert.
+EVICT_TO_RATIO = 0.9
+
+
+class CachedPage(NamedTuple):
+    url: str
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """SQLite-backed page store, safe to share between threads."""
+
+    def __init__(self, path: str, max_bytes: int = MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at);
+            CREATE TABLE IF NOT EXISTS aliases (
+                url TEXT PRIMARY KEY,
+                final_url TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """Return the stored page for `url` (or the page it redirected to), if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT p.url, p.body, p.etag, p.last_modified FROM pages p "
+                "WHERE p.url = COALESCE((SELECT final_url FROM aliases WHERE url = ?), ?)",
+                (url, url),
+            ).fetchone()
+        return CachedPage(*row) if row else None
+
+    def touch(self, url: str):
+        """Mark a page as just used (after a 304 revalidated it)."""
+        with self._lock:
+            self._conn.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+
+    def put(self, url: str, final_url: str, body: str, etag: Optional[str], last_modified: Optional[str]):
+        """Store a downloaded page under `final_url`, reachable from `url` too."""
+        size = len(body.encode('utf-8', 'replace'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM pages WHERE url = ?", (final_url,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, body, size, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (final_url, etag, last_modified, body, size, now, now),
+            )
+            if url != final_url:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO aliases (url, final_url) VALUES (?, ?)", (url, final_url)
+                )
+            self._conn.commit()
+            self._total += size - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict_locked(int(self.max_bytes * EVICT_TO_RATIO))
+
+    def _evict_locked(self, target: int):
+        evicted = 0
+        rows = self._conn.execute("SELECT url, size FROM pages ORDER BY accessed_at").fetchall()
+        for url, size in rows:
+            if self._total <= target:
+                break
+            self._conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            self._total -= size
+            evicted += 1
+        self._conn.execute("DELETE FROM aliases WHERE final_url NOT IN (SELECT url FROM pages)")
+        self._conn.commit()
+        if evicted:
+            logger.info(f"Evicted {evicted} pages from page cache")
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache_lock = threading.Lock()
+_cache: Optional[PageCache] = None
+
+
+def get_page_cache() -> Optional[PageCache]:
+    """Shared process-wide cache, or None when disabled with ``PAGE_CACHE=0``."""
+    global _cache
+    if os.getenv("PAGE_CACHE", "1") == "0":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = PageCache(os.path.join(CACHE_DIR, "pages.sqlite3"))
+            except sqlite3.Error as e:
+                logger.warning(f"Page cache unavailable, downloading everything live: {e}")
+                return None
+        return _cache
@@ -0,0 +1,140 @@
+"""Text extraction for PDF links (papers, whitepapers, slides).
+
+PDFs used to be skipped outright. Now the file is streamed to a temporary file
+on disk (never held in memory whole) under a size cap, and its text is pulled
+out page by page in the extraction worker pool, stopping as soon as enough text
+for the summarizer has been collected, so a 400-page report costs about as
+much as its first few pages.
+
+Needs the optional ``pypdf`` package (``worker`` extra); without it PDFs are
+skipped as before.
+"""
+import importlib.util
+import os
+import re
+import tempfile
+from typing import Optional
+
+from logger import setup_logger
+import extract_pool
+import http_client
+import metrics
+
+logger = setup_logger(__name__)
+
+# Larger files are not downloaded: the text of a PDF can't be read from a
+# truncated file, since its index sits at the end.
+PDF_MAX_BYTES = int(os.getenv("SCRAPE_PDF_MAX_BYTES", 25_000_000))
+
+# Extraction stops once this much text is collected (well past what the
+# summarizer is sent), or after this many pages.
+PDF_MAX_CHARS = int(os.getenv("SCRAPE_PDF_MAX_CHARS", 60_000))
+PDF_MAX_PAGES = 100
+
+CHUNK_SIZE = 64 * 1024
+
+
+def pdf_support() -> bool:
+    return importlib.util.find_spec("pypdf") is not None
+
+
+def extract_text(path: str, url: str, max_chars: int = PDF_MAX_CHARS,
+                 max_pages: int = PDF_MAX_PAGES) -> Optional[str]:
+    """
+    Extract the text of the PDF at `path`, page by page, until `max_chars`.
+
+    Returns:
+        str: Text in the same "Title: ..." layout as HTML extraction, or None
+        if the PDF has no extractable text (e.g. scanned images)
+    """
+    from pypdf import PdfReader
+    from pypdf.errors import PdfReadError
+
+    try:
+        with metrics.stage("pdf_extract"):
+            reader = PdfReader(path)
+            title = None
+            try:
+                title = reader.metadata.title if reader.metadata else None
+            except (PdfReadError, KeyError, ValueError):
+                pass
+
+            pages = []
+            collected = 0
+            for number, page in enumerate(reader.pages, 1):
+                text = (page.extract_text() or "").strip()
+                if text:
+                    pages.append(text)
+                    collected += len(text)
+                if collected >= max_chars or number >= max_pages:
+                    if number < len(reader.pages):
+                        logger.info(f"Stopped PDF extraction after {number} of {len(reader.pages)} pages: {url}")
+                    break
+    except (PdfReadError, ValueError, KeyError, OSError) as e:
+        logger.error(f"Could not read PDF {url}: {str(e)}")
+        return None
+
+    content_parts = []
+    if title and title.strip():
+        content_parts.append(f"Title: {title.strip()}\n")
+        content_parts.append("=" * 80 + "\n")
+    content_parts.append("\n\n".join(pages)[:max_chars])
+    full_content = ''.join(content_parts).strip()
+
+    if len(''.join(pages)) < 100:
+        logger.warning(f"PDF has no extractable text: {url}")
+        return None
+
+    full_content = re.sub(r'\n{3,}', '\n\n', full_content)
+    full_content = re.sub(r' {2,}', ' ', full_content)
+    logger.info(f"Successfully extracted {len(full_content)} characters from PDF: {url}")
+    return full_content
+
+
+def _spool(response, url: str, deadline: http_client.Deadline) -> Optional[str]:
+    """Stream `response` into a temporary file; returns its path, or None if over the cap."""
+    fd, path = tempfile.mkstemp(prefix="hn-digest-", suffix=".pdf")
+    received = 0
+    try:
+        with os.fdopen(fd, "wb") as f, deadline.guard(response):
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                received += len(chunk)
+                if received > PDF_MAX_BYTES:
+                    logger.info(f"PDF larger than {PDF_MAX_BYTES} bytes, skipping: {url}")
+                    metrics.incr("pdf_too_large")
+                    os.unlink(path)
+                    return None
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.unlink(path)
+        raise
+    metrics.add_bytes(received)
+    return path
+
+
+def extract_pdf(response, url: str, deadline: http_client.Deadline) -> Optional[str]:
+    """
+    Download the PDF body of a streamed `response` and extract its text off-thread.
+
+    Returns:
+        str: Extracted text, or None if the PDF was skipped or unreadable
+    """
+    if not pdf_support():
+        logger.info(f"Skipping PDF (install pypdf to summarize PDFs): {url}")
+        return None
+    declared = response.headers.get('Content-Length')
+    if declared and declared.isdigit() and int(declared) > PDF_MAX_BYTES:
+        logger.info(f"PDF larger than {PDF_MAX_BYTES} bytes, skipping: {url}")
+        metrics.incr("pdf_too_large")
+        return None
+
+    path = _spool(response, url, deadline)
+    if path is None:
+        return None
+    try:
+        text = extract_pool.get_extract_pool().extract_pdf(path, url, deadline)
+    finally:
+        os.unlink(path)
+    metrics.incr("pdf_extracted" if text else "pdf_failed")
+    return text
@@ -1,18 +1,46 @@
 # This file is vibecoded, hopefully this does not break
 # TODO: Write better code for this
-from typing import Optional
+from typing import NamedTuple, Optional
+import codecs
+import copy
+import os
 import re
 from urllib.parse import urlparse, urljoin
 from logger import setup_logger
+import metrics
+import http_client
+import page_cache
+import extract_pool
+import extractors
+import pdf_extract
 
 logger = setup_logger(__name__)
 
-def scrape_site(url: str) -> Optional[str]:
+# Decoded bytes read per page; anything past this is dropped before parsing.
+MAX_PAGE_BYTES = int(os.getenv("SCRAPE_MAX_BYTES", 2_000_000))
+CHUNK_SIZE = 64 * 1024
+
+# Wall-clock seconds per URL covering connect, redirects, download and extraction.
+SCRAPE_DEADLINE_S = float(os.getenv("SCRAPE_DEADLINE_S", 30))
+
+# Content types worth parsing. Anything else (PDFs, video, archives, ...) is
+# rejected from the headers alone, before any of the body is downloaded.
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'application/xml', 'text/xml', 'text/plain')
+
+
+class _Page(NamedTuple):
+    text: str
+    extracted: bool  # True when `text` is final (PDF text), False for HTML still to extract
+
+def scrape_site(url: str, deadline: Optional[http_client.Deadline] = None) -> Optional[str]:
     """
     Scrape a website and extract its main content, including text and image alt tags.
     
     Args:
         url: The URL of the website to scrape
+        deadline: Wall-clock budget for the whole scrape; defaults to a fresh
+            SCRAPE_DEADLINE_S one. Pass your own to share a budget or to read
+            `deadline.remaining()` afterwards.
         
     Returns:
         str: Extracted text content suitable for LLM processing, or None if scraping failed
@@ -24,13 +52,13 @@ def scrape_site(url: str) -> Optional[str]:
         - Bypasses common anti-scraping measures
         - Skips paywalled content gracefully
         - Uses multiple fallback strategies
+        - Site-specific fast paths for GitHub, arXiv, YouTube, etc. (see extractors.py)
+        - Extracts text from PDFs (see pdf_extract.py)
     """
     try:
         # Import required libraries
         try:
             import requests
-            from bs4 import BeautifulSoup
-            from readability import Document
         except ImportError as e:
             missing_lib = str(e).split("'")[1] if "'" in str(e) else "unknown"
             logger.error(f"Missing required library: {missing_lib}. Install with: pip install requests beautifulsoup4 readability-lxml")
@@ -46,194 +74,360 @@ def scrape_site(url: str) -> Optional[str]:
             'Upgrade-Insecure-Requests': '1'
         }
         
+        if deadline is None:
+            deadline = http_client.Deadline(SCRAPE_DEADLINE_S)
+        
         # Validate URL
         parsed = urlparse(url)
         if not parsed.scheme or not parsed.netloc:
             logger.error(f"Invalid URL: {url}")
             return None
         
-        # Check if URL points to a PDF
-        if parsed.path.lower().endswith('.pdf'):
-            logger.info(f"Skipping PDF file: {url}")
-            return None
+        # Known sites (GitHub, arXiv, YouTube, ...) have faster, cleaner sources
+        text = extractors.extract(url, deadline)
+        if text:
+            return text
         
         # Make request with timeout
         logger.info(f"Scraping URL: {url}")
-        response = requests.get(url, headers=headers, timeout=15, allow_redirects=True)
-        response.raise_for_status()
-        
-        # Check Content-Type header for PDF
-        content_type = response.headers.get('Content-Type', '').lower()
-        if 'application/pdf' in content_type or 'pdf' in content_type:
-            logger.info(f"Skipping PDF content type: {url}")
+        page = _download(url, headers, deadline)
+        if page is None:
             return None
+        if page.extracted:
+            return page.text
         
-        # Check for common paywall indicators in status code or redirects
-        if response.status_code == 402:  # Payment Required
-            logger.info(f"Paywall detected (402): {url}")
-            return None
-            
-        # Get the HTML content
-        html_content = response.text
+        # Parsing is CPU-bound; it runs in a worker process (see extract_pool.py)
+        return extract_pool.get_extract_pool().extract(page.text, url, deadline)
         
-        # Check for common paywall indicators in HTML
-        paywall_indicators = [
-            'paywall', 'subscription required', 'subscribe to read',
-            'premium content', 'member-only', 'subscribers only'
-        ]
-        lower_html = html_content.lower()
-        if any(indicator in lower_html for indicator in paywall_indicators):
-            # Check if it's a hard paywall (most content hidden)
-            soup = BeautifulSoup(html_content, 'html.parser')
-            text_length = len(soup.get_text().strip())
-            if text_length < 500:  # Likely a hard paywall
-                logger.info(f"Paywall detected in content: {url}")
+    except http_client.DeadlineExceeded as e:
+        logger.error(f"Deadline exceeded while scraping {url}: {str(e)}")
+        metrics.incr("scrape_deadline_exceeded")
+        return None
+    except requests.exceptions.Timeout:
+        logger.error(f"Timeout while scraping: {url}")
+        return None
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Request error while scraping {url}: {str(e)}")
+        return None
+    except Exception as e:
+        logger.error(f"Unexpected error while scraping {url}: {str(e)}")
+        return None
+
+
+def _download(url: str, headers: dict, deadline: http_client.Deadline) -> Optional[_Page]:
+    """
+    Stream a page and decode it incrementally, keeping memory bounded.
+    
+    The response headers are checked before the body is read: PDFs go to
+    pdf_extract, other non-HTML content and 402 responses are dropped without
+    downloading them, and at most
+    MAX_PAGE_BYTES of the body are read (longer pages are truncated). Raises
+    DeadlineExceeded if `deadline` passes mid-download.
+    
+    Pages seen before are revalidated with their ETag/Last-Modified and a 304
+    is answered from the page cache (see page_cache.py).
+    
+    Returns:
+        _Page: Decoded HTML, or the extracted text of a PDF; None if the page
+        should be skipped
+    """
+    cache = page_cache.get_page_cache()
+    cached = cache.get(url) if cache is not None else None
+    if cached:
+        headers = dict(headers, **cached.conditional_headers())
+    
+    with metrics.stage("http_download"):
+        response = http_client.get(url, headers=headers, timeout=15, allow_redirects=True, stream=True,
+                                   deadline=deadline)
+        try:
+            response.raise_for_status()
+            
+            if response.status_code == 304 and cached:
+                logger.info(f"Not modified, using cached page: {url}")
+                metrics.incr("page_cache_hit")
+                cache.touch(cached.url)
+                return _Page(cached.body, extracted=False)
+            if cache is not None:
+                metrics.incr("page_cache_miss")
+            
+            # Check Content-Type header for PDF and other binaries
+            content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+            is_pdf_path = urlparse(response.url or url).path.lower().endswith('.pdf')
+            if 'pdf' in content_type or (is_pdf_path and content_type in ('', 'application/octet-stream')):
+                text = pdf_extract.extract_pdf(response, url, deadline)
+                return _Page(text, extracted=True) if text else None
+            if content_type and content_type not in HTML_CONTENT_TYPES:
+                logger.info(f"Skipping non-HTML content type ({content_type}): {url}")
+                metrics.incr("scrape_skipped_content_type")
                 return None
-        
-        # Use readability to extract main content
-        doc = Document(html_content)
-        title = doc.title()
-        
-        # Parse the cleaned HTML from readability
-        readable_html = doc.summary()
-        soup = BeautifulSoup(readable_html, 'html.parser')
-        
-        # Also parse the original HTML for fallback
-        original_soup = BeautifulSoup(html_content, 'html.parser')
-        
-        # Remove unwanted elements
-        unwanted_tags = ['script', 'style', 'nav', 'header', 'footer', 'aside', 
-                        'advertisement', 'ad', 'sidebar', 'menu', 'iframe',
-                        'noscript', 'form', 'button']
-        
-        for tag_name in unwanted_tags:
-            for element in soup.find_all(tag_name):
-                element.decompose()
-                
-        # Remove elements with common ad/navigation classes
-        unwanted_classes = ['advertisement', 'ad-container', 'social-share', 
-                           'comments', 'related-posts', 'newsletter-signup',
-                           'popup', 'modal', 'cookie-banner']
-        
-        for class_name in unwanted_classes:
-            for element in soup.find_all(class_=re.compile(class_name, re.I)):
-                element.decompose()
-        
-        # Extract text content
-        content_parts = []
-        
-        # Add title
-        if title:
-            content_parts.append(f"Title: {title}\n")
-            content_parts.append("=" * 80 + "\n")
-        
-        # Extract main text content with structure
-        for element in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'li', 'blockquote', 'pre', 'code']):
-            text = element.get_text(strip=True)
-            if text:
-                # Add formatting based on element type
-                if element.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                    level = int(element.name[1])
-                    content_parts.append(f"\n{'#' * level} {text}\n")
-                elif element.name == 'blockquote':
-                    content_parts.append(f"\n> {text}\n")
-                elif element.name == 'li':
-                    content_parts.append(f"• {text}\n")
-                else:
-                    content_parts.append(f"{text}\n")
-        
-        # Extract image information (alt text, captions, titles)
-        images_info = []
-        
-        # Try to find images in the cleaned content first
-        for img in soup.find_all('img'):
-            img_data = {}
             
-            if img.get('alt'):
-                img_data['alt'] = img['alt'].strip()
-            if img.get('title'):
-                img_data['title'] = img['title'].strip()
-            if img.get('src'):
-                img_data['src'] = urljoin(url, img['src'])
+            # Check for common paywall indicators in status code or redirects
+            if response.status_code == 402:  # Payment Required
+                logger.info(f"Paywall detected (402): {url}")
+                return None
             
-            # Look for captions near the image
-            parent = img.parent
-            if parent:
-                # Check for figcaption
-                figcaption = parent.find('figcaption')
-                if figcaption:
-                    img_data['caption'] = figcaption.get_text(strip=True)
-                # Check for caption class
-                caption_elem = parent.find(class_=re.compile(r'caption', re.I))
-                if caption_elem and 'caption' not in img_data:
-                    img_data['caption'] = caption_elem.get_text(strip=True)
+            try:
+                decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+            except LookupError:
+                decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
             
-            if img_data:
-                images_info.append(img_data)
-        
-        # Fallback: also check original HTML if we didn't find many images
-        if len(images_info) < 3:
-            for img in original_soup.find_all('img'):
-                # Only add if we haven't seen this image already
-                alt = img.get('alt', '').strip()
-                if alt and not any(i.get('alt') == alt for i in images_info):
-                    img_data = {'alt': alt}
-                    if img.get('title'):
-                        img_data['title'] = img['title'].strip()
-                    images_info.append(img_data)
-        
-        # Add image information to content
-        if images_info:
-            content_parts.append("\n" + "=" * 80 + "\n")
-            content_parts.append("Images and Visual Content:\n")
-            content_parts.append("=" * 80 + "\n")
+            parts = []
+            received = 0
+            with deadline.guard(response):
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if received + len(chunk) > MAX_PAGE_BYTES:
+                        chunk = chunk[:MAX_PAGE_BYTES - received]
+                        received += len(chunk)
+                        parts.append(decoder.decode(chunk))
+                        logger.warning(f"Page exceeds {MAX_PAGE_BYTES} bytes, truncating: {url}")
+                        metrics.incr("scrape_truncated")
+                        break
+                    received += len(chunk)
+                    parts.append(decoder.decode(chunk))
+            parts.append(decoder.decode(b'', final=True))
+            metrics.add_bytes(received)
+            html_content = ''.join(parts)
             
-            for idx, img_data in enumerate(images_info, 1):
-                content_parts.append(f"\nImage {idx}:\n")
-                if 'alt' in img_data:
-                    content_parts.append(f"  Alt text: {img_data['alt']}\n")
-                if 'title' in img_data:
-                    content_parts.append(f"  Title: {img_data['title']}\n")
-                if 'caption' in img_data:
-                    content_parts.append(f"  Caption: {img_data['caption']}\n")
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            no_store = 'no-store' in response.headers.get('Cache-Control', '').lower()
+            if cache is not None and (etag or last_modified) and not no_store:
+                cache.put(url, response.url or url, html_content, etag, last_modified)
+            return _Page(html_content, extracted=False)
+        finally:
+            response.close()
+
+
+def extract_content(html_content: str, url: str) -> Optional[str]:
+    """
+    Extract the main content of an HTML page as LLM-ready text.
+    
+    The page is parsed once, with lxml, and that tree is shared by the paywall
+    check, readability (on a copy), the image fallback and the plain-text
+    fallback. Only readability's summary, a fraction of the page, is parsed again.
+    
+    Args:
+        html_content: Decoded HTML of the page
+        url: URL the page was fetched from (used to resolve image links)
         
-        # Combine all parts
-        full_content = ''.join(content_parts).strip()
+    Returns:
+        str: Extracted text content, or None if the page is paywalled or has no
+        meaningful content
+    """
+    try:
+        from bs4 import BeautifulSoup
+        from readability import Document
+        from readability.htmls import build_doc, get_title
+    except ImportError as e:
+        missing_lib = str(e).split("'")[1] if "'" in str(e) else "unknown"
+        logger.error(f"Missing required library: {missing_lib}. Install with: pip install beautifulsoup4 readability-lxml")
+        return None
+    
+    # Parse exactly the way readability would parse the raw string
+    with metrics.stage("html_parse"):
+        tree, _ = build_doc(html_content)
+    
+    # Check for common paywall indicators in HTML
+    paywall_indicators = [
+        'paywall', 'subscription required', 'subscribe to read',
+        'premium content', 'member-only', 'subscribers only'
+    ]
+    lower_html = html_content.lower()
+    if any(indicator in lower_html for indicator in paywall_indicators):
+        # Check if it's a hard paywall (most content hidden)
+        text_length = len(tree.text_content().strip())
+        if text_length < 500:  # Likely a hard paywall
+            logger.info(f"Paywall detected in content: {url}")
+            return None
+    
+    # Use readability to extract main content. It mutates the tree it is
+    # given, so it works on a copy (much cheaper than parsing again).
+    with metrics.stage("readability"):
+        title = get_title(tree)
+        readable_html = Document(copy.deepcopy(tree)).summary()
+    
+    with metrics.stage("html_parse"):
+        # Parse the cleaned HTML from readability (small compared to the page)
+        soup = BeautifulSoup(readable_html, 'html.parser')
+    
+    # Remove unwanted elements and collect text blocks and images in one walk
+    blocks, images = _clean_and_collect(soup)
+    
+    # Extract text content
+    content_parts = []
+    
+    # Add title
+    if title:
+        content_parts.append(f"Title: {title}\n")
+        content_parts.append("=" * 80 + "\n")
+    
+    # Extract main text content with structure
+    for element in blocks:
+        text = element.get_text(strip=True)
+        if text:
+            # Add formatting based on element type
+            if element.name in _HEADING_TAGS:
+                level = int(element.name[1])
+                content_parts.append(f"\n{'#' * level} {text}\n")
+            elif element.name == 'blockquote':
+                content_parts.append(f"\n> {text}\n")
+            elif element.name == 'li':
+                content_parts.append(f"• {text}\n")
+            else:
+                content_parts.append(f"{text}\n")
+    
+    # Extract image information (alt text, captions, titles)
+    images_info = []
+    
+    # Try to find images in the cleaned content first
+    for img in images:
+        img_data = {}
         
-        # Validate we got meaningful content
-        if len(full_content) < 100:
-            logger.warning(f"Extracted content is too short ({len(full_content)} chars): {url}")
-            # Try a simpler extraction as fallback
-            full_content = _simple_text_extract(original_soup, title, url)
-            
-            if len(full_content) < 100:
-                logger.error(f"Failed to extract meaningful content: {url}")
-                return None
+        if img.get('alt'):
+            img_data['alt'] = img['alt'].strip()
+        if img.get('title'):
+            img_data['title'] = img['title'].strip()
+        if img.get('src'):
+            img_data['src'] = urljoin(url, img['src'])
         
-        # Clean up excessive whitespace
-        full_content = re.sub(r'\n{3,}', '\n\n', full_content)
-        full_content = re.sub(r' {2,}', ' ', full_content)
+        # Look for captions near the image
+        parent = img.parent
+        if parent:
+            # Check for figcaption
+            figcaption = parent.find('figcaption')
+            if figcaption:
+                img_data['caption'] = figcaption.get_text(strip=True)
+            # Check for caption class
+            caption_elem = parent.find(class_=_CAPTION_CLASS_RE)
+            if caption_elem and 'caption' not in img_data:
+                img_data['caption'] = caption_elem.get_text(strip=True)
         
-        logger.info(f"Successfully scraped {len(full_content)} characters from: {url}")
-        return full_content
+        if img_data:
+            images_info.append(img_data)
+    
+    # Fallback: also check original HTML if we didn't find many images
+    if len(images_info) < 3:
+        for img in tree.iter('img'):
+            # Only add if we haven't seen this image already
+            alt = img.get('alt', '').strip()
+            if alt and not any(i.get('alt') == alt for i in images_info):
+                img_data = {'alt': alt}
+                if img.get('title'):
+                    img_data['title'] = img.get('title').strip()
+                images_info.append(img_data)
+    
+    # Add image information to content
+    if images_info:
+        content_parts.append("\n" + "=" * 80 + "\n")
+        content_parts.append("Images and Visual Content:\n")
+        content_parts.append("=" * 80 + "\n")
         
-    except requests.exceptions.Timeout:
-        logger.error(f"Timeout while scraping: {url}")
-        return None
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Request error while scraping {url}: {str(e)}")
-        return None
-    except Exception as e:
-        logger.error(f"Unexpected error while scraping {url}: {str(e)}")
-        return None
+        for idx, img_data in enumerate(images_info, 1):
+            content_parts.append(f"\nImage {idx}:\n")
+            if 'alt' in img_data:
+                content_parts.append(f"  Alt text: {img_data['alt']}\n")
+            if 'title' in img_data:
+                content_parts.append(f"  Title: {img_data['title']}\n")
+            if 'caption' in img_data:
+                content_parts.append(f"  Caption: {img_data['caption']}\n")
+    
+    # Combine all parts
+    full_content = ''.join(content_parts).strip()
+    
+    # Validate we got meaningful content
+    if len(full_content) < 100:
+        logger.warning(f"Extracted content is too short ({len(full_content)} chars): {url}")
+        # Try a simpler extraction as fallback
+        full_content = _simple_text_extract(tree, title, url)
+        
+        if len(full_content) < 100:
+            logger.error(f"Failed to extract meaningful content: {url}")
+            return None
+    
+    # Clean up excessive whitespace
+    full_content = re.sub(r'\n{3,}', '\n\n', full_content)
+    full_content = re.sub(r' {2,}', ' ', full_content)
+    
+    logger.info(f"Successfully scraped {len(full_content)} characters from: {url}")
+    return full_content
+
+
+# Tags dropped from readability's output, with everything inside them
+_UNWANTED_TAGS = frozenset([
+    'script', 'style', 'nav', 'header', 'footer', 'aside',
+    'advertisement', 'ad', 'sidebar', 'menu', 'iframe',
+    'noscript', 'form', 'button',
+])
+
+# Elements with a class containing any of these (case-insensitive) are dropped too
+_UNWANTED_CLASS_RE = re.compile(
+    '|'.join(['advertisement', 'ad-container', 'social-share',
+              'comments', 'related-posts', 'newsletter-signup',
+              'popup', 'modal', 'cookie-banner']),
+    re.I,
+)
+
+_HEADING_TAGS = frozenset(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+_TEXT_TAGS = _HEADING_TAGS | {'p', 'li', 'blockquote', 'pre', 'code'}
+_CAPTION_CLASS_RE = re.compile(r'caption', re.I)
+
+
+def _has_unwanted_class(element) -> bool:
+    classes = element.get('class')
+    if not classes:
+        return False
+    if isinstance(classes, str):
+        classes = [classes]
+    return any(_UNWANTED_CLASS_RE.search(c) for c in classes)
+
+
+def _clean_and_collect(soup):
+    """
+    Strip unwanted elements from `soup` and collect what the digest uses from it.
+    
+    A single depth-first walk in document order: unwanted tags/classes are
+    decomposed without descending into them, and the surviving text blocks and
+    images are collected along the way. Text is read from the blocks only after
+    the walk, once everything unwanted inside them is gone.
+    
+    Returns:
+        tuple: (text block elements, img elements), both in document order
+    """
+    from bs4 import Tag
+    
+    blocks = []
+    images = []
+    stack = list(reversed(soup.contents))
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, Tag):
+            continue
+        if node.name in _UNWANTED_TAGS or _has_unwanted_class(node):
+            node.decompose()
+            continue
+        if node.name in _TEXT_TAGS:
+            blocks.append(node)
+        elif node.name == 'img':
+            images.append(node)
+        stack.extend(reversed(node.contents))
+    return blocks, images
+
+
+_MAIN_ID_RE = re.compile(r'(main|content|article|post|entry)', re.I)
+_MAIN_CLASS_RE = re.compile(r'(main|content|article|post|entry|body)', re.I)
+
+
+def _text_lines(element) -> str:
+    """Equivalent of BeautifulSoup's get_text(separator='\\n', strip=True)."""
+    return '\n'.join(text.strip() for text in element.itertext() if text.strip())
 
 
-def _simple_text_extract(soup, title: str, url: str) -> str:
+def _simple_text_extract(tree, title: str, url: str) -> str:
     """
     Fallback method for extracting text when readability doesn't work well.
     
     Args:
-        soup: BeautifulSoup object of the page
+        tree: lxml document of the page (modified in place)
         title: Page title
         url: Original URL
         
@@ -243,8 +437,8 @@ def _simple_text_extract(soup, title: str, url: str) -> str:
     logger.info(f"Using simple text extraction fallback for: {url}")
     
     # Remove unwanted elements
-    for element in soup.find_all(['script', 'style', 'nav', 'header', 'footer', 'aside', 'iframe']):
-        element.decompose()
+    for element in list(tree.iter('script', 'style', 'nav', 'header', 'footer', 'aside', 'iframe')):
+        element.drop_tree()
     
     content_parts = []
     
@@ -256,26 +450,30 @@ def _simple_text_extract(soup, title: str, url: str) -> str:
     main_content = None
     
     # Look for common content containers
-    for selector in [
-        {'id': re.compile(r'(main|content|article|post|entry)', re.I)},
-        {'class': re.compile(r'(main|content|article|post|entry|body)', re.I)},
-        {'role': 'main'},
+    for attr, matches in [
+        ('id', _MAIN_ID_RE.search),
+        ('class', _MAIN_CLASS_RE.search),
+        ('role', lambda value: value == 'main'),
     ]:
-        main_content = soup.find(['main', 'article', 'div', 'section'], selector)
-        if main_content:
+        for element in tree.iter('main', 'article', 'div', 'section'):
+            value = element.get(attr)
+            if value is not None and matches(value):
+                main_content = element
+                break
+        if main_content is not None:
             break
     
     # If no main content found, use body
-    if not main_content:
-        main_content = soup.find('body')
+    if main_content is None:
+        main_content = tree.find('.//body')
     
-    if main_content:
+    if main_content is not None:
         # Get all text
-        text = main_content.get_text(separator='\n', strip=True)
+        text = _text_lines(main_content)
         content_parts.append(text)
     else:
-        # Last resort: get all text from soup
-        text = soup.get_text(separator='\n', strip=True)
+        # Last resort: get all text from the document
+        text = _text_lines(tree)
         content_parts.append(text)
     
     full_content = '\n'.join(content_parts)
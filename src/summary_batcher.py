@@ -0,0 +1,242 @@
+"""Micro-batching of short summarization requests.
+
+Every story makes its own summarize() calls (one for the post, one for the
+comments) and each call repeats the long system prompt. When stories are
+processed concurrently, short inputs for the same prompt and model that
+arrive within BATCH_WAIT_S of each other are packed into one JSON-mode
+request instead. A batch only waits for company while other summaries or LLM
+requests are in flight; a lone caller (as in sequential runs) is sent at once.
+
+    {"items": [{"id": "1", "text": "..."}, ...]}  ->  {"summaries": {"1": "...", ...}}
+
+The response is checked item by item. Items missing from it or malformed (or
+all of them, if the batch request fails or isn't valid JSON) are summarized
+with a request of their own, as before. Inputs over BATCH_ITEM_MAX_TOKENS
+always get their own request.
+
+A batch's token usage is split among its items by input size, so each story
+is still charged for its share. ``SUMMARY_BATCH_SIZE=1`` turns batching off.
+
+Batches mix different stories' text, so an instruction planted in one page
+could reach the summaries of the others in the same request. That risk is
+accepted: the inputs are JSON strings the prompt treats as data, all of them
+come from the same public front page for the same digest, and the model has
+no tools or secrets to misuse, so the worst case is a wrong summary in the
+digest, which a page can already cause for its own story. Limiting batches to
+a single story would leave nothing to batch, as a story's post and comment
+summaries use different prompts. Set ``SUMMARY_BATCH_SIZE=1`` where that
+trade-off doesn't hold.
+"""
+import asyncio
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+from logger import setup_logger
+import llm_client
+import metrics
+import token_budget
+
+logger = setup_logger(__name__)
+
+BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", 4))
+BATCH_WAIT_S = float(os.getenv("SUMMARY_BATCH_WAIT", 0.3))
+BATCH_ITEM_MAX_TOKENS = int(os.getenv("SUMMARY_BATCH_ITEM_MAX_TOKENS", 1500))
+
+# Estimated tokens of JSON framing around each item's text
+ITEM_OVERHEAD_TOKENS = 10
+
+BATCH_INSTRUCTIONS = """
+            You are given several independent inputs as JSON: {"items": [{"id": "...", "text": "..."}, ...]}.
+            Summarize the text of each item on its own, following the rules below for every item.
+            Never mix content between items.
+
+            Respond with JSON only, in exactly this shape, with one entry per id you were given:
+            {"summaries": {"<id>": "<summary of that item's text>", ...}}
+
+            RULES FOR EACH ITEM:
+            """
+
+
+def parse_summaries(text: Optional[str], ids: List[str]) -> Dict[str, str]:
+    """Valid summaries by id from a batch response; unknown ids and empty or non-string entries are left out."""
+    try:
+        data = json.loads(text or "")
+    except ValueError:
+        return {}
+    summaries = data.get("summaries") if isinstance(data, dict) else None
+    if not isinstance(summaries, dict):
+        return {}
+    return {
+        str(item_id): summary.strip()
+        for item_id, summary in summaries.items()
+        if str(item_id) in ids and isinstance(summary, str) and summary.strip()
+    }
+
+
+def _share(usage: Dict[str, int], fraction: float) -> Dict[str, int]:
+    return {name: round(count * fraction) for name, count in usage.items()}
+
+
+def _add_usage(a: Dict[str, int], b: Dict[str, int]) -> Dict[str, int]:
+    return {name: a.get(name, 0) + b.get(name, 0) for name in set(a) | set(b)}
+
+
+class _Item:
+    def __init__(self, text: str, future: asyncio.Future):
+        self.text = text
+        self.tokens = token_budget.estimate_tokens(text) + ITEM_OVERHEAD_TOKENS
+        self.future = future
+
+
+class SummaryBatcher:
+    """Collects short summarization requests into batches (see module docstring).
+
+    Batching state lives on the LLM client's event loop and is only touched from it.
+    """
+
+    def __init__(self, client: llm_client.LLMClient, batch_size: int = BATCH_SIZE,
+                 wait_s: float = BATCH_WAIT_S, max_item_tokens: int = BATCH_ITEM_MAX_TOKENS):
+        self.client = client
+        self.batch_size = batch_size
+        self.wait_s = wait_s
+        self.max_item_tokens = max_item_tokens
+        self._pending: Dict[tuple, List[_Item]] = {}
+        self._timers: Dict[tuple, asyncio.TimerHandle] = {}
+        self._active = 0
+
+    def accepts(self, text: str) -> bool:
+        return self.batch_size > 1 and token_budget.estimate_tokens(text) <= self.max_item_tokens
+
+    def summarize(self, text: str, system_prompt: str, model: str) -> llm_client.Completion:
+        """Blocking `asummarize`, callable from any thread."""
+        return self.client.run(self.asummarize(text, system_prompt, model))
+
+    async def asummarize(self, text: str, system_prompt: str, model: str) -> llm_client.Completion:
+        """
+        Summarize `text` with `system_prompt`, batched with other short inputs if possible.
+
+        Raises:
+            Whatever LLMClient.acomplete raises for the item's own request
+        """
+        if not self.accepts(text):
+            return await self._single(text, system_prompt, model)
+
+        self._active += 1
+        try:
+            # Let callers already scheduled on the loop join before deciding whether to wait
+            await asyncio.sleep(0)
+            key = (system_prompt, model)
+            item = _Item(text, asyncio.get_running_loop().create_future())
+            pending = self._pending.get(key, [])
+            # Keep the whole batch within the input budget; send what's queued first if it wouldn't fit
+            batch_tokens = token_budget.estimate_tokens(BATCH_INSTRUCTIONS + system_prompt) + item.tokens
+            if pending and batch_tokens + sum(i.tokens for i in pending) > token_budget.INPUT_TOKEN_BUDGET:
+                self._flush(key)
+            pending = self._pending.setdefault(key, [])
+            pending.append(item)
+            if len(pending) >= self.batch_size:
+                self._flush(key)
+            elif len(pending) == 1:
+                if self._active > 1 or self.client.queued:
+                    self._timers[key] = asyncio.get_running_loop().call_later(self.wait_s, self._flush, key)
+                else:
+                    # Nobody else is summarizing, so nothing is coming to share the request
+                    self._flush(key)
+            return await item.future
+        finally:
+            self._active -= 1
+
+    def _flush(self, key: tuple):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._pending.pop(key, [])
+        if items:
+            asyncio.ensure_future(self._send(key[0], key[1], items))
+
+    async def _single(self, text: str, system_prompt: str, model: str) -> llm_client.Completion:
+        return await self.client.acomplete(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": text},
+            ],
+            model,
+        )
+
+    async def _send(self, system_prompt: str, model: str, items: List[_Item]):
+        # A batch serves several stories, so its own timings go to the run as a whole
+        with metrics.bound_to(None):
+            try:
+                await self._send_batch(system_prompt, model, items)
+            except Exception as e:
+                # Nobody awaits this task; hand the error to every waiting caller instead
+                for item in items:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+
+    async def _send_batch(self, system_prompt: str, model: str, items: List[_Item]):
+        if len(items) == 1:
+            await self._resolve_single(items[0], system_prompt, model, {})
+            return
+
+        ids = [str(n) for n in range(1, len(items) + 1)]
+        payload = {"items": [{"id": item_id, "text": item.text} for item_id, item in zip(ids, items)]}
+        metrics.incr("summary_batches")
+        metrics.incr("summary_batched_items", len(items))
+        summaries: Dict[str, str] = {}
+        usage: Dict[str, int] = {}
+        try:
+            completion = await self.client.acomplete(
+                [
+                    {"role": "system", "content": BATCH_INSTRUCTIONS + system_prompt},
+                    {"role": "user", "content": json.dumps(payload, ensure_ascii=False)},
+                ],
+                model,
+                response_format={"type": "json_object"},
+            )
+            usage = completion.usage
+            summaries = parse_summaries(completion.text, ids)
+            if not summaries:
+                logger.warning(f"Batched summary response of {len(items)} inputs could not be parsed")
+                metrics.incr("summary_batch_parse_failed")
+        except Exception as e:
+            logger.warning(f"Batched summarization of {len(items)} inputs failed: {e}")
+
+        total_chars = sum(len(item.text) for item in items) or 1
+        retry = []
+        for item_id, item in zip(ids, items):
+            share = _share(usage, len(item.text) / total_chars)
+            if item_id in summaries:
+                if not item.future.done():
+                    item.future.set_result(llm_client.Completion(summaries[item_id], share, model))
+            else:
+                retry.append((item, share))
+        if retry:
+            logger.info(f"Summarizing {len(retry)} of {len(items)} batched inputs one by one")
+            metrics.incr("summary_batch_fallback", len(retry))
+            await asyncio.gather(*(self._resolve_single(item, system_prompt, model, share) for item, share in retry))
+
+    async def _resolve_single(self, item: _Item, system_prompt: str, model: str, usage: Dict[str, int]):
+        try:
+            completion = await self._single(item.text, system_prompt, model)
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+            return
+        if not item.future.done():
+            item.future.set_result(completion._replace(usage=_add_usage(usage, completion.usage)))
+
+
+_batcher_lock = threading.Lock()
+_batcher: Optional[SummaryBatcher] = None
+
+
+def get_summary_batcher() -> SummaryBatcher:
+    """Shared process-wide batcher on the shared LLM client."""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = SummaryBatcher(llm_client.get_llm_client())
+        return _batcher
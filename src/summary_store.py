@@ -0,0 +1,161 @@
+"""Reuse of summaries across digest runs.
+
+A story that stays in the top 10 for several days would otherwise be scraped
+and summarized again every morning. Post summaries are stored keyed by the
+canonical article URL plus a hash of the scraped text, so they are reused only
+while the article is unchanged. Comment summaries are stored per story together
+with the comment count they were built from and are reused until the
+discussion has grown meaningfully (see COMMENT_GROWTH_*).
+
+Lives next to the HN item cache; set ``SUMMARY_CACHE=0`` to disable.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from item_cache import CACHE_DIR
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Stored summaries older than this are dropped when the store is opened.
+RETENTION_DAYS = 14
+
+# A comment summary is redone once the story gained at least this many new
+# comments AND this fraction of the count it was last summarized at.
+COMMENT_GROWTH_MIN = 20
+COMMENT_GROWTH_RATIO = 0.25
+
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref|ref_src)$", re.I)
+
+
+def canonical_url(url: str) -> str:
+    """Normalize a URL so trivially different links to one article match.
+
+    Lowercases scheme and host, drops ``www.``, default ports, fragments,
+    tracking query params and a trailing slash, and sorts the query string.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/")
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not _TRACKING_PARAMS.match(k)
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def content_hash(text: str) -> str:
+    """Hash of the scraped text, insensitive to whitespace-only changes."""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def comments_grown(previous_count: int, current_count: int) -> bool:
+    """True if the discussion grew enough since `previous_count` to re-summarize."""
+    grown = current_count - previous_count
+    return grown >= COMMENT_GROWTH_MIN and grown >= previous_count * COMMENT_GROWTH_RATIO
+
+
+class SummaryStore:
+    """SQLite-backed store of post and comment summaries, shared between threads."""
+
+    def __init__(self, path: str, retention_days: int = RETENTION_DAYS):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS post_summaries (
+                url TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (url, content_hash)
+            );
+            CREATE TABLE IF NOT EXISTS comment_summaries (
+                story_id INTEGER PRIMARY KEY,
+                comment_count INTEGER NOT NULL,
+                summary TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            """
+        )
+        cutoff = time.time() - retention_days * 24 * 60 * 60
+        self._conn.execute("DELETE FROM post_summaries WHERE created_at < ?", (cutoff,))
+        self._conn.execute("DELETE FROM comment_summaries WHERE created_at < ?", (cutoff,))
+        self._conn.commit()
+
+    def get_post_summary(self, url: str, scraped_text: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM post_summaries WHERE url = ? AND content_hash = ?",
+                (canonical_url(url), content_hash(scraped_text)),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_post_summary(self, url: str, scraped_text: str, summary: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO post_summaries (url, content_hash, summary, created_at) VALUES (?, ?, ?, ?)",
+                (canonical_url(url), content_hash(scraped_text), summary, time.time()),
+            )
+            self._conn.commit()
+
+    def get_comment_summary(self, story_id: int, comment_count: int) -> Optional[str]:
+        """Stored comment summary, unless the discussion has grown since it was made."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT comment_count, summary FROM comment_summaries WHERE story_id = ?", (story_id,)
+            ).fetchone()
+        if row is None or comments_grown(row[0], comment_count):
+            return None
+        return row[1]
+
+    def put_comment_summary(self, story_id: int, comment_count: int, summary: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO comment_summaries (story_id, comment_count, summary, created_at) VALUES (?, ?, ?, ?)",
+                (story_id, comment_count, summary, time.time()),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store_lock = threading.Lock()
+_store: Optional[SummaryStore] = None
+
+
+def get_summary_store() -> Optional[SummaryStore]:
+    """Shared process-wide store, or None when disabled with ``SUMMARY_CACHE=0``."""
+    global _store
+    if os.getenv("SUMMARY_CACHE", "1") == "0":
+        return None
+    with _store_lock:
+        if _store is None:
+            try:
+                _store = SummaryStore(os.path.join(CACHE_DIR, "summaries.sqlite3"))
+            except sqlite3.Error as e:
+                logger.warning(f"Summary store unavailable, summarizing everything: {e}")
+                return None
+        return _store
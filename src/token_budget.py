@@ -0,0 +1,224 @@
+"""Fit LLM input into a token budget before it is sent.
+
+Groq answers 413 when a request is larger than the model (or the account's
+per-minute token limit) allows, and summarize() used to find that out the
+expensive way: send everything, then halve the text and retry. Instead the
+input is measured up front with a cheap estimate (~4 characters per token for
+English prose) and condensed to fit, keeping what matters most for a summary:
+
+1. the "Title: ..." header,
+2. every heading, in order (up to a tenth of the budget),
+3. body text in document order, the opening paragraphs first,
+4. the trailing "Images and Visual Content" section, only if room is left.
+
+Dropped stretches are marked with "[...]" so the model knows text is missing.
+The 413 retry in summarize() stays as a safety net for when the estimate is off.
+
+For map-reduce summarization, ``split`` cuts text into budget-sized chunks on
+section boundaries instead.
+"""
+import math
+import os
+from typing import List, NamedTuple
+
+from logger import setup_logger
+import metrics
+
+logger = setup_logger(__name__)
+
+# Estimated input tokens per request, system prompt included. The default
+# stays under Groq's free-tier per-request limits for the digest models with
+# room for the completion; raise it on paid tiers.
+INPUT_TOKEN_BUDGET = int(os.getenv("LLM_INPUT_TOKEN_BUDGET", 6000))
+
+CHARS_PER_TOKEN = 4
+
+# Share of the budget headings may take before the body gets any.
+HEADING_SHARE = 0.1
+
+# Don't bother cutting a block to fit unless at least this many characters of it would stay.
+MIN_PARTIAL_CHARS = 200
+
+GAP_MARKER = "[...]"
+_IMAGES_MARKER = "Images and Visual Content:"
+
+
+class Budgeted(NamedTuple):
+    text: str
+    estimated_tokens: int       # of the text as given
+    kept_tokens: int            # of the text returned
+    dropped_chars: int
+
+    @property
+    def trimmed(self) -> bool:
+        return self.dropped_chars > 0
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def _cut(block: str, max_chars: int) -> str:
+    """Shorten `block` to at most `max_chars`, preferring a sentence, then a word boundary."""
+    head = block[:max_chars]
+    for boundary in (". ", "\n", " "):
+        end = head.rfind(boundary)
+        if end >= max_chars // 2:
+            return head[:end + 1].rstrip()
+    return head
+
+
+def fit(text: str, max_tokens: int) -> Budgeted:
+    """Return `text` unchanged if it fits `max_tokens`, else a condensed version that does."""
+    estimated = estimate_tokens(text)
+    if estimated <= max_tokens:
+        return Budgeted(text, estimated, estimated, 0)
+
+    limit = max_tokens * CHARS_PER_TOKEN
+    budget = int(limit * 0.95)  # the rest is left for gap markers
+    lines = text.split("\n")
+
+    # Priority per line: 0 = title header, 1 = heading, 2 = body, 3 = image section
+    header_end = 2 if lines[0].startswith("Title: ") else 0
+    images_start = len(lines)
+    if _IMAGES_MARKER in lines:
+        images_start = lines.index(_IMAGES_MARKER)
+        if images_start > 0 and set(lines[images_start - 1].strip()) == {"="}:
+            images_start -= 1
+    priorities: List[int] = []
+    for i, line in enumerate(lines):
+        if i < header_end:
+            priorities.append(0)
+        elif i >= images_start:
+            priorities.append(3)
+        elif line.lstrip().startswith("#"):
+            priorities.append(1)
+        else:
+            priorities.append(2)
+
+    kept = [None] * len(lines)
+    used = 0
+
+    def take(i: int, cap: int) -> bool:
+        """Keep line `i` if it fits under `cap` characters; a body line may be cut to fit."""
+        nonlocal used
+        cost = len(lines[i]) + 1
+        if used + cost <= cap:
+            kept[i] = lines[i]
+            used += cost
+            return True
+        room = cap - used - 1
+        if priorities[i] == 2 and room >= MIN_PARTIAL_CHARS:
+            kept[i] = _cut(lines[i], room)
+            used += len(kept[i]) + 1
+        return False
+
+    for i, priority in enumerate(priorities):
+        if priority == 0:
+            take(i, budget)
+    heading_limit = used + int(budget * HEADING_SHARE)
+    for i, priority in enumerate(priorities):
+        if priority == 1 and not take(i, heading_limit):
+            break
+    for wanted in (2, 3):
+        for i, priority in enumerate(priorities):
+            if priority == wanted and not take(i, budget):
+                break
+
+    out = []
+    for line in kept:
+        if line is not None:
+            out.append(line)
+        elif not out or out[-1] != GAP_MARKER:
+            out.append(GAP_MARKER)
+    condensed = "\n".join(out)
+    if len(condensed) > limit:
+        condensed = _cut(condensed, limit)
+    return Budgeted(condensed, estimated, estimate_tokens(condensed), max(0, len(text) - len(condensed)))
+
+
+def _pieces(section: str, max_chars: int) -> List[str]:
+    """Break an oversized section into pieces of at most `max_chars`, on line boundaries where possible."""
+    pieces: List[str] = []
+    current: List[str] = []
+    size = 0
+    for line in section.split("\n"):
+        while len(line) > max_chars:
+            head = _cut(line, max_chars)
+            pieces.append(head)
+            line = line[len(head):].lstrip()
+        if current and size + len(line) + 1 > max_chars:
+            pieces.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def split(text: str, max_tokens: int, max_chunks: int) -> List[str]:
+    """
+    Split `text` into at most `max_chunks` chunks of at most `max_tokens` each.
+
+    Chunks end at headings where possible, else at line breaks. Each chunk
+    starts with the "Title: ..." header, if the text has one. Text that
+    wouldn't fit in `max_chunks` chunks is condensed with `fit` first, as far
+    as needed for all of the condensed text to land in a chunk, so the chunk
+    count (and with it latency and token spend) stays bounded.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    lines = text.split("\n")
+    header = ""
+    if lines[0].startswith("Title: "):
+        header = "\n".join(lines[:2]) + "\n"
+        lines = lines[2:]
+    body = "\n".join(lines).strip("\n")
+
+    chunk_tokens = max_tokens - estimate_tokens(header)
+    max_chars = int(chunk_tokens * CHARS_PER_TOKEN * 0.95)
+    # Chunks rarely pack full, so condense to a bit less than max_chunks would hold,
+    # and further while the condensed text still packs into too many chunks
+    capacity = int(chunk_tokens * max_chunks * 0.9)
+    fitted = body
+    while True:
+        if estimate_tokens(fitted) > capacity:
+            fitted = fit(body, capacity).text
+        chunks = _pack(fitted, max_chars)
+        if len(chunks) <= max_chunks or capacity <= chunk_tokens:
+            break
+        capacity = max(chunk_tokens, min(capacity - 1, int(capacity * max_chunks / len(chunks) * 0.95)))
+
+    if len(chunks) > max_chunks:
+        # Only reachable if a single chunk's worth of text still doesn't pack into one
+        lost = sum(len(chunk) for chunk in chunks[max_chunks:])
+        logger.warning(f"Text did not pack into {max_chunks} chunks, dropping the last {lost} characters")
+        chunks = chunks[:max_chunks]
+    dropped = len(body) - sum(len(chunk) for chunk in chunks)
+    if dropped > 0:
+        logger.info(f"Text condensed by {dropped} characters to fit {max_chunks} chunks of {max_tokens} tokens")
+        metrics.incr("llm_input_dropped_chars", dropped)
+    return [header + chunk for chunk in chunks]
+
+
+def _pack(body: str, max_chars: int) -> List[str]:
+    """Pack `body` into chunks of at most `max_chars`, starting a section at each heading."""
+    sections: List[str] = []
+    for line in body.split("\n"):
+        if not sections or line.lstrip().startswith("#"):
+            sections.append(line)
+        else:
+            sections[-1] += "\n" + line
+
+    chunks: List[str] = []
+    current = ""
+    for section in sections:
+        for piece in ([section] if len(section) <= max_chars else _pieces(section, max_chars)):
+            if current and len(current) + len(piece) + 1 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return [chunk.strip("\n") for chunk in chunks if chunk.strip()]
@@ -14,6 +14,9 @@ logger = setup_logger(__name__)
 
 MAX_SUBSCRIBERS = 50
 
+# Overridable so the benchmark suite can point Mailgun calls at a local stand-in.
+MAILGUN_API_BASE = (os.getenv("MAILGUN_API_BASE") or "https://api.mailgun.net/v3").rstrip("/")
+
 
 class MailgunError(Exception):
     """Base exception for Mailgun-related errors."""
@@ -50,11 +53,15 @@ def validate_email(email: str) -> (bool, str):
 
 
 def _get_requests_module():
+    """Return the shared HTTP client, which mirrors the `requests` API used here."""
     try:
-        import requests
-        return requests, None
-    except Exception:
-        msg = "Missing dependency: requests"
+        try:
+            import http_client
+        except ImportError:
+            from src import http_client
+        return http_client, None
+    except Exception as e:
+        msg = f"Could not import http_client (requires requests): {e}"
         logger.info(msg)
         return None, msg
 
@@ -71,7 +78,7 @@ def _get_mailgun_config():
 
 
 def _members_base_url(list_name: str, domain_name: str) -> str:
-    return f"https://api.mailgun.net/v3/lists/{list_name}@{domain_name}/members"
+    return f"{MAILGUN_API_BASE}/lists/{list_name}@{domain_name}/members"
 
 
 def _member_url(list_name: str, domain_name: str, email: str) -> str:
@@ -106,7 +113,7 @@ def get_subscriber_count() -> int:
         api_key, list_name, domain_name, err = _get_mailgun_config()
         if err or err_requests:
             return 0
-        url = f"https://api.mailgun.net/v3/lists/{list_name}@{domain_name}"
+        url = f"{MAILGUN_API_BASE}/lists/{list_name}@{domain_name}"
         resp = requests.get(url, auth=("api", api_key), timeout=10)
         if resp.status_code == 200:
             return resp.json().get("list", {}).get("members_count", 0)
@@ -238,7 +245,7 @@ def send_greeting_mail(email: str) -> Tuple[bool, str]:
         return False, str(exc)
 
     from_addr = f"{list_name}@{domain_name}".strip()
-    url = f"https://api.mailgun.net/v3/{domain_name}/messages"
+    url = f"{MAILGUN_API_BASE}/{domain_name}/messages"
     
     template_dir = pathlib.Path(__file__).parents[1] / "templates"
     css_path = template_dir / "greetingMail.css"
@@ -0,0 +1,68 @@
+"""Tests for comment preprocessing in src/comments.py."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import comments  # noqa: E402
+
+
+def item(item_id, text, parent=1, kids=0, **extra):
+    return dict({"id": item_id, "parent": parent, "text": text, "kids": list(range(kids))}, **extra)
+
+
+@pytest.mark.unit
+def test_comment_text_strips_markup():
+    markup = ('It&#x27;s <i>fast</i> &amp; small: <a href="https:&#x2F;&#x2F;example.com" rel="nofollow">'
+              'https:&#x2F;&#x2F;example.com</a><p>Second   paragraph.'
+              '<p><pre><code>  if a &lt; b:\n      return a\n</code></pre>')
+    assert comments.comment_text(markup) == (
+        "It's fast & small: https://example.com\n\n"
+        "Second paragraph.\n\n"
+        "  if a < b:\n      return a"
+    )
+
+
+@pytest.mark.unit
+def test_clean_drops_dead_deleted_short_and_duplicate_comments():
+    walked = [
+        (1, item(10, "A thoughtful point about caching.")),
+        (1, item(11, "", deleted=True)),
+        (1, item(12, "Spam spam spam spam spam", dead=True)),
+        (1, item(13, "+1")),
+        (2, item(14, "<p>A thoughtful point about <i>caching</i>!", parent=10)),
+        (2, item(15, "A different reply entirely.", parent=10)),
+    ]
+    cleaned = comments.clean(walked)
+    assert [c.id for c in cleaned] == [10, 15]
+    assert [(c.depth, c.position) for c in cleaned] == [(1, 0), (2, 0)]
+
+
+@pytest.mark.unit
+def test_select_prefers_early_and_discussed_comments_within_budget():
+    walked = [(1, item(n, f"Top-level comment number {n}. " + "word " * 60, kids=0)) for n in range(10, 20)]
+    walked.append((1, item(99, "Late comment with a big sub-thread. " + "word " * 60, kids=30)))
+    walked.append((2, item(100, "A reply further down. " + "word " * 60, parent=10)))
+    cleaned = comments.clean(walked)
+
+    chosen = comments.select(cleaned, max_tokens=300)
+
+    ids = [c.id for c in chosen]
+    assert sum(len(c.text) + 2 for c in chosen) <= 300 * 4
+    assert 10 in ids and 99 in ids
+    assert 19 not in ids and 100 not in ids
+    assert ids == sorted(ids, key=[c.id for c in cleaned].index)
+
+
+@pytest.mark.unit
+def test_prepare_cuts_long_comments_and_fits_the_budget():
+    walked = [(1, item(n, f"<p>Comment {n}. " + "Long argument sentence here. " * 200)) for n in range(1, 30)]
+    text = comments.prepare(walked, max_tokens=2000)
+    blocks = text.split("\n\n")
+    assert len(text) <= 2000 * 4
+    assert len(blocks) == 5
+    assert "<p>" not in text
+    assert all(len(block) <= comments.MAX_COMMENT_CHARS + 6 for block in blocks)
@@ -0,0 +1,261 @@
+"""Tests for fetching and processing stories in src/digest_generator.py."""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import digest_generator  # noqa: E402
+import metrics  # noqa: E402
+
+
+def item(story_id):
+    return {"id": story_id, "title": f"Story {story_id}", "url": f"https://example.com/{story_id}", "kids": []}
+
+
+def entry(story_id):
+    return {"title": f"Story {story_id}", "post_summary": f"summary {story_id}"}
+
+
+@pytest.fixture
+def stories(monkeypatch):
+    """Scripts build_story_entry per story id: "ok" (default), "fail", or "slow" (runs until cancelled)."""
+    script = {}
+    calls = []
+    abandoned = []
+
+    def fake_build(story_id, idx, total, stages=None, comment_budget=None, story_data=None):
+        calls.append(story_id)
+        behaviour = script.get(story_id, "ok")
+        if behaviour == "fail":
+            raise ValueError("scripted failure")
+        if behaviour == "slow":
+            stages.cancelled.wait(10)
+            abandoned.append(story_id)
+            raise digest_generator.StoryAbandoned("cancelled")
+        return entry(story_id)
+
+    monkeypatch.setattr(digest_generator, "build_story_entry", fake_build)
+    monkeypatch.setattr(digest_generator, "fetch_items", lambda ids: [item(story_id) for story_id in ids])
+    metrics.start_run()
+    return script, calls, abandoned
+
+
+def run(story_ids, count, deadline_s, done=None):
+    stages = digest_generator.StageLimits()
+    return digest_generator._run_with_deadline(story_ids, count, deadline_s, {} if done is None else done,
+                                               stages, None, None)
+
+
+def wait_for(condition):
+    give_up = time.monotonic() + 5
+    while not condition() and time.monotonic() < give_up:
+        time.sleep(0.01)
+
+
+@pytest.mark.unit
+def test_straggler_is_replaced_by_an_overfetched_story(stories):
+    script, calls, abandoned = stories
+    script[2] = "slow"
+
+    digest = run([1, 2, 3], count=2, deadline_s=0.3)
+
+    assert digest == {1: entry(1), 3: entry(3)}
+    wait_for(lambda: abandoned)
+    assert abandoned == [2]
+
+
+@pytest.mark.unit
+def test_missing_slots_are_filled_title_only_in_rank_order(stories):
+    script, calls, abandoned = stories
+    script.update({2: "fail", 3: "slow", 4: "slow", 5: "slow"})
+
+    digest = run([1, 2, 3, 4, 5], count=3, deadline_s=0.3)
+
+    # Failed story 2 is left out; the best-ranked stragglers fill the rest
+    assert list(digest) == [1, 3, 4]
+    assert digest[1] == entry(1)
+    assert digest[3]["title"] == "Story 3" and digest[3]["post_summary"] is None
+    assert digest[4]["comments_url"].endswith("id=4")
+    assert metrics.current_report().summary()["counters"]["title_only_fallback"] == 2
+
+
+@pytest.mark.unit
+def test_returns_once_the_top_stories_are_known(stories):
+    script, calls, abandoned = stories
+    script[3] = "slow"
+
+    started = time.monotonic()
+    digest = run([1, 2, 3], count=2, deadline_s=30)
+
+    assert time.monotonic() - started < 5
+    assert digest == {1: entry(1), 2: entry(2)}
+    wait_for(lambda: abandoned)
+    assert abandoned == [3]
+
+
+@pytest.mark.unit
+def test_resume_only_processes_missing_stories(stories):
+    script, calls, abandoned = stories
+    done = {1: {"title": "from journal"}, 2: None}
+
+    digest = run([1, 2, 3, 4], count=2, deadline_s=30, done=done)
+
+    assert digest == {1: {"title": "from journal"}, 3: entry(3)}
+    assert 1 not in calls and 2 not in calls
+
+
+def comment(item_id, kids=(), text=None, **flags):
+    return dict({"id": item_id, "kids": list(kids), "text": f"comment {item_id}" if text is None else text}, **flags)
+
+
+@pytest.fixture
+def thread(monkeypatch):
+    """A comment tree served by a stubbed fetch_items; records each batch and the deadline it got."""
+    items = {}
+    batches = []
+
+    def fake_fetch(item_ids, max_workers=digest_generator.HN_FETCH_WORKERS, deadline=None):
+        batches.append((list(item_ids), deadline))
+        return [items.get(item_id) for item_id in item_ids]
+
+    monkeypatch.setattr(digest_generator, "fetch_items", fake_fetch)
+    return items, batches
+
+
+def walk(root_ids, **limits):
+    return [(depth, item["id"]) for depth, item in
+            digest_generator.walk_comment_tree(root_ids, digest_generator.CommentBudget(**limits))]
+
+
+@pytest.mark.unit
+def test_walk_is_breadth_first_within_depth_and_fanout_limits(thread):
+    items, batches = thread
+    items.update({
+        1: comment(1, kids=[11, 12, 13]), 2: comment(2, kids=[21]), 3: comment(3),
+        11: comment(11, kids=[111]), 12: comment(12), 13: comment(13), 21: comment(21),
+        111: comment(111, kids=[1111]), 1111: comment(1111),
+    })
+
+    assert walk([1, 2, 3], max_top_level=2, max_replies=2, max_depth=3) == [
+        (1, 1), (1, 2), (2, 11), (2, 12), (2, 21), (3, 111),
+    ]
+    # Story 3 is past max_top_level, reply 13 past max_replies, 1111 past max_depth
+    fetched = [item_id for batch, _ in batches for item_id in batch]
+    assert 3 not in fetched and 13 not in fetched and 1111 not in fetched
+
+
+@pytest.mark.unit
+def test_walk_stops_at_item_and_character_limits(thread):
+    items, batches = thread
+    items.update({n: comment(n, text="x" * 100) for n in range(1, 11)})
+
+    assert len(walk(list(range(1, 11)), max_items=4)) == 4
+    # Only as many items as the budget still allows are requested
+    assert [len(batch) for batch, _ in batches] == [4]
+    assert len(walk(list(range(1, 11)), max_chars=250)) == 3
+
+
+@pytest.mark.unit
+def test_replies_of_deleted_and_dead_comments_are_followed(thread):
+    items, batches = thread
+    items.update({
+        1: comment(1, kids=[11], deleted=True), 2: comment(2, kids=[21], dead=True), 3: comment(3, kids=[31], text=""),
+        11: comment(11), 21: comment(21), 31: comment(31),
+    })
+
+    assert walk([1, 2, 3, 4]) == [(2, 11), (2, 21), (2, 31)]
+
+
+@pytest.mark.unit
+def test_item_fetches_share_the_walk_deadline(thread):
+    items, batches = thread
+    items.update({1: comment(1, kids=[11]), 11: comment(11)})
+
+    walk([1], deadline_s=20)
+
+    deadlines = [deadline for _, deadline in batches]
+    assert len(deadlines) == 2 and deadlines[0] is deadlines[1]
+    assert 19 < deadlines[0].remaining() <= 20
+
+    batches.clear()
+    assert walk([1], deadline_s=0) == []
+    assert batches == []
+
+
+@pytest.mark.unit
+def test_item_requests_carry_the_deadline(monkeypatch):
+    sent = []
+
+    class Response:
+        content = b"{}"
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"id": 1}
+
+    def fake_get(url, **kwargs):
+        sent.append(kwargs.get("deadline"))
+        return Response()
+    monkeypatch.setattr(digest_generator.item_cache, "get_item_cache", lambda: None)
+    monkeypatch.setattr(digest_generator.http_client, "get", fake_get)
+    deadline = digest_generator.http_client.Deadline(5)
+
+    assert digest_generator.fetch_items([1, 2], deadline=deadline) == [{"id": 1}, {"id": 1}]
+    assert sent == [deadline, deadline]
+
+
+@pytest.mark.unit
+def test_concurrent_digest_keeps_ranking_order_and_isolates_failures(monkeypatch):
+    # Later-ranked stories finish first
+    delays = {1: 0.3, 2: 0.2, 3: 0.1, 4: 0.0}
+
+    def fake_build(story_id, idx, total, stages=None, comment_budget=None, story_data=None):
+        time.sleep(delays[story_id])
+        if story_id == 2:
+            raise ValueError("scripted failure")
+        return entry(story_id)
+
+    monkeypatch.setattr(digest_generator, "top_stories", lambda count: [1, 2, 3, 4][:count])
+    monkeypatch.setattr(digest_generator, "build_story_entry", fake_build)
+    report = metrics.start_run()
+
+    digest = digest_generator.generate_digest(count=4, concurrent=True)
+
+    assert list(digest) == [1, 3, 4]
+    assert digest == {1: entry(1), 3: entry(3), 4: entry(4)}
+    assert report.stories[2]["error"] == "scripted failure"
+    assert [report.stories[story_id]["rank"] for story_id in (1, 2, 3, 4)] == [1, 2, 3, 4]
+
+
+@pytest.mark.unit
+def test_fetch_items_keeps_kids_order_and_isolates_failures(monkeypatch):
+    kids = [5, 4, 3, 2, 1]
+
+    def fake_get(item_id, deadline=None):
+        # Earlier kids answer last
+        time.sleep(item_id * 0.02)
+        if item_id == 3:
+            raise digest_generator.http_client.RequestException("boom")
+        if item_id == 2:
+            raise ValueError("not JSON")
+        return {"id": item_id}
+    monkeypatch.setattr(digest_generator, "get_story_data", fake_get)
+
+    assert digest_generator.fetch_items(kids) == [{"id": 5}, {"id": 4}, None, None, {"id": 1}]
+    assert digest_generator.fetch_items(kids, max_workers=1) == [{"id": 5}, {"id": 4}, None, None, {"id": 1}]
+    assert digest_generator.fetch_items([]) == []
+
+
+@pytest.mark.unit
+def test_nothing_left_to_process(stories):
+    script, calls, abandoned = stories
+
+    assert run([], count=2, deadline_s=5) == {}
+    assert run([1, 2], count=2, deadline_s=5, done={1: entry(1), 2: entry(2)}) == {1: entry(1), 2: entry(2)}
+    assert calls == []
@@ -0,0 +1,40 @@
+"""Tests for the extraction process pool in src/extract_pool.py."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import extract_pool  # noqa: E402
+import http_client  # noqa: E402
+import metrics  # noqa: E402
+import scrape  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "extract", "corpus_normal.html")
+
+
+@pytest.fixture
+def page():
+    with open(FIXTURE, encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.unit
+def test_worker_output_and_timings_match_inline(page):
+    pool = extract_pool.ExtractPool(workers=1, queue_size=0)
+    try:
+        report = metrics.start_run()
+        text = pool.extract(page, "https://example.com/post/1", http_client.Deadline(60))
+    finally:
+        pool.shutdown()
+    assert report.summary()["stages"]["readability"]["count"] == 1
+    assert text == scrape.extract_content(page, "https://example.com/post/1")
+
+
+@pytest.mark.unit
+def test_inline_mode_respects_deadline(page):
+    pool = extract_pool.ExtractPool(workers=0)
+    with pytest.raises(http_client.DeadlineExceeded):
+        pool.extract(page, "https://example.com/post/1", http_client.Deadline(0))
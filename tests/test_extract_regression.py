@@ -0,0 +1,28 @@
+"""Regression corpus for scrape.extract_content.
+
+Each tests/fixtures/extract/<name>.html has the exact text extraction is
+expected to produce in <name>.txt (empty when the page yields nothing).
+Refactors of the extractor must keep these byte-identical.
+"""
+
+import glob
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import scrape  # noqa: E402
+
+FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "fixtures", "extract", "*.html")))
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda p: os.path.basename(p)[:-5])
+def test_extraction_matches_recorded_output(path):
+    with open(path, encoding="utf-8") as f:
+        html = f.read()
+    with open(path[:-5] + ".txt", encoding="utf-8") as f:
+        expected = f.read()
+    assert (scrape.extract_content(html, "https://example.com/post/1") or "") == expected
@@ -0,0 +1,140 @@
+"""Tests for the site-specific extractor registry in src/extractors.py."""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import extractors  # noqa: E402
+import http_client  # noqa: E402
+import metrics  # noqa: E402
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("url, name", [
+    ("https://github.com/python/cpython", "github"),
+    ("https://www.github.com/python/cpython/tree/main", "github"),
+    ("https://github.com/python/cpython/blob/main/README.rst", "github_blob"),
+    ("https://github.com/python/cpython/issues/1", None),
+    ("https://arxiv.org/abs/2401.01234v2", "arxiv"),
+    ("https://arxiv.org/pdf/2401.01234.pdf", "arxiv"),
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ", "youtube"),
+    ("https://youtu.be/dQw4w9WgXcQ", "youtube"),
+    ("https://x.com/someone/status/1234567890", "twitter"),
+    ("https://example.com/notes/TODO.md", "plain_text"),
+    ("https://example.com/blog/post", None),
+])
+def test_urls_map_to_extractors(url, name):
+    extractor = extractors.find_extractor(url)
+    assert (extractor.name if extractor else None) == name
+
+
+ARXIV_FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <entry>
+    <title>Fast   Things
+      Considered</title>
+    <summary>  We show that fast things
+      are fast, and that slow things are not, on every benchmark we tried. </summary>
+    <author><name>Ada Lovelace</name></author>
+    <author><name>Alan Turing</name></author>
+  </entry>
+</feed>"""
+
+
+@pytest.mark.unit
+def test_arxiv_abstract_is_read_from_export_api(monkeypatch):
+    requested = []
+
+    def fake_fetch(url, deadline, **kwargs):
+        requested.append(url)
+        return ARXIV_FEED
+    monkeypatch.setattr(extractors, "_fetch_text", fake_fetch)
+    report = metrics.start_run()
+
+    text = extractors.extract("https://arxiv.org/abs/2401.01234v3", http_client.Deadline(30))
+
+    assert requested == ["https://export.arxiv.org/api/query?id_list=2401.01234"]
+    assert text.startswith("Title: Fast Things Considered\n")
+    assert "Authors: Ada Lovelace, Alan Turing" in text
+    assert text.endswith("## Abstract\nWe show that fast things are fast, and that slow things are not, "
+                         "on every benchmark we tried.")
+    assert report.summary()["counters"] == {"extractor_arxiv_hit": 1}
+
+
+@pytest.mark.unit
+def test_failed_extractor_falls_back(monkeypatch):
+    def failing_fetch(url, deadline, **kwargs):
+        raise http_client.RequestException("boom")
+    monkeypatch.setattr(extractors, "_fetch_text", failing_fetch)
+    report = metrics.start_run()
+    assert extractors.extract("https://github.com/python/cpython", http_client.Deadline(30)) is None
+    assert report.summary()["counters"] == {"extractor_github_miss": 1}
+
+
+WATCH_PAGE = """<html><head>
+<meta property="og:title" content="Fast Things &amp; You">
+<meta property="og:description" content="A shortened copy of the description">
+</head><body><script>var ytInitialPlayerResponse = {"videoDetails":{"videoId":"dQw4w9WgXcQ",
+"title":"Fast Things & You","author":"Ada","shortDescription":"%s"}};</script></body></html>"""
+
+
+@pytest.mark.unit
+def test_youtube_reads_description_from_watch_page(monkeypatch):
+    description = "In this talk we look at why fast things are fast.\\n\\nChapters:\\n0:00 Intro\\n3:10 Benchmarks \\u0026 results"
+    requested = []
+
+    def fake_fetch(url, deadline, **kwargs):
+        requested.append(url)
+        return WATCH_PAGE % description
+    monkeypatch.setattr(extractors, "_fetch_text", fake_fetch)
+
+    text = extractors.extract("https://youtu.be/dQw4w9WgXcQ", http_client.Deadline(30))
+
+    assert requested == ["https://www.youtube.com/watch?v=dQw4w9WgXcQ"]
+    assert text.startswith("Title: Fast Things & You\n")
+    assert "YouTube video by Ada.\n\nIn this talk we look at why fast things are fast.\n\nChapters:" in text
+    assert text.endswith("3:10 Benchmarks & results")
+
+
+@pytest.mark.unit
+def test_youtube_without_description_falls_back(monkeypatch):
+    monkeypatch.setattr(extractors, "_fetch_text",
+                        lambda url, deadline, **kwargs: "<html><head><title>Fast Things</title></head></html>")
+    report = metrics.start_run()
+    assert extractors.extract("https://www.youtube.com/watch?v=dQw4w9WgXcQ", http_client.Deadline(30)) is None
+    assert report.summary()["counters"] == {"extractor_youtube_miss": 1}
+
+
+@pytest.mark.unit
+def test_short_body_falls_back_despite_header(monkeypatch):
+    # Title line plus the 80-character rule alone would pass a length check on the whole text
+    monkeypatch.setattr(extractors, "_fetch_text", lambda url, deadline, **kwargs: "# TODO\n\n- ship it\n")
+    report = metrics.start_run()
+    assert extractors.extract("https://example.com/notes/TODO.md", http_client.Deadline(30)) is None
+    assert report.summary()["counters"] == {"extractor_plain_text_miss": 1}
+
+
+@pytest.mark.unit
+def test_short_tweet_is_a_hit(monkeypatch):
+    requested = []
+
+    def fake_fetch(url, deadline, **kwargs):
+        requested.append((url, kwargs["params"]))
+        return json.dumps({
+            "author_name": "Ada",
+            "html": '<blockquote class="twitter-tweet"><p lang="en" dir="ltr">Shipped it &amp; it works.'
+                    '<br>Finally.</p>&mdash; Ada (@ada) <a href="https://x.com/ada/status/1">May 1</a></blockquote>',
+        })
+    monkeypatch.setattr(extractors, "_fetch_text", fake_fetch)
+    report = metrics.start_run()
+
+    text = extractors.extract("https://x.com/ada/status/1234567890", http_client.Deadline(30))
+
+    assert requested == [("https://publish.twitter.com/oembed",
+                          {"url": "https://x.com/ada/status/1234567890", "format": "json"})]
+    assert text == "Title: Post by Ada\n" + "=" * 80 + "\nShipped it & it works.\nFinally."
+    assert report.summary()["counters"] == {"extractor_twitter_hit": 1}
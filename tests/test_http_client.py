@@ -0,0 +1,90 @@
+"""Tests for deadline handling in src/http_client.py."""
+
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import http_client  # noqa: E402
+
+
+@pytest.fixture
+def silent_server():
+    """A socket that accepts connections and never answers; yields (url, accepted connection count)."""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(16)
+    listener.settimeout(0.1)
+    accepted = []
+    stop = threading.Event()
+
+    def accept():
+        while not stop.is_set():
+            try:
+                accepted.append(listener.accept()[0])
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+
+    thread = threading.Thread(target=accept, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{listener.getsockname()[1]}/page", accepted
+    stop.set()
+    thread.join()
+    for conn in accepted:
+        conn.close()
+    listener.close()
+
+
+@pytest.mark.unit
+def test_deadline_bounds_retries_against_a_silent_server(silent_server):
+    url, accepted = silent_server
+    start = time.monotonic()
+    with pytest.raises(http_client.DeadlineExceeded):
+        http_client.get(url, deadline=http_client.Deadline(1.0), timeout=(5, 15))
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 1.5
+    # The one attempt used up the deadline; no retry got a fresh timeout
+    assert len(accepted) == 1
+
+
+@pytest.mark.unit
+def test_host_slot_wait_is_bounded_by_the_deadline(silent_server):
+    url, _ = silent_server
+    http_client.set_host_limit(url.split("/")[2], 1)
+    semaphore = http_client._host_semaphore(url)
+    semaphore.acquire()
+    try:
+        start = time.monotonic()
+        with pytest.raises(http_client.DeadlineExceeded):
+            http_client.get(url, deadline=http_client.Deadline(0.3))
+        assert time.monotonic() - start < 1
+    finally:
+        semaphore.release()
+
+
+@pytest.mark.unit
+def test_retries_stop_at_the_deadline(monkeypatch):
+    calls = []
+
+    def failing(*args, **kwargs):
+        calls.append(kwargs["timeout"])
+        raise http_client.requests.ConnectionError("refused")
+
+    monkeypatch.setattr(http_client._get_deadline_session(), "request", failing)
+    monkeypatch.setattr(http_client.RETRY_POLICY, "backoff_factor", 0.4)
+    start = time.monotonic()
+    with pytest.raises(http_client.DeadlineExceeded):
+        http_client.get("http://retry.test/", deadline=http_client.Deadline(0.5))
+
+    # Attempts at t=0 and t=0 (no backoff before the first retry); the 0.8s backoff won't fit
+    assert len(calls) == 2
+    assert time.monotonic() - start < 0.5
+    assert all(read <= 0.5 for _, read in calls)
@@ -0,0 +1,60 @@
+"""Tests for the on-disk HN item cache in src/item_cache.py."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from item_cache import ItemCache  # noqa: E402
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = ItemCache(str(tmp_path / "items.sqlite3"))
+    yield c
+    c.close()
+
+
+@pytest.mark.unit
+def test_roundtrip(cache):
+    item = {"id": 1, "type": "comment", "text": "hello", "kids": [2, 3]}
+    cache.put(item)
+    assert cache.get(1) == item
+    assert cache.get(2) is None
+
+
+@pytest.mark.unit
+def test_expired_items_are_misses(tmp_path):
+    c = ItemCache(str(tmp_path / "items.sqlite3"), ttls={"story": 0})
+    c.put({"id": 1, "type": "story", "title": "t"})
+    c.put({"id": 2, "type": "comment", "text": "c"})
+    assert c.get(1) is None
+    assert c.get(2) is not None
+    c.close()
+
+
+@pytest.mark.unit
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "items.sqlite3")
+    first = ItemCache(path)
+    first.put({"id": 7, "type": "comment", "text": "kept"})
+    first.close()
+
+    second = ItemCache(path)
+    assert second.get(7)["text"] == "kept"
+    second.close()
+
+
+@pytest.mark.unit
+def test_evicts_least_recently_used(tmp_path):
+    c = ItemCache(str(tmp_path / "items.sqlite3"), max_items=2, evict_every=1000)
+    for item_id in (1, 2, 3):
+        c.put({"id": item_id, "type": "comment", "text": str(item_id)})
+    c.get(1)  # touch 1 so 2 becomes the oldest
+    c.evict()
+    assert len(c) == 2
+    assert c.get(2) is None
+    assert c.get(1) is not None and c.get(3) is not None
+    c.close()
@@ -0,0 +1,103 @@
+"""Tests for the run checkpoint journal in src/journal.py and resuming from it."""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import digest_generator  # noqa: E402
+import metrics  # noqa: E402
+from journal import RunJournal  # noqa: E402
+
+
+def write_lines(path, *lines, tail=""):
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines) + tail)
+
+
+def records(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.mark.unit
+def test_torn_last_line_is_ignored_and_cut_off_before_the_next_record(tmp_path):
+    path = tmp_path / "run.jsonl"
+    write_lines(path,
+                {"event": "start", "story_ids": [1, 2]},
+                {"event": "story", "story_id": 1, "entry": {"title": "one"}},
+                tail='{"event": "story", "story_id": 2, "ent')
+
+    journal = RunJournal(str(path))
+    assert journal.story_ids == [1, 2]
+    assert journal.entries == {1: {"title": "one"}}
+
+    journal.record_story(2, {"title": "two"})
+    lines = path.read_text().split("\n")
+    assert lines[2] == '{"event": "story", "story_id": 2, "ent'
+    assert json.loads(lines[3]) == {"event": "story", "story_id": 2, "entry": {"title": "two"}}
+
+    reloaded = RunJournal(str(path))
+    assert reloaded.entries == {1: {"title": "one"}, 2: {"title": "two"}}
+
+
+@pytest.mark.unit
+def test_start_record_resets_earlier_entries(tmp_path):
+    path = tmp_path / "run.jsonl"
+    write_lines(path,
+                {"event": "start", "story_ids": [1, 2]},
+                {"event": "story", "story_id": 1, "entry": {"title": "old"}},
+                {"event": "sent"},
+                {"event": "start", "story_ids": [3, 4]},
+                {"event": "story", "story_id": 4, "entry": {"title": "new"}})
+
+    journal = RunJournal(str(path))
+
+    assert journal.story_ids == [3, 4]
+    assert journal.entries == {4: {"title": "new"}}
+    assert not journal.sent
+
+
+@pytest.mark.unit
+def test_sent_journal_suppresses_a_resend(tmp_path, monkeypatch):
+    # Needs Flask (templates) through main.py
+    mail_digest = pytest.importorskip("mail_digest")
+
+    path = tmp_path / "run.jsonl"
+    write_lines(path, {"event": "start", "story_ids": [1]}, {"event": "sent"})
+    monkeypatch.setattr(mail_digest.RunJournal, "for_date", classmethod(lambda cls: cls(str(path))))
+
+    def unexpected(*args, **kwargs):
+        raise AssertionError("digest regenerated after it was sent")
+    monkeypatch.setattr(mail_digest.digest_generator, "generate_digest", unexpected)
+    monkeypatch.setattr(mail_digest, "send_digest_to_list", unexpected)
+
+    mail_digest._generate_and_send(1, False, None, resume=True, deadline_s=None, overfetch=0)
+
+    assert records(path)[-1] == {"event": "sent"}
+
+
+@pytest.mark.unit
+def test_resumed_digest_processes_only_missing_stories(tmp_path, monkeypatch):
+    path = tmp_path / "run.jsonl"
+    write_lines(path,
+                {"event": "start", "story_ids": [1, 2, 3]},
+                {"event": "story", "story_id": 2, "entry": {"title": "from journal"}})
+    built = []
+
+    def fake_build(story_id, idx, total, stages=None, comment_budget=None, story_data=None):
+        built.append(story_id)
+        return {"title": f"built {story_id}"}
+
+    def unexpected(count):
+        raise AssertionError("ranking fetched again on resume")
+    monkeypatch.setattr(digest_generator, "build_story_entry", fake_build)
+    monkeypatch.setattr(digest_generator, "top_stories", unexpected)
+    metrics.start_run()
+
+    digest = digest_generator.generate_digest(count=3, journal=RunJournal(str(path)))
+
+    assert built == [1, 3]
+    assert digest == {1: {"title": "built 1"}, 2: {"title": "from journal"}, 3: {"title": "built 3"}}
+    assert RunJournal(str(path)).entries == digest
@@ -0,0 +1,369 @@
+"""Tests for rate limiting, backends and model fallback in src/llm_client.py."""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import llm_client  # noqa: E402
+import metrics  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("value, seconds", [
+    ("2m59.56s", 179.56),
+    ("7.66s", 7.66),
+    ("120ms", 0.12),
+    ("1.5", 1.5),
+    ("", None),
+    ("soon", None),
+])
+def test_parse_duration(value, seconds):
+    result = llm_client.parse_duration(value)
+    if seconds is None:
+        assert result is None
+    else:
+        assert result == pytest.approx(seconds)
+
+
+@pytest.mark.unit
+def test_backoff_is_jittered_and_capped():
+    for attempt in range(12):
+        delay = llm_client.backoff_delay(attempt)
+        cap = min(llm_client.BACKOFF_MAX, llm_client.BACKOFF_BASE * 2 ** attempt)
+        assert cap / 2 <= delay <= cap
+
+
+@pytest.mark.unit
+def test_limiter_lets_requests_through_until_limits_are_known():
+    limiter = llm_client.RateLimiter(clock=FakeClock())
+    assert limiter.wait_time(50_000) == 0
+
+
+@pytest.mark.unit
+def test_limiter_waits_for_tokens_to_refill():
+    clock = FakeClock()
+    limiter = llm_client.RateLimiter(clock=clock)
+    limiter.update({"x-ratelimit-limit-tokens": "6000", "x-ratelimit-remaining-tokens": "1000"})
+
+    assert limiter.wait_time(1000) == 0
+    # 6000 tokens a minute refill 100 a second
+    assert limiter.wait_time(2000) == pytest.approx(10)
+    clock.now += 10
+    assert limiter.wait_time(2000) == pytest.approx(0)
+
+
+@pytest.mark.unit
+def test_limiter_honours_request_quota_and_pause():
+    clock = FakeClock()
+    limiter = llm_client.RateLimiter(clock=clock)
+    limiter.update({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "30s"})
+    assert limiter.wait_time(1) == pytest.approx(30)
+
+    clock.now += 30
+    limiter.pause(5)
+    assert limiter.wait_time(1) == pytest.approx(5)
+
+
+@pytest.mark.unit
+def test_retry_after_overrides_quota_reset():
+    limiter = llm_client.RateLimiter(clock=FakeClock())
+    limiter.update({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "1m"},
+                   block_on_quota=False)
+    assert limiter.wait_time(1) == 0
+
+
+class FakeRaw:
+    def __init__(self, text, headers=None):
+        self.headers = headers or {}
+        self._text = text
+
+    async def parse(self):
+        message = types.SimpleNamespace(content=self._text)
+        usage = types.SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+
+
+class FakeGroq:
+    """Answers with queued responses; an int queues `status_error(<that status code>)`."""
+
+    def __init__(self, status_error, *responses):
+        self.status_error = status_error
+        self.responses = list(responses)
+        self.calls = 0
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(
+            with_raw_response=types.SimpleNamespace(create=self.create)))
+
+    async def create(self, model, messages, **params):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, int):
+            raise self.status_error(response)
+        return response
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Client on a Groq backend whose SDK client is a FakeGroq, without fallback models."""
+    groq = pytest.importorskip("groq")
+    httpx = pytest.importorskip("httpx")
+
+    def status_error(status):
+        http = httpx.Response(status, headers={"retry-after": "0"},
+                              request=httpx.Request("POST", "https://api.groq.test"))
+        error = groq.RateLimitError if status == 429 else groq.APIStatusError
+        return error("error", response=http, body=None)
+
+    monkeypatch.setattr(llm_client, "backoff_delay", lambda attempt: 0.0)
+    backend = llm_client.GroqBackend(api_key="test-key")
+    client = llm_client.LLMClient(backend, max_concurrent=2, max_retries=2, fallback_models=[])
+
+    def answer(*responses):
+        backend._client = FakeGroq(status_error, *responses)
+        return backend._client
+    client.answer = answer
+    return client
+
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+@pytest.mark.unit
+def test_complete_returns_text_and_usage(client):
+    client.answer(FakeRaw("a summary", {"x-ratelimit-limit-tokens": "6000"}))
+    completion = client.complete(MESSAGES, "model")
+    assert completion == llm_client.Completion("a summary", {"prompt_tokens": 10, "completion_tokens": 5,
+                                                             "total_tokens": 15}, "model")
+    assert client.limiter("model").tokens_per_minute == 6000
+
+
+@pytest.mark.unit
+def test_rate_limited_and_server_errors_are_retried_up_to_the_cap(client):
+    client.answer(429, 503, FakeRaw("ok"))
+    assert client.complete(MESSAGES, "model").text == "ok"
+
+    fake = client.answer(429, 429, 429, FakeRaw("never reached"))
+    with pytest.raises(llm_client.LLMUnavailable):
+        client.complete(MESSAGES, "model")
+    assert fake.calls == 3
+
+
+@pytest.mark.unit
+def test_request_too_large_and_client_errors_are_not_retried(client):
+    fake = client.answer(413, FakeRaw("never reached"))
+    with pytest.raises(llm_client.RequestTooLarge):
+        client.complete(MESSAGES, "model")
+    assert fake.calls == 1
+
+    fake = client.answer(400, FakeRaw("never reached"))
+    with pytest.raises(llm_client.LLMUnavailable):
+        client.complete(MESSAGES, "model")
+    assert fake.calls == 1
+
+
+class FakeBackend:
+    """Per-model scripted answers: a str is returned, an int raises that status, a float sleeps first."""
+
+    def __init__(self, **script):
+        self.script = {model: list(answers) for model, answers in script.items()}
+        self.calls = []
+
+    async def create(self, model, messages, **params):
+        self.calls.append(model)
+        answer = self.script[model].pop(0)
+        if isinstance(answer, float):
+            await asyncio.sleep(answer)
+            answer = "late"
+        if isinstance(answer, int):
+            raise llm_client.BackendError("scripted", answer, {"retry-after": "30"} if answer == 429 else {})
+        return llm_client.Reply(answer, {"total_tokens": 1}, {})
+
+
+@pytest.fixture
+def report(monkeypatch):
+    monkeypatch.setattr(llm_client, "backoff_delay", lambda attempt: 0.0)
+    return metrics.start_run()
+
+
+def chain_client(backend, latency_slo=5.0):
+    return llm_client.LLMClient(backend, max_retries=1, fallback_models=["fast", "tiny"], latency_slo=latency_slo)
+
+
+@pytest.mark.unit
+def test_rate_limited_model_falls_back_to_the_next(report):
+    backend = FakeBackend(big=[429], fast=["from fast"])
+    client = chain_client(backend)
+
+    assert client.complete(MESSAGES, "big") == llm_client.Completion("from fast", {"total_tokens": 1}, "fast")
+    # The rate-limited model is skipped while paused instead of being waited for
+    backend.script["fast"].append("again")
+    assert client.complete(MESSAGES, "big").text == "again"
+    assert backend.calls == ["big", "fast", "fast"]
+
+    counters = report.summary()["counters"]
+    assert counters["llm_model[big]_rate_limited"] == 1
+    assert counters["llm_model[big]_skipped"] == 1
+    assert counters["llm_fallback"] == 2
+
+
+@pytest.mark.unit
+def test_slow_and_failing_models_fall_back_and_are_recorded(report):
+    backend = FakeBackend(big=[0.5], fast=[500], tiny=["from tiny"])
+    client = chain_client(backend, latency_slo=0.05)
+
+    assert client.complete(MESSAGES, "big").model == "tiny"
+
+    summary = report.summary()
+    assert summary["counters"]["llm_model[big]_slow"] == 1
+    assert summary["counters"]["llm_model[fast]_error"] == 1
+    assert summary["counters"]["llm_model[tiny]_ok"] == 1
+    assert summary["stages"]["llm_model[big]"]["count"] == 1
+
+
+@pytest.mark.unit
+def test_whole_chain_is_retried_then_given_up(report):
+    backend = FakeBackend(big=[503, 503], fast=[503, 503], tiny=[503, 503])
+    with pytest.raises(llm_client.LLMUnavailable):
+        chain_client(backend).complete(MESSAGES, "big")
+    assert backend.calls == ["big", "fast", "tiny"] * 2
+
+
+@pytest.mark.unit
+def test_openai_compatible_backend():
+    httpx = pytest.importorskip("httpx")
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if json.loads(request.content)["model"] == "busy":
+            return httpx.Response(429, headers={"retry-after": "2"}, json={"error": {"message": "slow down"}})
+        return httpx.Response(200, headers={"x-ratelimit-limit-tokens": "100"}, json={
+            "choices": [{"message": {"role": "assistant", "content": "hi"}}],
+            "usage": {"prompt_tokens": 3, "completion_tokens": 1, "total_tokens": 4},
+        })
+
+    backend = llm_client.OpenAICompatibleBackend(base_url="http://llm.test/v1/", api_key="secret")
+
+    async def run():
+        backend._client = httpx.AsyncClient(transport=httpx.MockTransport(handler),
+                                            headers={"Authorization": "Bearer secret"})
+        reply = await backend.create("local", MESSAGES, response_format={"type": "json_object"})
+        with pytest.raises(llm_client.BackendError) as raised:
+            await backend.create("busy", MESSAGES)
+        return reply, raised.value
+
+    reply, error = asyncio.new_event_loop().run_until_complete(run())
+    assert reply.text == "hi" and reply.usage["total_tokens"] == 4
+    assert reply.headers["x-ratelimit-limit-tokens"] == "100"
+    assert str(requests[0].url) == "http://llm.test/v1/chat/completions"
+    assert json.loads(requests[0].content)["response_format"] == {"type": "json_object"}
+    assert error.status_code == 429 and error.headers["retry-after"] == "2"
+
+
+@pytest.mark.unit
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        llm_client.make_backend("nope")
+
+
+class SlowFirstBackend:
+    """Answers after `delays[n]` seconds for the n-th request (0.01s once they run out)."""
+
+    def __init__(self, *delays):
+        self.delays = list(delays)
+        self.sent = 0
+        self.cancelled = 0
+
+    async def create(self, model, messages, **params):
+        number = self.sent
+        self.sent += 1
+        try:
+            await asyncio.sleep(self.delays[number] if number < len(self.delays) else 0.01)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return llm_client.Reply(f"reply {number}", {}, {})
+
+
+def hedging_client(backend, budget=1.0):
+    client = llm_client.LLMClient(backend, fallback_models=[], hedge=True, hedge_percentile=90, hedge_budget=budget)
+    for _ in range(llm_client.HEDGE_MIN_SAMPLES):
+        client.complete(MESSAGES, "model")
+    return client
+
+
+@pytest.mark.unit
+def test_slow_request_is_hedged_and_the_loser_cancelled(report):
+    backend = SlowFirstBackend(*[0.01] * llm_client.HEDGE_MIN_SAMPLES, 5.0)
+    client = hedging_client(backend)
+    assert client.hedge_delay("model") < 0.1
+
+    completion = client.complete(MESSAGES, "model")
+
+    assert completion.text == f"reply {llm_client.HEDGE_MIN_SAMPLES + 1}"
+    assert backend.cancelled == 1
+    counters = report.summary()["counters"]
+    assert counters["llm_hedge_fired"] == 1
+    assert counters["llm_hedge_won"] == 1
+
+
+@pytest.mark.unit
+def test_hedges_stay_within_the_run_budget(report):
+    # The 11th and 12th requests are slow; the hedge sent in between (11th backend call) isn't
+    backend = SlowFirstBackend(*[0.01] * llm_client.HEDGE_MIN_SAMPLES, 0.3, 0.01, 0.3)
+    client = hedging_client(backend, budget=0.1)
+
+    client.complete(MESSAGES, "model")
+    client.complete(MESSAGES, "model")
+
+    counters = report.summary()["counters"]
+    # 12 requests at 10% allow one hedge
+    assert counters["llm_hedge_fired"] == 1
+    assert counters["llm_hedge_over_budget"] == 1
+
+
+@pytest.mark.unit
+def test_no_hedging_when_disabled_or_without_enough_samples():
+    client = llm_client.LLMClient(SlowFirstBackend(), fallback_models=[], hedge=False)
+    for _ in range(llm_client.HEDGE_MIN_SAMPLES):
+        client.complete(MESSAGES, "model")
+    assert client.hedge_delay("model") is None
+
+    client = llm_client.LLMClient(SlowFirstBackend(), fallback_models=[], hedge=True)
+    client.complete(MESSAGES, "model")
+    assert client.hedge_delay("model") is None
+
+
+@pytest.mark.unit
+def test_cancel_event_abandons_a_waiting_call(report):
+    backend = SlowFirstBackend(30.0)
+    client = llm_client.LLMClient(backend, fallback_models=[])
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+
+    started = time.monotonic()
+    with llm_client.cancel_on(cancel), pytest.raises(llm_client.LLMCancelled):
+        client.complete(MESSAGES, "model")
+    assert time.monotonic() - started < 1
+    # The request is cancelled on the loop too, not left running
+    time.sleep(0.1)
+    assert backend.cancelled == 1
+
+    with llm_client.cancel_on(cancel), pytest.raises(llm_client.LLMCancelled):
+        client.complete(MESSAGES, "model")
+    assert backend.sent == 1
@@ -0,0 +1,99 @@
+"""Tests for the per-run timing report in src/metrics.py."""
+
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import metrics  # noqa: E402
+
+
+@pytest.fixture
+def report():
+    return metrics.start_run()
+
+
+@pytest.mark.unit
+def test_summary_adds_up_stories_and_the_run_bucket(report):
+    report.record_stage("render", 0.5)
+    metrics.add_bytes(100)
+    metrics.incr("hn_cache_hit")
+    with metrics.story(1, rank=1):
+        report.record_stage("scrape", 1.0)
+        report.record_stage("scrape", 3.0)
+        metrics.add_bytes(1000)
+        metrics.add_tokens({"total_tokens": 120, "prompt_tokens": 100, "model": "ignored"})
+        metrics.add_retries(2)
+        metrics.incr("hn_cache_hit", 3)
+        metrics.peak("llm_queue_depth", 2)
+    with metrics.story(2, rank=2):
+        report.record_stage("scrape", 2.0)
+        metrics.add_bytes(500)
+        metrics.add_tokens({"total_tokens": 30})
+        metrics.add_retries()
+        metrics.peak("llm_queue_depth", 5)
+        metrics.peak("llm_queue_depth", 1)
+
+    summary = report.summary()
+
+    assert summary["stories"] == 2
+    assert summary["bytes"] == 1600
+    assert summary["tokens"] == {"total_tokens": 150, "prompt_tokens": 100}
+    assert summary["retries"] == 3
+    assert summary["counters"] == {"hn_cache_hit": 4}
+    assert summary["peaks"] == {"llm_queue_depth": 5}
+    assert summary["stages"]["scrape"] == {"count": 3, "total_s": 6.0, "max_s": 3.0, "mean_s": 2.0}
+    assert summary["stages"]["render"]["count"] == 1
+    assert report.stories[1]["rank"] == 1 and "duration_s" in report.stories[1]
+    assert report.run["bytes"] == 100
+
+
+@pytest.mark.unit
+def test_propagate_and_bound_to_carry_the_story_across_threads(report):
+    with metrics.story(7):
+        wrapped = metrics.propagate(lambda: metrics.incr("from_thread"))
+    unwrapped = lambda: metrics.incr("lost")  # noqa: E731
+    for fn in (wrapped, unwrapped):
+        thread = threading.Thread(target=fn)
+        thread.start()
+        thread.join()
+    with metrics.bound_to(8):
+        metrics.incr("bound")
+        assert metrics.current_story() == 8
+    assert metrics.current_story() is None
+
+    assert report.stories[7]["counters"] == {"from_thread": 1}
+    assert report.stories[8]["counters"] == {"bound": 1}
+    assert report.run["counters"] == {"lost": 1}
+
+
+@pytest.mark.unit
+def test_write_report_dumps_summary_and_buckets(report, tmp_path):
+    with metrics.story(3, rank=1):
+        report.record_stage("llm_call", 1.5)
+        metrics.set_story_info(title="A story")
+    metrics.incr("title_only_fallback")
+
+    path = metrics.write_report(report, directory=str(tmp_path))
+
+    assert os.path.dirname(path) == str(tmp_path)
+    assert os.path.basename(path) == "run-" + report.started_at.strftime("%d-%m-%Y-%H%M%S") + ".json"
+    with open(path) as f:
+        data = json.load(f)
+    assert data["started_at"] == report.started_at.isoformat(timespec="seconds")
+    assert data["summary"]["stages"]["llm_call"]["total_s"] == 1.5
+    assert data["summary"]["counters"] == {"title_only_fallback": 1}
+    assert data["run"]["counters"] == {"title_only_fallback": 1}
+    assert data["stories"]["3"]["title"] == "A story"
+    assert data["stories"]["3"]["rank"] == 1
+
+
+@pytest.mark.unit
+def test_write_report_failure_returns_none(report, tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    assert metrics.write_report(report, directory=str(blocker / "reports")) is None
@@ -0,0 +1,39 @@
+"""Tests for the conditional-request page cache in src/page_cache.py."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from page_cache import PageCache  # noqa: E402
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = PageCache(str(tmp_path / "pages.sqlite3"), max_bytes=1000)
+    yield c
+    c.close()
+
+
+@pytest.mark.unit
+def test_redirected_url_resolves_to_final_page(cache):
+    cache.put("http://a.test/short", "https://a.test/article", "<p>hi</p>", '"v1"', None)
+    page = cache.get("http://a.test/short")
+    assert page.url == "https://a.test/article"
+    assert page.body == "<p>hi</p>"
+    assert page.conditional_headers() == {"If-None-Match": '"v1"'}
+    assert cache.get("https://a.test/article") == page
+    assert cache.get("http://a.test/other") is None
+
+
+@pytest.mark.unit
+def test_size_cap_evicts_least_recently_used(cache):
+    for name in ("a", "b", "c"):
+        cache.put(f"http://{name}.test/", f"http://{name}.test/", name * 400, None, "Mon, 01 Jan 2024 00:00:00 GMT")
+        cache.touch("http://a.test/")
+    assert cache.total_bytes <= 900
+    assert cache.get("http://a.test/") is not None
+    assert cache.get("http://b.test/") is None
+    assert cache.get("http://c.test/") is not None
@@ -0,0 +1,57 @@
+"""Tests for PDF text extraction in src/pdf_extract.py."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import pdf_extract  # noqa: E402
+
+pytest.importorskip("pypdf")
+
+
+def make_pdf(path, pages, title="Test Paper"):
+    """Write a minimal PDF with one line of Helvetica text per page."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects)))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+    objects.append(f"<< /Title ({title}) >>".encode())
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, len(objects), xref)
+    with open(path, "wb") as f:
+        f.write(bytes(out))
+
+
+@pytest.mark.unit
+def test_text_is_extracted_with_title(tmp_path):
+    path = str(tmp_path / "paper.pdf")
+    make_pdf(path, [f"Page {n} discusses caching, scheduling and other systems topics at length." for n in range(1, 4)])
+    text = pdf_extract.extract_text(path, "https://example.com/paper.pdf")
+    assert text.startswith("Title: Test Paper\n")
+    assert "Page 1 discusses" in text and "Page 3 discusses" in text
+
+
+@pytest.mark.unit
+def test_extraction_stops_once_budget_is_filled(tmp_path):
+    path = str(tmp_path / "long.pdf")
+    make_pdf(path, [f"Page {n} " + "word " * 30 for n in range(1, 51)])
+    text = pdf_extract.extract_text(path, "https://example.com/long.pdf", max_chars=300)
+    assert "Page 2 " in text
+    assert "Page 5 " not in text
@@ -0,0 +1,100 @@
+"""Tests for the streaming page download in src/scrape.py."""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import scrape  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, body: bytes, content_type: str, encoding="utf-8", status_code=200, delay=0.0, headers=None):
+        self.delay = delay
+        self.headers = dict({"Content-Type": content_type}, **(headers or {}))
+        self.url = None
+        self.encoding = encoding
+        self.status_code = status_code
+        self._body = body
+        self.bytes_read = 0
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self._body), chunk_size):
+            time.sleep(self.delay)
+            chunk = self._body[i:i + chunk_size]
+            self.bytes_read += len(chunk)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    monkeypatch.setenv("PAGE_CACHE", "0")
+    sent = []
+
+    def install(*responses):
+        queue = list(responses)
+
+        def get(url, **kwargs):
+            sent.append(kwargs["headers"])
+            return queue.pop(0)
+        monkeypatch.setattr(scrape.http_client, "get", get)
+        return responses[-1]
+    install.sent = sent
+    return install
+
+
+@pytest.mark.unit
+def test_binary_content_is_rejected_before_reading_body(serve):
+    response = serve(FakeResponse(b"\0" * 1_000_000, "application/octet-stream", encoding=None))
+    assert scrape._download("http://example.com/video", {}, scrape.http_client.Deadline(30)) is None
+    assert response.bytes_read == 0
+    assert response.closed
+
+
+@pytest.mark.unit
+def test_body_is_capped_and_decoded_across_chunks(serve, monkeypatch):
+    monkeypatch.setattr(scrape, "MAX_PAGE_BYTES", 1000)
+    monkeypatch.setattr(scrape, "CHUNK_SIZE", 7)
+    # Multi-byte characters straddle chunk boundaries.
+    response = serve(FakeResponse(("<p>héllo wörld</p>" * 500).encode(), "text/html; charset=utf-8"))
+    text = scrape._download("http://example.com/page", {}, scrape.http_client.Deadline(30)).text
+    assert text.startswith("<p>héllo wörld</p>")
+    assert "�" not in text[:-1]
+    assert len(text.encode()) <= 1000
+    assert response.bytes_read < 1100
+    assert response.closed
+
+
+@pytest.mark.unit
+def test_slow_body_hits_the_deadline(serve, monkeypatch):
+    monkeypatch.setattr(scrape, "CHUNK_SIZE", 10)
+    serve(FakeResponse(b"<p>slow</p>" * 10, "text/html", delay=0.05))
+    deadline = scrape.http_client.Deadline(0.2)
+    with pytest.raises(scrape.http_client.DeadlineExceeded):
+        scrape._download("http://example.com/slow", {}, deadline)
+    assert deadline.remaining() == 0
+    assert deadline.timeout((5, 15)) == (0, 0)
+
+
+@pytest.mark.unit
+def test_not_modified_is_served_from_page_cache(serve, monkeypatch, tmp_path):
+    cache = scrape.page_cache.PageCache(str(tmp_path / "pages.sqlite3"))
+    monkeypatch.setattr(scrape.page_cache, "get_page_cache", lambda: cache)
+    serve(
+        FakeResponse(b"<p>fresh</p>", "text/html", headers={"ETag": '"abc"'}),
+        FakeResponse(b"", "", status_code=304),
+    )
+    assert scrape._download("http://example.com/a", {}, scrape.http_client.Deadline(30)).text == "<p>fresh</p>"
+    assert scrape._download("http://example.com/a", {}, scrape.http_client.Deadline(30)).text == "<p>fresh</p>"
+    assert serve.sent[1]["If-None-Match"] == '"abc"'
+    cache.close()
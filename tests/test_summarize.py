@@ -0,0 +1,91 @@
+"""Tests for map-reduce summarization in src/summarize.py."""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import llm_client  # noqa: E402
+import summarize  # noqa: E402
+import summary_batcher  # noqa: E402
+import token_budget  # noqa: E402
+
+
+class FakeClient:
+    """Stands in for LLMClient: answers chunk requests with their part number, the reduce request with a summary."""
+
+    def __init__(self, fail_chunks=()):
+        self.requests = []
+        self.fail_chunks = fail_chunks
+        self.queued = 0
+
+    def run(self, coro):
+        return asyncio.new_event_loop().run_until_complete(coro)
+
+    async def acomplete(self, messages, model):
+        return self.complete(messages, model)
+
+    def complete(self, messages, model):
+        system, user = messages[0]["content"], messages[1]["content"]
+        self.requests.append((system, user))
+        if system == summarize.prompt_chunk:
+            if len(self.requests) in self.fail_chunks:
+                raise llm_client.LLMUnavailable("down")
+            return llm_client.Completion(f"summary of chunk {len(self.requests)}", {}, model)
+        return llm_client.Completion("final summary", {}, model)
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    def install(**kwargs):
+        client = FakeClient(**kwargs)
+        monkeypatch.setattr(llm_client, "get_llm_client", lambda: client)
+        monkeypatch.setattr(summary_batcher, "_batcher", None)
+        return client
+    return install
+
+
+def long_article(sections=60):
+    parts = ["Title: A long article", "=" * 80, ""]
+    for n in range(1, sections + 1):
+        parts += [f"## Section {n}", "Some words about the topic at hand. " * 40]
+    return "\n".join(parts)
+
+
+@pytest.mark.unit
+def test_long_post_is_summarized_in_chunks_then_combined(fake_client, monkeypatch):
+    monkeypatch.setattr(token_budget, "INPUT_TOKEN_BUDGET", 2000)
+    client = fake_client()
+
+    assert summarize.summarize(long_article()) == "final summary"
+
+    chunk_requests = [user for system, user in client.requests if system == summarize.prompt_chunk]
+    assert 1 < len(chunk_requests) <= summarize.MAX_CHUNKS
+    system, user = client.requests[-1]
+    assert system == summarize.prompt_reduce
+    assert user.startswith("Title: A long article")
+    assert "Part 1:\nsummary of chunk 1" in user
+
+
+@pytest.mark.unit
+def test_failed_chunks_are_left_out_of_the_reduce_step(fake_client, monkeypatch):
+    monkeypatch.setattr(token_budget, "INPUT_TOKEN_BUDGET", 2000)
+    client = fake_client(fail_chunks=(2,))
+
+    assert summarize.summarize(long_article()) == "final summary"
+    reduce_input = client.requests[-1][1]
+    assert "Part 1:" in reduce_input and "Part 2:" not in reduce_input and "Part 3:" in reduce_input
+
+
+@pytest.mark.unit
+def test_short_post_and_comments_use_a_single_request(fake_client, monkeypatch):
+    monkeypatch.setattr(token_budget, "INPUT_TOKEN_BUDGET", 2000)
+    client = fake_client()
+
+    summarize.summarize(long_article(sections=1))
+    summarize.summarize(long_article(), prompt_mode="comments")
+
+    assert [system for system, _ in client.requests] == [summarize.prompt_post, summarize.prompt_comments]
@@ -0,0 +1,131 @@
+"""Tests for batching short summarization requests in src/summary_batcher.py."""
+
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import llm_client  # noqa: E402
+import summary_batcher  # noqa: E402
+
+PROMPT = "Summarize."
+USAGE = {"prompt_tokens": 90, "completion_tokens": 30, "total_tokens": 120}
+
+
+class FakeClient:
+    """Answers batch requests via `answer_batch`, single requests with "single: <text>"."""
+
+    def __init__(self, answer_batch=None):
+        self.calls = []
+        self.queued = 0
+        self.answer_batch = answer_batch or (lambda items: {item["id"]: "batched: " + item["text"] for item in items})
+
+    async def acomplete(self, messages, model, **params):
+        self.calls.append(params)
+        user = messages[1]["content"]
+        if "response_format" in params:
+            answer = self.answer_batch(json.loads(user)["items"])
+            text = answer if isinstance(answer, str) else json.dumps({"summaries": answer})
+            return llm_client.Completion(text, dict(USAGE), model)
+        return llm_client.Completion("single: " + user, {"total_tokens": 7}, model)
+
+
+def summarize_all(batcher, texts):
+    async def run():
+        return await asyncio.gather(*(batcher.asummarize(text, PROMPT, "model") for text in texts))
+    return asyncio.new_event_loop().run_until_complete(run())
+
+
+@pytest.mark.unit
+def test_short_inputs_share_one_request():
+    client = FakeClient()
+    batcher = summary_batcher.SummaryBatcher(client, batch_size=4, wait_s=0.05)
+
+    results = summarize_all(batcher, ["a" * 100, "b" * 300])
+
+    assert len(client.calls) == 1
+    assert [r.text for r in results] == ["batched: " + "a" * 100, "batched: " + "b" * 300]
+    # Usage is split by input size
+    assert results[0].usage["total_tokens"] == 30
+    assert results[1].usage["total_tokens"] == 90
+
+
+@pytest.mark.unit
+def test_full_batch_is_sent_without_waiting():
+    client = FakeClient()
+    batcher = summary_batcher.SummaryBatcher(client, batch_size=2, wait_s=60)
+
+    results = summarize_all(batcher, ["one", "two", "three", "four"])
+
+    assert len(client.calls) == 2
+    assert [r.text for r in results] == ["batched: one", "batched: two", "batched: three", "batched: four"]
+
+
+@pytest.mark.unit
+def test_items_missing_from_the_response_are_resent_alone():
+    client = FakeClient(answer_batch=lambda items: {"1": "batched: one", "2": "", "99": "stray"})
+    batcher = summary_batcher.SummaryBatcher(client, batch_size=3, wait_s=0.05)
+
+    results = summarize_all(batcher, ["one", "two", "six"])
+
+    assert [r.text for r in results] == ["batched: one", "single: two", "single: six"]
+    # A resent item is charged its share of the batch plus its own request
+    assert results[1].usage["total_tokens"] == 40 + 7
+
+
+@pytest.mark.unit
+def test_unparseable_response_falls_back_to_single_requests():
+    client = FakeClient(answer_batch=lambda items: "Sure! Here are your summaries:")
+    batcher = summary_batcher.SummaryBatcher(client, batch_size=2, wait_s=0.05)
+
+    results = summarize_all(batcher, ["first", "second"])
+
+    assert [r.text for r in results] == ["single: first", "single: second"]
+
+
+@pytest.mark.unit
+def test_long_inputs_and_disabled_batching_use_single_requests():
+    client = FakeClient()
+    batcher = summary_batcher.SummaryBatcher(client, batch_size=4, wait_s=0.05, max_item_tokens=100)
+    assert summarize_all(batcher, ["x" * 1000])[0].text == "single: " + "x" * 1000
+
+    batcher = summary_batcher.SummaryBatcher(client, batch_size=1, wait_s=60)
+    assert summarize_all(batcher, ["short"])[0].text == "single: short"
+    assert all("response_format" not in params for params in client.calls)
+
+
+@pytest.mark.unit
+def test_lone_callers_do_not_wait():
+    client = FakeClient()
+    batcher = summary_batcher.SummaryBatcher(client, batch_size=4, wait_s=60)
+
+    async def run():
+        return [await batcher.asummarize(text, PROMPT, "model") for text in ["one", "two", "three"]]
+    loop = asyncio.new_event_loop()
+    started = loop.time()
+    results = loop.run_until_complete(run())
+
+    assert loop.time() - started < 1
+    assert [r.text for r in results] == ["single: one", "single: two", "single: three"]
+
+
+@pytest.mark.unit
+def test_waits_for_company_while_llm_requests_are_in_flight():
+    client = FakeClient()
+    client.queued = 1
+    batcher = summary_batcher.SummaryBatcher(client, batch_size=2, wait_s=60)
+
+    async def run():
+        first = asyncio.ensure_future(batcher.asummarize("one", PROMPT, "model"))
+        await asyncio.sleep(0.05)
+        assert not first.done()
+        second = await batcher.asummarize("two", PROMPT, "model")
+        return [await first, second]
+    results = asyncio.new_event_loop().run_until_complete(run())
+
+    assert len(client.calls) == 1
+    assert [r.text for r in results] == ["batched: one", "batched: two"]
@@ -0,0 +1,60 @@
+"""Tests for cross-day summary reuse in src/summary_store.py."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from summary_store import SummaryStore, canonical_url, comments_grown  # noqa: E402
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://example.com/post",
+        "HTTPS://Example.com/post/",
+        "https://www.example.com:443/post#comments",
+        "https://example.com/post?utm_source=hn&utm_medium=x",
+    ],
+)
+def test_canonical_url_variants_match(url):
+    assert canonical_url(url) == "https://example.com/post"
+
+
+@pytest.mark.unit
+def test_canonical_url_keeps_meaningful_query():
+    assert canonical_url("https://example.com/a?b=2&a=1") == "https://example.com/a?a=1&b=2"
+    assert canonical_url("https://example.com/a?id=1") != canonical_url("https://example.com/a?id=2")
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "previous,current,expected",
+    [(100, 110, False), (100, 130, True), (10, 25, False), (10, 40, True), (0, 0, False)],
+)
+def test_comments_grown(previous, current, expected):
+    assert comments_grown(previous, current) is expected
+
+
+@pytest.mark.unit
+def test_post_summary_reused_only_for_unchanged_content(tmp_path):
+    store = SummaryStore(str(tmp_path / "summaries.sqlite3"))
+    store.put_post_summary("https://example.com/post", "Body  text\n", "summary")
+
+    assert store.get_post_summary("https://www.example.com/post/", "Body text") == "summary"
+    assert store.get_post_summary("https://example.com/post", "Body text, edited") is None
+    store.close()
+
+
+@pytest.mark.unit
+def test_comment_summary_redone_after_growth(tmp_path):
+    store = SummaryStore(str(tmp_path / "summaries.sqlite3"))
+    store.put_comment_summary(1, 100, "old take")
+
+    assert store.get_comment_summary(1, 110) == "old take"
+    assert store.get_comment_summary(1, 200) is None
+    assert store.get_comment_summary(2, 5) is None
+    store.close()
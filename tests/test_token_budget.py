@@ -0,0 +1,118 @@
+"""Tests for LLM input budgeting in src/token_budget.py."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import metrics  # noqa: E402
+import token_budget  # noqa: E402
+
+RULE = "=" * 80
+
+
+def article(sections=40):
+    parts = ["Title: A long article", RULE, ""]
+    for n in range(1, sections + 1):
+        parts.append(f"## Section {n}")
+        parts.append(f"Paragraph {n}. " + "Some words about the topic at hand. " * 12)
+    parts += ["", RULE, "Images and Visual Content:", RULE, "", "Image 1:", "  Alt text: a chart"]
+    return "\n".join(parts)
+
+
+@pytest.mark.unit
+def test_text_within_budget_is_untouched():
+    text = article(sections=2)
+    result = token_budget.fit(text, 10_000)
+    assert result.text == text
+    assert not result.trimmed
+
+
+@pytest.mark.unit
+def test_condensed_text_keeps_title_headings_and_opening():
+    text = article(sections=20)
+    result = token_budget.fit(text, 1000)
+    assert result.kept_tokens <= 1000
+    assert result.trimmed and result.dropped_chars == len(text) - len(result.text)
+    assert result.text.startswith("Title: A long article\n" + RULE)
+    assert "Paragraph 1." in result.text
+    assert "## Section 20" in result.text
+    assert "Paragraph 20." not in result.text
+    assert "Images and Visual Content:" not in result.text
+    assert token_budget.GAP_MARKER in result.text
+
+
+@pytest.mark.unit
+def test_single_huge_block_is_cut_at_a_sentence():
+    text = "First sentence here. " * 5000
+    result = token_budget.fit(text, 500)
+    assert result.kept_tokens <= 500
+    assert result.text.endswith("First sentence here.")
+
+
+@pytest.mark.unit
+def test_split_keeps_short_text_in_one_chunk():
+    text = article(sections=2)
+    assert token_budget.split(text, 10_000, 4) == [text]
+
+
+@pytest.mark.unit
+def test_split_cuts_on_headings_and_repeats_the_title():
+    text = article(sections=20)
+    chunks = token_budget.split(text, 1500, 6)
+
+    assert 1 < len(chunks) <= 6
+    for chunk in chunks:
+        assert chunk.startswith("Title: A long article\n" + RULE)
+        assert token_budget.estimate_tokens(chunk) <= 1500
+        assert chunk.split("\n")[2].startswith("## Section")
+    # Nothing dropped: every section lands in exactly one chunk
+    joined = "\n".join(chunks)
+    assert all(joined.count(f"## Section {n}\n") == 1 for n in range(1, 21))
+
+
+@pytest.mark.unit
+def test_split_caps_chunk_count():
+    text = article(sections=200)
+    metrics.start_run()
+    chunks = token_budget.split(text, 1000, 3)
+    assert len(chunks) <= 3
+    assert all(token_budget.estimate_tokens(chunk) <= 1000 for chunk in chunks)
+    assert "## Section 1\n" in chunks[0]
+    # Only what fit condensed away is missing, and it is counted
+    body = text.split("\n", 2)[2].strip("\n")
+    kept = sum(len(chunk.split("\n", 2)[2]) for chunk in chunks)
+    assert metrics.current_report().summary()["counters"]["llm_input_dropped_chars"] == len(body) - kept
+
+
+@pytest.mark.unit
+def test_split_keeps_all_condensed_text():
+    # Large sections pack far below a chunk's capacity, so the first fit still leaves too much
+    parts = ["Title: Big sections", RULE]
+    for n in range(12):
+        parts += [f"## Section {n}", f"Section {n} text. " + "Words on the subject at hand. " * 115]
+    text = "\n".join(parts)
+    metrics.start_run()
+
+    chunks = token_budget.split(text, 1500, 6)
+
+    assert len(chunks) <= 6
+    assert all(token_budget.estimate_tokens(chunk) <= 1500 for chunk in chunks)
+    # The condensed text keeps every heading; all of it must land in a chunk
+    headings = [line for chunk in chunks for line in chunk.split("\n") if line.startswith("## ")]
+    assert headings == [f"## Section {n}" for n in range(12)]
+    assert "Section 5 text." in "\n".join(chunks)
+    # What was condensed away is counted
+    body = text.split("\n", 2)[2]
+    kept = sum(len(chunk.split("\n", 2)[2]) for chunk in chunks)
+    assert metrics.current_report().summary()["counters"]["llm_input_dropped_chars"] == len(body) - kept
+
+
+@pytest.mark.unit
+def test_split_breaks_up_a_section_without_headings():
+    text = "Title: Wall of text\n" + RULE + "\n" + "word " * 20_000
+    chunks = token_budget.split(text, 1000, 10)
+    assert len(chunks) > 1
+    assert all(token_budget.estimate_tokens(chunk) <= 1000 for chunk in chunks)